@@ -0,0 +1,78 @@
+import threading
+from bisect import bisect_right, insort
+from typing import Dict, List, Tuple
+
+
+class AlertIndex:
+    """
+    In-memory index of active alerts, kept per pair as a list sorted by
+    min_spread. Evaluating a pair's spread is a bisect over that list, so
+    cost depends on the number of alerts that fire, not the number stored.
+
+    An alert fires when the pair's spread crosses up through its min_spread,
+    i.e. alerts with last_spread < min_spread <= spread, so a spread that
+    stays wide doesn't re-notify on every tick.
+    """
+
+    def __init__(self):
+        # pair -> sorted [(min_spread, alert_id)]
+        self.by_pair: Dict[str, List[Tuple[float, int]]] = {}
+        # alert_id -> (user_id, pair, min_spread)
+        self.alerts: Dict[int, Tuple[int, str, float]] = {}
+        # Spread each pair had when it was last evaluated
+        self.last_spread: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def load(self, alerts):
+        """Rebuild the index from Alert rows (e.g. at startup)"""
+        with self._lock:
+            self.by_pair.clear()
+            self.alerts.clear()
+            for alert in alerts:
+                if alert.is_active:
+                    self.alerts[alert.id] = (alert.user_id, alert.crypto_pair, alert.min_spread)
+                    self.by_pair.setdefault(alert.crypto_pair, []).append((alert.min_spread, alert.id))
+            for entries in self.by_pair.values():
+                entries.sort()
+
+    def upsert(self, alert):
+        """Add or move an alert after it was created or updated"""
+        with self._lock:
+            self._remove(alert.id)
+            if alert.is_active is False:
+                return
+            self.alerts[alert.id] = (alert.user_id, alert.crypto_pair, alert.min_spread)
+            insort(self.by_pair.setdefault(alert.crypto_pair, []), (alert.min_spread, alert.id))
+
+    def remove(self, alert_id: int):
+        with self._lock:
+            self._remove(alert_id)
+
+    def _remove(self, alert_id: int):
+        existing = self.alerts.pop(alert_id, None)
+        if existing is None:
+            return
+        _, pair, min_spread = existing
+        entries = self.by_pair[pair]
+        i = bisect_right(entries, (min_spread, alert_id)) - 1
+        if i >= 0 and entries[i] == (min_spread, alert_id):
+            del entries[i]
+        if not entries:
+            del self.by_pair[pair]
+
+    def evaluate(self, pair: str, spread: float) -> List[Tuple[int, int, float]]:
+        """Return (alert_id, user_id, min_spread) for alerts the new spread just crossed"""
+        with self._lock:
+            previous = self.last_spread.get(pair, float('-inf'))
+            self.last_spread[pair] = spread
+            entries = self.by_pair.get(pair)
+            if not entries or spread <= previous:
+                return []
+            # Keys above any real id so ties on min_spread land on the right side
+            lo = bisect_right(entries, (previous, float('inf')))
+            hi = bisect_right(entries, (spread, float('inf')))
+            return [(alert_id, self.alerts[alert_id][0], min_spread) for min_spread, alert_id in entries[lo:hi]]
+
+
+# Singleton instance
+alert_index = AlertIndex()
@@ -1,10 +1,15 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, NamedTuple, Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 from . import models, database
 
 # Security configurations
@@ -15,12 +20,33 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# bcrypt is deliberately slow; a login storm must not take every CPU or
+# thread, so hashing runs on its own small pool and callers queue for a slot
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "256"))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_password_slots: Optional[asyncio.Semaphore] = None
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def _run_password_job(func, *args):
+    global _password_slots
+    if _password_slots is None:
+        _password_slots = asyncio.Semaphore(PASSWORD_HASH_QUEUE)
+    # Bound queued work too, so waiting requests hold a cheap coroutine, not a job
+    async with _password_slots:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    return await _run_password_job(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -31,21 +57,97 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+def get_email_from_token(token: str) -> Optional[str]:
+    """Subject of a valid access token, or None (for non-HTTP callers such as WebSockets)"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+class CurrentUser(NamedTuple):
+    """Immutable snapshot of the authenticated user, safe to share across requests"""
+    id: int
+    email: str
+    username: str
+
+class UserCache:
+    """
+    LRU cache of users keyed by token subject, with a TTL so changes reach
+    every worker eventually. Concurrent misses for the same subject share one
+    database query, so a burst of requests after a deploy costs one lookup per user.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+
+    def get(self, email: str) -> Optional[CurrentUser]:
+        entry = self.entries.get(email)
+        if entry is None:
+            return None
+        user, expires = entry
+        if expires < time.monotonic():
+            del self.entries[email]
+            return None
+        self.entries.move_to_end(email)
+        return user
+
+    def put(self, email: str, user: CurrentUser):
+        self.entries[email] = (user, time.monotonic() + self.ttl)
+        self.entries.move_to_end(email)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, email: str):
+        self.entries.pop(email, None)
+
+    async def lookup(self, email: str) -> Optional[CurrentUser]:
+        user = self.get(email)
+        if user is not None:
+            return user
+        if email in self.inflight:
+            return await asyncio.shield(self.inflight[email])
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[email] = future
+        try:
+            async with database.AsyncSessionLocal() as db:
+                row = (await db.execute(select(models.User).where(models.User.email == email))).scalars().first()
+            user = CurrentUser(row.id, row.email, row.username) if row else None
+            if user is not None:
+                self.put(email, user)
+            future.set_result(user)
+            return user
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so an unwatched future doesn't warn
+            future.exception()
+            raise
+        finally:
+            del self.inflight[email]
+
+user_cache = UserCache(
+    maxsize=int(os.getenv("AUTH_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60")),
+)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
+    email = get_email_from_token(token)
+    if email is None:
         raise credentials_exception
-    
-    user = db.query(models.User).filter(models.User.email == email).first()
+
+    user = await user_cache.lookup(email)
     if user is None:
         raise credentials_exception
     return user
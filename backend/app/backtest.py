@@ -0,0 +1,278 @@
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .detection import detect_opportunities
+from .episodes import EpisodeTracker
+from .feature_store import RollingFeatures
+from .market_metadata import MarketMetadata
+from .ml_engine import ArbitragePredictor, load_serving_bundle
+from .order_book import taker_fee
+from .spread_engine import SpreadEngine
+from .tick_store import TickStore, _as_utc
+
+# Recorded ticks are read this many seconds at a time, so a backtest's memory
+# doesn't grow with the length of the range
+CHUNK_SECONDS = float(os.getenv("BACKTEST_CHUNK_SECONDS", "3600"))
+# Every row of a chunk is read; query() caps rows by default
+MAX_ROWS = 1 << 62
+# The scanner's market metadata cache, read for the same per-market fees it uses
+MARKET_CACHE_PATH = os.getenv("MARKET_CACHE_PATH", "./market_cache")
+
+
+class BacktestParams(NamedTuple):
+    """One point of a parameter sweep; defaults match the live scanner"""
+    min_spread: float = 0.05
+    min_confidence: float = 0.0
+    notional: float = 100.0
+    # Seconds between detection and the fill; fills use the quotes at that time
+    latency: float = 1.0
+    # Seconds a pair is left alone after a trade, so one opportunity isn't traded every tick
+    cooldown: float = 5.0
+    top_k: int = 50
+
+
+def iter_snapshots(store: TickStore, start: datetime, end: datetime) -> Iterator[Tuple[float, Dict[str, np.ndarray]]]:
+    """
+    Recorded price rows in [start, end) as (timestamp, rows) snapshots, read
+    CHUNK_SECONDS at a time. A snapshot's rows share one timestamp, so none
+    is split across chunks.
+    """
+    chunk_start, end = _as_utc(start), _as_utc(end)
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(seconds=CHUNK_SECONDS), end)
+        rows = store.query('prices', chunk_start, chunk_end, limit=MAX_ROWS)
+        chunk_start = chunk_end
+        times, offsets = np.unique(rows['timestamp'], return_index=True)
+        offsets = np.append(offsets, len(rows['timestamp']))
+        for s, now in enumerate(times):
+            block = slice(offsets[s], offsets[s + 1])
+            yield float(now), {name: column[block] for name, column in rows.items()}
+
+
+def run_backtest(store_root: str, start: datetime, end: datetime, params: BacktestParams, bundle_path: Optional[str] = None) -> dict:
+    """
+    Replay recorded ticks through the live detection and scoring path as fast
+    as they can be read, simulate a taker fill of every accepted opportunity
+    `latency` seconds later at the quotes recorded then, and report PnL.
+    Runs in a worker process, so it loads the ticks and model itself.
+    """
+    started = time.perf_counter()
+    store = TickStore(store_root)
+
+    predictor = ArbitragePredictor()
+    if bundle_path and os.path.exists(bundle_path):
+        predictor.swap(load_serving_bundle(bundle_path))
+
+    pairs, exchanges = store.symbols['pairs'], store.symbols['exchanges']
+    engine = SpreadEngine(pairs, exchanges)
+    rolling_features = RollingFeatures(len(pairs))
+    episode_tracker = EpisodeTracker()
+    # However old the cache is, its fees beat the static table's
+    metadata = MarketMetadata(MARKET_CACHE_PATH, ttl=float('inf'))
+    for name in exchanges:
+        metadata.load_cached(name, pairs)
+
+    def fee_for(exchange: str, pair: str) -> float:
+        return metadata.taker_fee(exchange, pair, taker_fee(exchange))
+
+    trades = []
+    pending = deque()
+    missed = 0
+    snapshots = 0
+    first = last = None
+    busy_until = np.full(len(pairs), -np.inf)
+
+    def settle(now):
+        """Fill orders whose latency has elapsed at the quotes now on the venues"""
+        nonlocal missed
+        while pending and pending[0]['fill_at'] <= now:
+            trade = _fill(engine, pending.popleft(), now)
+            if trade is None:
+                missed += 1
+            else:
+                trades.append(trade)
+
+    for now, rows in iter_snapshots(store, start, end):
+        snapshots += 1
+        first = now if first is None else first
+        last = now
+        # Each recorded tick is a full snapshot of the quote matrix
+        engine.bids[:] = np.nan
+        engine.asks[:] = np.nan
+        engine.bids[rows['pair'], rows['exchange']] = rows['bid']
+        engine.asks[rows['pair'], rows['exchange']] = rows['ask']
+        engine.recompute()
+        rolling_features.update(engine.bids, engine.asks)
+
+        settle(now)
+
+        opportunities = detect_opportunities(
+            engine,
+            predictor,
+            rolling_features,
+            now=now,
+            notional=params.notional,
+            top_k=params.top_k,
+            min_spread=params.min_spread,
+            fee_for=fee_for,
+            transfer_fee_for=metadata.withdrawal_fee,
+            episode_tracker=episode_tracker,
+        )
+        # Closed episodes aren't stored by backtests
+        episode_tracker.drain()
+
+        for opportunity in opportunities:
+            i = engine.pair_index[opportunity['pair']]
+            buy_exchange, sell_exchange = opportunity['buy_exchange'], opportunity['sell_exchange']
+            if busy_until[i] > now or opportunity['confidence_score'] < params.min_confidence:
+                continue
+            # Like paper trading, never fill on a transfer cost we don't know
+            if not opportunity['transfer_cost_known']:
+                continue
+            busy_until[i] = now + params.latency + params.cooldown
+            pending.append({
+                'pair': i,
+                'buy': engine.exchange_index[buy_exchange],
+                'sell': engine.exchange_index[sell_exchange],
+                'detected_at': now,
+                'fill_at': now + params.latency,
+                'quantity': opportunity['executable_size'],
+                'buy_fee': fee_for(buy_exchange, opportunity['pair']),
+                'sell_fee': fee_for(sell_exchange, opportunity['pair']),
+                'transfer_fee': metadata.withdrawal_fee(buy_exchange, opportunity['pair'].split('/')[0]),
+                'spread_percentage': opportunity['spread_percentage'],
+                'expected_profit': opportunity['potential_profit'],
+                'confidence': opportunity['confidence_score'],
+                'episode_id': opportunity['episode_id'],
+            })
+        # Zero latency fills against the snapshot it was detected on
+        settle(now)
+
+    # Orders still waiting when the recording ends never filled
+    missed += len(pending)
+    for trade in trades:
+        trade['pair'] = pairs[trade['pair']]
+        trade['buy_exchange'] = exchanges[trade.pop('buy')]
+        trade['sell_exchange'] = exchanges[trade.pop('sell')]
+
+    elapsed = time.perf_counter() - started
+    span = last - first if snapshots > 1 else 0.0
+    stats = summarize(trades)
+    stats.update({
+        'missed': missed,
+        'snapshots': snapshots,
+        'replayed_seconds': span,
+        'elapsed_seconds': elapsed,
+        'speedup': span / elapsed if elapsed > 0 else None,
+    })
+    return {'params': params._asdict(), 'stats': stats, 'trades': trades}
+
+
+def _fill(engine: SpreadEngine, order: dict, now: float) -> Optional[dict]:
+    """Taker fill of both legs at the current top of book; None if a venue has no quote"""
+    i, buy, sell = order['pair'], order['buy'], order['sell']
+    ask, bid = engine.asks[i, buy], engine.bids[i, sell]
+    if np.isnan(ask) or np.isnan(bid):
+        return None
+    quantity = order['quantity']
+    buy_cost = quantity * ask
+    proceeds = (quantity - order['transfer_fee']) * bid
+    fees = buy_cost * order['buy_fee'] + proceeds * order['sell_fee']
+    return {
+        'pair': i,
+        'buy': buy,
+        'sell': sell,
+        'detected_at': datetime.utcfromtimestamp(order['detected_at']).isoformat(),
+        'filled_at': datetime.utcfromtimestamp(now).isoformat(),
+        'quantity': quantity,
+        'entry_price': float(ask),
+        'exit_price': float(bid),
+        'fees': float(fees),
+        'profit_loss': float(proceeds - buy_cost - fees),
+        'expected_profit': order['expected_profit'],
+        'spread_percentage': order['spread_percentage'],
+        'confidence': order['confidence'],
+        'episode_id': order['episode_id'],
+    }
+
+
+def summarize(trades: List[dict]) -> dict:
+    pnl = np.array([t['profit_loss'] for t in trades])
+    if len(pnl) == 0:
+        return {'trades': 0, 'total_pnl': 0.0, 'mean_pnl': 0.0, 'win_rate': 0.0, 'max_drawdown': 0.0, 'sharpe': None, 'pnl_by_pair': {}}
+    equity = np.cumsum(pnl)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0)) - equity
+    by_pair: Dict[str, float] = {}
+    for trade in trades:
+        by_pair[trade['pair']] = by_pair.get(trade['pair'], 0.0) + trade['profit_loss']
+    std = pnl.std()
+    return {
+        'trades': len(pnl),
+        'total_pnl': float(pnl.sum()),
+        'mean_pnl': float(pnl.mean()),
+        'win_rate': float((pnl > 0).mean()),
+        'max_drawdown': float(drawdown.max()),
+        # Per-trade, not annualized
+        'sharpe': float(pnl.mean() / std) if std > 0 else None,
+        'pnl_by_pair': by_pair,
+    }
+
+
+def run_sweep(store_root: str, start: datetime, end: datetime, sweep: List[BacktestParams],
+              bundle_path: Optional[str] = None, max_workers: Optional[int] = None) -> List[dict]:
+    """Run one backtest per parameter set in parallel worker processes"""
+    with ProcessPoolExecutor(max_workers=max_workers or min(len(sweep), os.cpu_count() or 1)) as executor:
+        futures = [executor.submit(run_backtest, store_root, start, end, params, bundle_path) for params in sweep]
+        return [future.result() for future in futures]
+
+
+def run_and_store(run_ids: List[int], store_root: str, start: datetime, end: datetime,
+                  sweep: List[BacktestParams], bundle_path: Optional[str] = None):
+    """Background job behind POST /backtests: run the sweep and persist each run's stats and trades"""
+    from . import models
+    from .database import SessionLocal
+
+    try:
+        results = run_sweep(store_root, start, end, sweep, bundle_path)
+    except Exception as e:
+        print(f"Backtest failed: {e}")
+        results = None
+
+    with SessionLocal() as db:
+        for k, run_id in enumerate(run_ids):
+            run = db.query(models.BacktestRun).filter(models.BacktestRun.id == run_id).first()
+            if run is None:
+                continue
+            run.completed_at = datetime.utcnow()
+            if results is None:
+                run.status = "failed"
+                continue
+            result = results[k]
+            run.status = "completed"
+            run.stats = json.dumps(result['stats'])
+            db.add_all(
+                models.VirtualTrade(
+                    user_id=run.user_id,
+                    backtest_run_id=run.id,
+                    crypto_pair=trade['pair'],
+                    buy_exchange=trade['buy_exchange'],
+                    sell_exchange=trade['sell_exchange'],
+                    entry_price=trade['entry_price'],
+                    exit_price=trade['exit_price'],
+                    quantity=trade['quantity'],
+                    profit_loss=trade['profit_loss'],
+                    fees=trade['fees'],
+                    status="closed",
+                    created_at=datetime.fromisoformat(trade['detected_at']),
+                    closed_at=datetime.fromisoformat(trade['filled_at']),
+                )
+                for trade in result['trades']
+            )
+        db.commit()
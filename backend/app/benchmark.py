@@ -0,0 +1,513 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on Windows; memory is then not reported
+    resource = None
+
+from .compact_model import CompactForest, compact_path
+from .detection import detect_opportunities
+from .episodes import EpisodeTracker
+from .feature_store import RollingFeatures
+from .market_stream import MarketStream
+from .ml_engine import ArbitragePredictor, load_bundle, load_serving_bundle, save_bundle
+from .spread_engine import SpreadEngine
+from .ws_protocol import ConnectionManager, Subscriber
+
+
+class BenchmarkConfig(NamedTuple):
+    """One benchmark scale; `rate` is quote updates per second summed over all venues"""
+    pairs: int = 20
+    venues: int = 4
+    rate: float = 200.0
+    sockets: int = 10
+    v2_sockets: int = 0
+    # Pause after each tick; 0 scans back to back, the live scanner uses BROADCAST_INTERVAL
+    interval: float = 0.0
+    duration: float = 10.0
+    warmup: float = 2.0
+    seed: int = 42
+    # Stationary std of each venue's log-price offset; sets how often spreads clear fees
+    dispersion: float = 0.003
+    min_spread: float = 0.05
+    top_k: int = 50
+    notional: float = 100.0
+
+    @property
+    def key(self) -> str:
+        """Baseline key: results are only comparable at the same scale"""
+        return f"{self.pairs}p-{self.venues}v-{self.rate:g}r-{self.sockets}s-{self.v2_sockets}v2-{self.interval:g}i"
+
+
+SCENARIOS = {
+    # Today's production shape: 20 pairs on 4 venues
+    'small': BenchmarkConfig(),
+    'medium': BenchmarkConfig(pairs=200, venues=8, rate=2000, sockets=200, v2_sockets=50),
+    'large': BenchmarkConfig(pairs=1000, venues=12, rate=10000, sockets=1000, v2_sockets=200),
+}
+
+# Result fields checked against a stored baseline, and whether higher is better
+CHECKS = (
+    ('quotes_per_second', True),
+    ('ticks_per_second', True),
+    ('tick_p50_ms', False),
+    ('tick_p99_ms', False),
+    ('pipeline_rss_mb', False),
+)
+
+# Per-update mean reversion of the simulated venue offsets
+REVERSION = 0.05
+# Seconds of quotes each watch_tickers call returns
+FRAME_SECONDS = 0.01
+# Seconds between rolling feature snapshots, as in the live tick recorder
+RECORD_INTERVAL = 1.0
+
+
+class SyntheticExchange:
+    """
+    Deterministic stand-in for a ccxt.pro client. Every pair's price on this
+    venue is its base price times exp(offset), where the offset follows a
+    mean-reverting random walk, so cross-venue spreads open and close like a
+    real market. The sequence of quotes depends only on the seed; `rate`
+    paces it in real time. A venue that falls more than a second behind (the
+    pipeline can't keep up) drops the backlog rather than bursting, so
+    achieved < target rate shows saturation.
+    """
+
+    has = {'watchTickers': True}
+
+    def __init__(self, symbols: List[str], base_prices: np.ndarray, rate: float, seed: int,
+                 dispersion: float = 0.003, half_spread: float = 0.0002):
+        self.symbols = list(symbols)
+        self.base_prices = base_prices
+        self.rng = np.random.default_rng(seed)
+        self.offsets = self.rng.normal(0.0, dispersion, len(self.symbols))
+        self.step = dispersion * np.sqrt(2 * REVERSION - REVERSION ** 2)
+        self.half_spread = half_spread
+        # 24h quote volume per pair; its own stream, so the quote sequence doesn't depend on it
+        self.quote_volumes = 10 ** np.random.default_rng([seed, 1]).uniform(5, 8, len(self.symbols))
+        self.batch = max(1, int(round(rate * FRAME_SECONDS)))
+        self.frame_seconds = self.batch / rate
+        self.next_frame: Optional[float] = None
+        self.sent = 0
+
+    async def watch_tickers(self, symbols: Optional[List[str]] = None) -> dict:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.next_frame is None or self.next_frame < now - 1.0:
+            self.next_frame = now
+        self.next_frame += self.frame_seconds
+        # Always yield, like a real feed
+        await asyncio.sleep(max(self.next_frame - loop.time(), 0))
+
+        rows = self.rng.integers(len(self.symbols), size=self.batch)
+        offsets = self.offsets[rows] * (1 - REVERSION) + self.step * self.rng.standard_normal(self.batch)
+        self.offsets[rows] = offsets
+        mids = self.base_prices[rows] * np.exp(offsets)
+        timestamp = int(time.time() * 1000)
+        tickers = {}
+        for row, mid in zip(rows.tolist(), mids.tolist()):
+            symbol = self.symbols[row]
+            tickers[symbol] = {
+                'symbol': symbol,
+                'bid': mid * (1 - self.half_spread),
+                'ask': mid * (1 + self.half_spread),
+                'last': mid,
+                'quoteVolume': self.quote_volumes[row],
+                'timestamp': timestamp,
+            }
+        self.sent += len(tickers)
+        return tickers
+
+    async def close(self):
+        pass
+
+
+class BenchmarkSocket:
+    """Stands in for a client WebSocket: counts what it is sent and yields like a real send"""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        self.messages += 1
+        self.bytes += len(data)
+        await asyncio.sleep(0)
+
+    async def send_bytes(self, data: bytes):
+        self.messages += 1
+        self.bytes += len(data)
+        await asyncio.sleep(0)
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+def _percentile_ms(values: List[float], q: float) -> Optional[float]:
+    return float(np.percentile(values, q) * 1000) if values else None
+
+
+async def run_benchmark(config: BenchmarkConfig, bundle_path: Optional[str] = None) -> dict:
+    """
+    Drive synthetic venues through the live ingestion (MarketStream), spread
+    matrix, execution check, model scoring and socket fan-out for
+    `duration` seconds after a warmup, and report throughput, tick latency
+    and memory. A tick is one scan of the matrix plus its v1 broadcast; v2
+    subscribers are served by their own sender tasks, as in production.
+    """
+    rss_before = _peak_rss_mb()
+    pairs = [f"SYN{i:04d}/USDT" for i in range(config.pairs)]
+    venues = [f"venue{j}" for j in range(config.venues)]
+    base_prices = 10 ** np.random.default_rng(config.seed).uniform(-2, 5, config.pairs)
+    exchanges = {
+        name: SyntheticExchange(pairs, base_prices, config.rate / config.venues, config.seed + 1 + j, config.dispersion)
+        for j, name in enumerate(venues)
+    }
+
+    predictor = ArbitragePredictor()
+    if bundle_path:
+        predictor.swap(load_serving_bundle(bundle_path))
+    engine = SpreadEngine(pairs, venues)
+    rolling_features = RollingFeatures(len(pairs))
+    # Bounded; the benchmark never drains it
+    episode_tracker = EpisodeTracker()
+    changed = asyncio.Event()
+
+    async def on_update(pair: str):
+        # Same as the live on_price_update
+        i = engine.pair_index[pair]
+        was_listed = engine.best_spread[i] > config.min_spread
+        engine.set_quotes(pair, stream.cache.get_pair(pair))
+        if was_listed or engine.best_spread[i] > config.min_spread:
+            changed.set()
+
+    stream = MarketStream(exchanges, pairs, on_update=on_update)
+
+    def scan() -> List[dict]:
+        """get_real_market_data over top-of-book quotes (the simulator streams no books)"""
+        return detect_opportunities(
+            engine,
+            predictor,
+            rolling_features,
+            now=time.time(),
+            notional=config.notional,
+            top_k=config.top_k,
+            min_spread=config.min_spread,
+            episode_tracker=episode_tracker,
+        )
+
+    manager = ConnectionManager()
+    sockets = []
+    for _ in range(config.sockets):
+        socket = BenchmarkSocket()
+        await manager.connect(socket)
+        sockets.append(socket)
+    tasks = []
+    for _ in range(config.v2_sockets):
+        socket = BenchmarkSocket()
+        await manager.connect(socket, full_updates=False)
+        sockets.append(socket)
+        subscriber = Subscriber(socket)
+        subscriber.subscribe(None, 0.0, "json", [])
+        manager.subscribers.append(subscriber)
+        tasks.append(asyncio.create_task(subscriber.run()))
+
+    latencies: List[float] = []
+    published: List[int] = []
+    lags: List[float] = []
+
+    async def scanner():
+        while True:
+            await changed.wait()
+            changed.clear()
+            started = time.perf_counter()
+            opportunities = scan()
+            await manager.publish(opportunities)
+            latencies.append(time.perf_counter() - started)
+            published.append(len(opportunities))
+            await asyncio.sleep(config.interval)
+
+    async def recorder():
+        while True:
+            rolling_features.update(engine.bids.copy(), engine.asks.copy(), engine.volumes.copy())
+            await asyncio.sleep(RECORD_INTERVAL)
+
+    async def lag_probe():
+        # How late a 10 ms timer fires: event loop saturation
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - started - 0.01)
+
+    stream.start()
+    tasks += [asyncio.create_task(scanner()), asyncio.create_task(recorder()), asyncio.create_task(lag_probe())]
+    try:
+        await asyncio.sleep(config.warmup)
+        quotes_start = sum(e.sent for e in exchanges.values())
+        messages_start = sum(s.messages for s in sockets)
+        bytes_start = sum(s.bytes for s in sockets)
+        latencies.clear()
+        published.clear()
+        lags.clear()
+        started = time.perf_counter()
+        await asyncio.sleep(config.duration)
+        elapsed = time.perf_counter() - started
+        quotes = sum(e.sent for e in exchanges.values()) - quotes_start
+        messages = sum(s.messages for s in sockets) - messages_start
+        sent_bytes = sum(s.bytes for s in sockets) - bytes_start
+    finally:
+        # Also stops the v1 writers
+        for socket in sockets:
+            manager.disconnect(socket)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await stream.stop()
+
+    rss_after = _peak_rss_mb()
+    return {
+        'config': config._asdict(),
+        'quotes_per_second': quotes / elapsed,
+        'target_quotes_per_second': config.rate,
+        'ticks_per_second': len(latencies) / elapsed,
+        'tick_p50_ms': _percentile_ms(latencies, 50),
+        'tick_p99_ms': _percentile_ms(latencies, 99),
+        'tick_max_ms': _percentile_ms(latencies, 100),
+        'opportunities_per_tick': float(np.mean(published)) if published else 0.0,
+        'messages_per_second': messages / elapsed,
+        'bytes_per_second': sent_bytes / elapsed,
+        'loop_lag_p99_ms': _percentile_ms(lags, 99),
+        'peak_rss_mb': rss_after,
+        # Growth of the peak beyond what the process used before the pipeline was built
+        'pipeline_rss_mb': rss_after - rss_before if rss_after is not None else None,
+    }
+
+
+def run_scenario(config: BenchmarkConfig, bundle_path: Optional[str] = None) -> dict:
+    return asyncio.run(run_benchmark(config, bundle_path))
+
+
+# Serving formats of one trained bundle, compared by --model
+MODEL_FORMATS = ('sklearn', 'compact')
+MODEL_BATCH_SIZES = (1, 50, 1000)
+
+
+def run_model_benchmark(bundle_path: str, serving: str, calls: int = 500) -> dict:
+    """
+    Cold load and per-call scoring cost of one serving format, measured in a
+    fresh process so the load pays for its imports (scikit-learn is only
+    imported by unpickling the sklearn bundle) and starts from a clean heap.
+    """
+    path = compact_path(bundle_path) if serving == 'compact' else bundle_path
+    rss_before = _peak_rss_mb()
+    started = time.perf_counter()
+    bundle = CompactForest.load(path) if serving == 'compact' else load_bundle(path)
+    load_seconds = time.perf_counter() - started
+    rss_after = _peak_rss_mb()
+
+    predictor = ArbitragePredictor()
+    predictor.swap(bundle)
+    rng = np.random.default_rng(0)
+    latencies = {}
+    for size in MODEL_BATCH_SIZES:
+        features = np.column_stack([rng.uniform(0, 2, size), rng.uniform(0, 0.05, size), rng.uniform(0, 15, size)])
+        predictor.predict_batch(features)
+        samples = []
+        for _ in range(calls):
+            started = time.perf_counter()
+            predictor.predict_batch(features)
+            samples.append(time.perf_counter() - started)
+        latencies[size] = samples
+
+    result = {
+        'serving': serving,
+        'artifact_bytes': os.path.getsize(path),
+        'load_ms': load_seconds * 1000,
+        'load_rss_mb': rss_after - rss_before if rss_after is not None else None,
+    }
+    for size, samples in latencies.items():
+        result[f'predict_{size}_p50_ms'] = _percentile_ms(samples, 50)
+        result[f'predict_{size}_p99_ms'] = _percentile_ms(samples, 99)
+    return result
+
+
+def format_model_result(result: dict) -> str:
+    def number(key, digits=2):
+        value = result[key]
+        return "n/a" if value is None else f"{value:,.{digits}f}"
+
+    lines = [
+        f"{result['serving']}",
+        f"  artifact    {result['artifact_bytes'] / 1024:,.0f} KiB",
+        f"  cold load   {number('load_ms', 1)} ms   memory {number('load_rss_mb', 1)} MB",
+    ]
+    for size in MODEL_BATCH_SIZES:
+        lines.append(
+            f"  batch {size:<5} p50 {number(f'predict_{size}_p50_ms', 3)} ms   p99 {number(f'predict_{size}_p99_ms', 3)} ms"
+        )
+    return "\n".join(lines)
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions of `result` against `baseline` beyond a relative tolerance"""
+    regressions = []
+    for key, higher_is_better in CHECKS:
+        old, new = baseline.get(key), result.get(key)
+        if old is None or new is None:
+            continue
+        if higher_is_better and new < old * (1 - tolerance):
+            regressions.append(f"{key} fell to {new:.3f} from {old:.3f}")
+        elif not higher_is_better and new > old * (1 + tolerance):
+            regressions.append(f"{key} rose to {new:.3f} from {old:.3f}")
+    return regressions
+
+
+def median_result(runs: List[dict]) -> dict:
+    """One result from repeated runs of a scenario: the median of every measured number"""
+    result = dict(runs[0])
+    for key, value in runs[0].items():
+        if isinstance(value, (int, float)):
+            values = [run[key] for run in runs if run[key] is not None]
+            result[key] = float(np.median(values)) if values else None
+    return result
+
+
+def load_baselines(path: str) -> Dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(path: str, baselines: Dict[str, dict]):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def format_result(name: str, result: dict) -> str:
+    def number(key, digits=1):
+        value = result[key]
+        return "n/a" if value is None else f"{value:,.{digits}f}"
+
+    return (
+        f"{name} ({BenchmarkConfig(**result['config']).key})\n"
+        f"  quotes/s    {number('quotes_per_second', 0)} of {number('target_quotes_per_second', 0)}\n"
+        f"  ticks/s     {number('ticks_per_second')}  ({number('opportunities_per_tick')} opportunities each)\n"
+        f"  tick p50    {number('tick_p50_ms', 2)} ms   p99 {number('tick_p99_ms', 2)} ms   max {number('tick_max_ms', 2)} ms\n"
+        f"  loop lag    p99 {number('loop_lag_p99_ms', 2)} ms\n"
+        f"  sockets     {number('messages_per_second', 0)} msg/s   {number('bytes_per_second', 0)} B/s\n"
+        f"  memory      peak {number('peak_rss_mb')} MB   pipeline {number('pipeline_rss_mb')} MB"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Offline benchmark of the scan -> score -> broadcast pipeline; needs no
+    network. Exits non-zero if any scenario regressed against the baseline file.
+
+        python -m app.benchmark --repeat 5 --baseline benchmark_baselines.json --tolerance 0.5
+
+    With --model, instead compares load time, memory and scoring latency of
+    a trained bundle served by scikit-learn and as its compact export:
+
+        python -m app.benchmark --model arbitrage_bundle.joblib
+    """
+    parser = argparse.ArgumentParser(prog="python -m app.benchmark", description=main.__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", choices=[*SCENARIOS, "all"], default="small")
+    parser.add_argument("--pairs", type=int, help="override the scenario's pair count")
+    parser.add_argument("--venues", type=int)
+    parser.add_argument("--rate", type=float, help="quote updates per second over all venues")
+    parser.add_argument("--sockets", type=int, help="v1 sockets receiving every tick")
+    parser.add_argument("--v2-sockets", type=int, help="v2 subscribers receiving deltas")
+    parser.add_argument("--interval", type=float, help="seconds between ticks (default: back to back)")
+    parser.add_argument("--duration", type=float, help="measured seconds per scenario")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scenario; the median of each metric is reported")
+    parser.add_argument("--bundle", help="score with this model bundle instead of the fallback rule")
+    parser.add_argument("--model", help="benchmark the serving formats of this model bundle instead")
+    parser.add_argument("--baseline", help="JSON file of baselines to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="record these results as the new baselines")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+    if args.save_baseline and not args.baseline:
+        parser.error("--save-baseline needs --baseline")
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    if args.model:
+        if not os.path.exists(compact_path(args.model)):
+            # Bundles saved before the compact export existed
+            save_bundle(load_bundle(args.model), args.model)
+        model_results = {}
+        for serving in MODEL_FORMATS:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                model_results[serving] = executor.submit(run_model_benchmark, args.model, serving).result()
+            if not args.json:
+                print(format_model_result(model_results[serving]))
+        parity = CompactForest.load(compact_path(args.model)).parity
+        if args.json:
+            print(json.dumps({'formats': model_results, 'parity': parity}, indent=2))
+        elif parity:
+            print(f"parity      max |dp| {parity['max_abs_diff']:.2e}   label agreement {parity['label_agreement']:.4f}"
+                  f"   accuracy {parity['compact_accuracy']:.3f} vs {parity['sklearn_accuracy']:.3f}"
+                  f" on {parity['samples']} held-out rows")
+        return 0
+
+    overrides = {
+        field: getattr(args, field)
+        for field in ('pairs', 'venues', 'rate', 'sockets', 'v2_sockets', 'interval', 'duration', 'seed')
+        if getattr(args, field) is not None
+    }
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    baselines = load_baselines(args.baseline) if args.baseline else {}
+
+    results = {}
+    regressed = False
+    for name in names:
+        config = SCENARIOS[name]._replace(**overrides)
+        runs = []
+        for _ in range(args.repeat):
+            # Fresh process per run, so memory and warm caches don't carry over
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                runs.append(executor.submit(run_scenario, config, args.bundle).result())
+        result = median_result(runs)
+        results[config.key] = result
+        if not args.json:
+            print(format_result(name, result))
+        if config.key in baselines and not args.save_baseline:
+            regressions = compare(result, baselines[config.key], args.tolerance)
+            for regression in regressions:
+                print(f"  REGRESSION  {regression}")
+            regressed = regressed or bool(regressions)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    if args.save_baseline:
+        baselines.update(results)
+        save_baselines(args.baseline, baselines)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
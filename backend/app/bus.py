@@ -0,0 +1,81 @@
+import asyncio
+import json
+from typing import AsyncIterator, Dict, List, Optional
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # only needed for multi-process deployments
+    aioredis = None
+
+# Channels the scanner publishes on
+TICKS_CHANNEL = "arbitrage:ticks"
+CYCLES_CHANNEL = "arbitrage:cycles"
+
+
+class LocalBus:
+    """
+    In-process pub/sub with the same interface as RedisBus. Used when the
+    scanner and the socket fan-out run in one process, and in tests.
+
+    Each subscriber gets its own bounded queue; a subscriber that falls behind
+    loses its oldest messages rather than growing without limit.
+    """
+
+    def __init__(self, max_pending: int = 100):
+        self.max_pending = max_pending
+        self.queues: Dict[str, List[asyncio.Queue]] = {}
+
+    async def publish(self, channel: str, message: dict):
+        for queue in self.queues.get(channel, []):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[dict]:
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        self.queues.setdefault(channel, []).append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.queues[channel].remove(queue)
+
+    async def close(self):
+        pass
+
+
+class RedisBus:
+    """
+    Redis pub/sub between one scanner process and N web workers. Messages are
+    JSON, serialized once by the publisher; each worker decodes a tick once
+    and fans it out to its own sockets.
+    """
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("BUS_URL points at Redis but the redis package is not installed")
+        self.redis = aioredis.from_url(url)
+
+    async def publish(self, channel: str, message: dict):
+        await self.redis.publish(channel, json.dumps(message))
+
+    async def subscribe(self, channel: str) -> AsyncIterator[dict]:
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            async for item in pubsub.listen():
+                if item["type"] == "message":
+                    yield json.loads(item["data"])
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.close()
+
+    async def close(self):
+        await self.redis.close()
+
+
+def create_bus(url: Optional[str]):
+    """Redis bus for redis:// URLs, otherwise the in-process stand-in"""
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisBus(url)
+    return LocalBus()
@@ -0,0 +1,172 @@
+import json
+import os
+import struct
+import zipfile
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class CompactForest:
+    """
+    Serving form of a trained RandomForestClassifier + StandardScaler.
+
+    Every tree's nodes are packed into shared flat arrays (split feature,
+    threshold, left/right child, class-1 probability), and the scaler is
+    folded into the thresholds: (x - mean) / scale <= t is the same test as
+    x <= t * scale + mean, so raw features are compared directly. Prediction
+    walks every (row, tree) pair at once with vectorized gathers, dropping
+    pairs from the walk as they reach a leaf, then averages over the trees.
+    No scikit-learn objects are loaded, so the artifact is a few plain
+    arrays instead of a pickled estimator graph, and load() memory-maps
+    them straight out of the (uncompressed) .npz instead of copying them.
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray, right: np.ndarray,
+                 value: np.ndarray, roots: np.ndarray, depth: int, trained_at: str = "", parity: Optional[dict] = None,
+                 feature_set: str = ""):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.depth = depth
+        self.trained_at = trained_at
+        self.feature_set = feature_set
+        # Agreement with the sklearn model on its held-out split, recorded at export
+        self.parity = parity
+        # Leaves point back at themselves
+        self.is_leaf = left == np.arange(len(left))
+
+    @classmethod
+    def from_bundle(cls, bundle) -> "CompactForest":
+        mean = np.asarray(bundle.scaler.mean_ if bundle.scaler.mean_ is not None else 0.0, dtype=float)
+        scale = np.asarray(bundle.scaler.scale_ if bundle.scaler.scale_ is not None else 1.0, dtype=float)
+        n_features = bundle.model.n_features_in_
+        mean, scale = np.broadcast_to(mean, n_features), np.broadcast_to(scale, n_features)
+        # Column of predict_proba served as the confidence
+        positive = 1
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in bundle.model.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left < 0
+            feature = np.where(leaf, 0, tree.feature)
+            features.append(feature)
+            thresholds.append(np.where(leaf, 0.0, tree.threshold * scale[feature] + mean[feature]))
+            lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+            counts = tree.value[:, 0, :]
+            values.append(counts[:, positive] / counts.sum(axis=1))
+            roots.append(offset)
+            offset += tree.node_count
+            depth = max(depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int8 if n_features < 128 else np.int32),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts).astype(np.int32),
+            right=np.concatenate(rights).astype(np.int32),
+            value=np.concatenate(values),
+            roots=np.array(roots, dtype=np.int32),
+            depth=depth,
+            trained_at=bundle.trained_at,
+            feature_set=bundle.feature_set,
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left, self.right, self.value, self.roots))
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """Class-1 probability for each row of raw (unscaled) features"""
+        x = np.asarray(features, dtype=float)
+        n_trees = len(self.roots)
+        # One flat slot per (row, tree) pair; `active` are those not at a leaf yet
+        node = np.tile(self.roots, len(x))
+        active = np.flatnonzero(~self.is_leaf[node])
+        flat_x = x.ravel()
+        n_features = x.shape[1]
+        while active.size:
+            current = node[active]
+            go_left = flat_x[active // n_trees * n_features + self.feature[current]] <= self.threshold[current]
+            current = np.where(go_left, self.left[current], self.right[current])
+            node[active] = current
+            active = active[~self.is_leaf[current]]
+        return self.value[node].reshape(len(x), n_trees).mean(axis=1)
+
+    def parity_report(self, bundle, features: np.ndarray, labels: np.ndarray) -> dict:
+        """Compare against the sklearn model it was exported from"""
+        features = np.asarray(features, dtype=float)
+        labels = np.asarray(labels)
+        expected = bundle.model.predict_proba(bundle.scaler.transform(features))[:, 1]
+        actual = self.predict_proba(features)
+        return {
+            'samples': int(len(features)),
+            'max_abs_diff': float(np.abs(expected - actual).max()) if len(features) else 0.0,
+            'label_agreement': float(((expected > 0.5) == (actual > 0.5)).mean()) if len(features) else 1.0,
+            'sklearn_accuracy': float(((expected > 0.5) == labels).mean()) if len(features) else None,
+            'compact_accuracy': float(((actual > 0.5) == labels).mean()) if len(features) else None,
+        }
+
+    def save(self, path: str):
+        """Write atomically, like save_bundle"""
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            feature=self.feature,
+            threshold=self.threshold,
+            left=self.left,
+            right=self.right,
+            value=self.value,
+            roots=self.roots,
+            meta=np.array(json.dumps({
+                'depth': self.depth, 'trained_at': self.trained_at, 'parity': self.parity, 'feature_set': self.feature_set,
+            })),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CompactForest":
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+        arrays = _mmap_npz(path, ('feature', 'threshold', 'left', 'right', 'value', 'roots'))
+        return cls(**arrays, depth=meta['depth'], trained_at=meta['trained_at'], parity=meta['parity'],
+                   feature_set=meta.get('feature_set', ''))
+
+
+def _mmap_npz(path: str, names) -> Dict[str, np.ndarray]:
+    """
+    Read-only memory maps of arrays in an np.savez archive. np.load ignores
+    mmap_mode for .npz, but savez stores members uncompressed, so each
+    array's data sits at a fixed offset in the file and can be mapped there.
+    """
+    arrays = {}
+    with open(path, 'rb') as raw, zipfile.ZipFile(raw) as archive:
+        for name in names:
+            info = archive.getinfo(f'{name}.npy')
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as f:
+                    arrays[name] = np.lib.format.read_array(f)
+                continue
+            # The member's data follows its local header, whose extra field can differ from the central directory's
+            raw.seek(info.header_offset)
+            local = raw.read(30)
+            name_length, extra_length = struct.unpack('<HH', local[26:30])
+            data_offset = info.header_offset + 30 + name_length + extra_length
+            raw.seek(data_offset)
+            version = np.lib.format.read_magic(raw)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(raw)
+            arrays[name] = np.memmap(raw, dtype=dtype, mode='r', offset=raw.tell(), shape=shape,
+                                     order='F' if fortran_order else 'C')
+    return arrays
+
+
+def compact_path(bundle_path: str) -> str:
+    """Where the compact export of a joblib bundle lives"""
+    return f"{os.path.splitext(bundle_path)[0]}.compact.npz"
@@ -0,0 +1,235 @@
+import math
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class CycleDetector:
+    """
+    Triangular / multi-hop arbitrage over a currency graph.
+
+    Nodes are (exchange, currency). Every market BASE/QUOTE on an exchange adds
+    two edges: BASE -> QUOTE at the bid and QUOTE -> BASE at 1/ask, each with
+    weight -log(rate * (1 - fee)). Optionally the same currency on two venues is
+    joined by transfer edges with a proportional cost. A profitable loop is a
+    negative-weight cycle.
+
+    Edge weights live in NumPy arrays and are overwritten in place when a
+    market's quote changes; the arrays are only re-indexed when new markets
+    appear. detect() runs a bounded number of vectorized Bellman-Ford rounds
+    (one round per hop) and extracts cycles from the predecessor graph.
+    Market edges not refreshed within max_age seconds are left out, so a
+    venue that stops answering can't keep an old quote in a cycle.
+    """
+
+    def __init__(
+        self,
+        max_hops: int = 4,
+        transfer_cost: Optional[float] = 0.002,
+        min_profit: float = 0.0,
+        max_age: Optional[float] = None,
+    ):
+        self.max_hops = max_hops
+        self.transfer_cost = transfer_cost
+        self.min_profit = min_profit
+        self.max_age = max_age
+
+        self.nodes: List[Tuple[str, str]] = []
+        self.node_index: Dict[Tuple[str, str], int] = {}
+        # currency -> its nodes on every venue, for transfer edges
+        self.currency_nodes: Dict[str, List[int]] = {}
+
+        self.src = np.empty(0, dtype=np.intp)
+        self.dst = np.empty(0, dtype=np.intp)
+        self.weights = np.empty(0)
+        # When each edge's quote was received; transfer edges never age
+        self.updated = np.empty(0)
+        # Human-readable description per edge: (exchange, market, side)
+        self.edge_info: List[Tuple[str, str, str]] = []
+        # (exchange, symbol) -> (sell edge, buy edge)
+        self.market_edges: Dict[Tuple[str, str], Tuple[int, int]] = {}
+
+        self._pending: List[Tuple[int, int, float, float, Tuple[str, str, str]]] = []
+        self._order: Optional[np.ndarray] = None
+        self._group_starts: Optional[np.ndarray] = None
+        self._group_nodes: Optional[np.ndarray] = None
+        self._group_of_edge: Optional[np.ndarray] = None
+
+    def _node(self, exchange: str, currency: str) -> int:
+        key = (exchange, currency)
+        if key not in self.node_index:
+            me = len(self.nodes)
+            self.node_index[key] = me
+            self.nodes.append(key)
+            venues = self.currency_nodes.setdefault(currency, [])
+            if self.transfer_cost is not None:
+                weight = -math.log(1 - self.transfer_cost)
+                for other in venues:
+                    other_exchange = self.nodes[other][0]
+                    self._pending.append((other, me, weight, math.inf, (other_exchange, currency, 'transfer')))
+                    self._pending.append((me, other, weight, math.inf, (exchange, currency, 'transfer')))
+            venues.append(me)
+        return self.node_index[key]
+
+    def _edge_count(self) -> int:
+        return len(self.weights) + len(self._pending)
+
+    def update_market(
+        self,
+        exchange: str,
+        symbol: str,
+        bid: Optional[float],
+        ask: Optional[float],
+        fee: float = 0.0,
+        now: Optional[float] = None,
+    ):
+        """Set (or add) one market's two edges from its latest bid/ask, received at `now`"""
+        # Derivatives (BTC/USDT:USDT) don't exchange one currency for the other
+        if not bid or not ask or '/' not in symbol or ':' in symbol:
+            return
+        now = time.time() if now is None else now
+        sell_weight = -math.log(bid * (1 - fee))
+        buy_weight = -math.log((1 / ask) * (1 - fee))
+
+        key = (exchange, symbol)
+        edges = self.market_edges.get(key)
+        if edges is not None:
+            sell, buy = edges
+            self._set_weight(sell, sell_weight, now)
+            self._set_weight(buy, buy_weight, now)
+            return
+
+        base, quote = symbol.split('/')
+        b = self._node(exchange, base)
+        q = self._node(exchange, quote)
+        sell = self._edge_count()
+        self._pending.append((b, q, sell_weight, now, (exchange, symbol, 'sell')))
+        self._pending.append((q, b, buy_weight, now, (exchange, symbol, 'buy')))
+        self.market_edges[key] = (sell, sell + 1)
+
+    def update_tickers(self, exchange: str, tickers: dict, fee_for: Callable[[str], float], now: Optional[float] = None):
+        """Update every market in a fetch_tickers response, each net of fee_for(symbol)"""
+        now = time.time() if now is None else now
+        for symbol, ticker in tickers.items():
+            self.update_market(exchange, symbol, ticker.get('bid'), ticker.get('ask'), fee_for(symbol), now)
+
+    def _set_weight(self, edge: int, weight: float, updated: float):
+        if edge < len(self.weights):
+            self.weights[edge] = weight
+            self.updated[edge] = updated
+        else:
+            i = edge - len(self.weights)
+            src, dst, _, _, info = self._pending[i]
+            self._pending[i] = (src, dst, weight, updated, info)
+
+    def _flush(self):
+        """Append newly discovered edges and re-index them by destination"""
+        if not self._pending:
+            return
+        src, dst, weights, updated, info = zip(*self._pending)
+        self.src = np.concatenate([self.src, np.array(src, dtype=np.intp)])
+        self.dst = np.concatenate([self.dst, np.array(dst, dtype=np.intp)])
+        self.weights = np.concatenate([self.weights, np.array(weights)])
+        self.updated = np.concatenate([self.updated, np.array(updated)])
+        self.edge_info.extend(info)
+        self._pending = []
+
+        # Edges grouped by destination so each round is one reduceat
+        self._order = np.argsort(self.dst, kind='stable')
+        sorted_dst = self.dst[self._order]
+        self._group_starts = np.flatnonzero(np.r_[True, sorted_dst[1:] != sorted_dst[:-1]])
+        self._group_nodes = sorted_dst[self._group_starts]
+        self._group_of_edge = np.repeat(np.arange(len(self._group_starts)), np.diff(np.r_[self._group_starts, len(sorted_dst)]))
+
+    def detect(self, limit: int = 20, now: Optional[float] = None) -> List[dict]:
+        """Profitable cycles of up to max_hops edges, best first"""
+        self._flush()
+        if len(self.weights) == 0:
+            return []
+
+        weights = self.weights
+        if self.max_age is not None:
+            # A stale edge can't be traversed
+            now = time.time() if now is None else now
+            weights = np.where(self.updated < now - self.max_age, np.inf, weights)
+
+        n = len(self.nodes)
+        order = self._order
+        src_sorted = self.src[order]
+        weights_sorted = weights[order]
+
+        # Virtual source: every node starts at distance 0
+        dist = np.zeros(n)
+        pred = np.full(n, -1, dtype=np.intp)
+        improved_nodes = np.empty(0, dtype=np.intp)
+
+        for _ in range(self.max_hops):
+            candidate = dist[src_sorted] + weights_sorted
+            best = np.minimum.reduceat(candidate, self._group_starts)
+            improved = best < dist[self._group_nodes] - 1e-12
+            if not improved.any():
+                break
+
+            # First edge achieving the group minimum is the new predecessor
+            is_best = candidate <= best[self._group_of_edge]
+            first_edge = np.full(len(best), -1, dtype=np.intp)
+            hits = np.flatnonzero(is_best)
+            groups = self._group_of_edge[hits]
+            first_edge[groups[::-1]] = hits[::-1]
+
+            improved_nodes = self._group_nodes[improved]
+            dist[improved_nodes] = best[improved]
+            pred[improved_nodes] = order[first_edge[improved]]
+
+        cycles = {}
+        for node in improved_nodes[:200]:
+            cycle = self._extract_cycle(int(node), pred)
+            if cycle is None:
+                continue
+            key = _canonical(cycle)
+            if key in cycles:
+                continue
+            profit = (math.exp(-float(weights[cycle].sum())) - 1) * 100
+            if profit > self.min_profit:
+                cycles[key] = self._describe(cycle, profit)
+
+        return sorted(cycles.values(), key=lambda c: c['profit_percentage'], reverse=True)[:limit]
+
+    def _extract_cycle(self, node: int, pred: np.ndarray) -> Optional[List[int]]:
+        """Walk predecessors from node; return the edges of a loop if one closes"""
+        seen = {}
+        path = []
+        for step in range(2 * self.max_hops + 1):
+            edge = pred[node]
+            if edge < 0:
+                return None
+            if node in seen:
+                cycle = path[seen[node]:]
+                return list(reversed(cycle)) if len(cycle) <= self.max_hops else None
+            seen[node] = step
+            path.append(int(edge))
+            node = int(self.src[edge])
+        return None
+
+    def _describe(self, cycle: List[int], profit: float) -> dict:
+        steps = []
+        for edge in cycle:
+            exchange, market, side = self.edge_info[edge]
+            from_exchange, from_currency = self.nodes[self.src[edge]]
+            to_exchange, to_currency = self.nodes[self.dst[edge]]
+            steps.append({
+                "from": from_currency,
+                "to": to_currency,
+                "exchange": exchange if side != 'transfer' else f"{from_exchange}->{to_exchange}",
+                "market": market if side != 'transfer' else None,
+                "side": side,
+                "rate": math.exp(-float(self.weights[edge])),
+            })
+        return {"steps": steps, "hops": len(cycle), "profit_percentage": profit}
+
+
+def _canonical(cycle: List[int]) -> Tuple[int, ...]:
+    """Same loop regardless of starting edge"""
+    i = cycle.index(min(cycle))
+    return tuple(cycle[i:] + cycle[:i])
@@ -0,0 +1,110 @@
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from .episodes import EpisodeTracker
+from .feature_store import RollingFeatures, candidate_features
+from .metrics import DETECTION_SECONDS, SCORING_SECONDS
+from .ml_engine import ArbitragePredictor
+from .order_book import OrderBook, evaluate_arbitrage, taker_fee, withdrawal_fee
+from .spread_engine import SpreadEngine
+
+
+def static_fee(exchange: str, pair: str) -> float:
+    """Taker fee lookup for venues without market metadata"""
+    return taker_fee(exchange)
+
+
+def detect_opportunities(
+    engine: SpreadEngine,
+    predictor: ArbitragePredictor,
+    rolling_features: RollingFeatures,
+    now: float,
+    notional: float,
+    top_k: int,
+    min_spread: float,
+    fee_for: Callable[[str, str], float] = static_fee,
+    transfer_fee_for: Callable[[str, str], Optional[float]] = withdrawal_fee,
+    book_for: Optional[Callable[[str, str], Optional[OrderBook]]] = None,
+    episode_tracker: Optional[EpisodeTracker] = None,
+) -> List[dict]:
+    """
+    Ranked top-K opportunities in the engine's current price matrix: the
+    detection and scoring path shared by the live scanner, backtests and the
+    benchmark, so the three can't drift apart.
+
+    Each of the widest spreads is walked through the buy venue's asks and
+    the sell venue's bids for a `notional` trade (book_for(pair, exchange),
+    falling back to the top-of-book quote while a venue has no book), net
+    of fee_for(exchange, pair) taker fees and the buy venue's
+    transfer_fee_for(exchange, asset) withdrawal fee. Those that stay
+    profitable are scored in one batch, then tagged with their episodes.
+    """
+    started = time.perf_counter()
+    candidates = []
+    for i, buy, sell, spread_percentage in engine.top_k(top_k, min_spread):
+        pair = engine.pairs[i]
+        buy_exchange, sell_exchange = engine.exchanges[buy], engine.exchanges[sell]
+        buy_book = book_for(pair, buy_exchange) if book_for else None
+        if buy_book is None or len(buy_book.ladder('asks')[0]) == 0:
+            buy_book = OrderBook.from_top(engine.bids[i, buy], engine.asks[i, buy])
+        sell_book = book_for(pair, sell_exchange) if book_for else None
+        if sell_book is None or len(sell_book.ladder('bids')[0]) == 0:
+            sell_book = OrderBook.from_top(engine.bids[i, sell], engine.asks[i, sell])
+        # Drop spreads that can't be executed at a profit after depth and fees
+        execution = evaluate_arbitrage(
+            buy_book,
+            sell_book,
+            notional,
+            fee_for(buy_exchange, pair),
+            fee_for(sell_exchange, pair),
+            transfer_fee_for(buy_exchange, pair.split('/')[0]),
+        )
+        if execution:
+            candidates.append((i, buy, sell, spread_percentage, execution))
+    DETECTION_SECONDS.observe(time.perf_counter() - started)
+    if not candidates:
+        if episode_tracker is not None:
+            episode_tracker.observe(now, [])
+        return []
+
+    rows = np.array([c[0] for c in candidates])
+    buys = np.array([c[1] for c in candidates])
+    sells = np.array([c[2] for c in candidates])
+    min_prices = engine.asks[rows, buys]
+    max_prices = engine.bids[rows, sells]
+    spread_percentages = np.array([c[3] for c in candidates])
+
+    # Score every candidate in one batch on the same rolling features the model was trained on
+    started = time.perf_counter()
+    features, warming = candidate_features(rolling_features, rows, engine.bids, engine.asks, spread_percentages, min_prices)
+    confidences = predictor.predict_batch(features)
+    SCORING_SECONDS.observe(time.perf_counter() - started)
+
+    timestamp = datetime.utcfromtimestamp(now).isoformat()
+    opportunities = [
+        {
+            "pair": engine.pairs[i],
+            "buy_exchange": engine.exchanges[buy],
+            "sell_exchange": engine.exchanges[sell],
+            "buy_price": float(min_prices[k]),
+            "sell_price": float(max_prices[k]),
+            "spread_percentage": spread_percentage,
+            "potential_profit": execution["net_profit"],  # Net of fees for a `notional` trade
+            "executable_size": execution["executable_size"],
+            "net_spread_percentage": execution["net_spread_percentage"],
+            "fees": execution["fees"],
+            "transfer_cost_known": execution["transfer_cost_known"],
+            "confidence_score": float(confidences[k]),
+            "timestamp": timestamp,
+        }
+        for k, (i, buy, sell, spread_percentage, execution) in enumerate(candidates)
+    ]
+
+    if episode_tracker is not None:
+        # Tags each opportunity with the episode it belongs to. Proxy features
+        # aren't what tick-trained models learn from, so warming rows record none
+        episode_tracker.observe(now, opportunities, np.where(warming[:, None], np.nan, features))
+    return opportunities
@@ -0,0 +1,113 @@
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+EpisodeKey = Tuple[str, str, str]
+
+
+class EpisodeTracker:
+    """
+    Follows each (pair, buy_exchange, sell_exchange) opportunity across scan
+    ticks as one episode instead of a new event per tick. An episode opens
+    the first tick the opportunity is published, is updated in place while it
+    stays published, and closes on the first tick it is gone. Closed episodes
+    wait in a bounded buffer until drain() hands them to storage in a batch.
+
+    Durations run from the opening tick to the last tick the opportunity was
+    seen, so they are lower bounds at the scanner's tick resolution; an
+    opportunity that drops out of the published top-K closes its episode.
+    """
+
+    def __init__(self, max_pending: int = 10000):
+        self.open: Dict[EpisodeKey, dict] = {}
+        # Oldest closed episodes are dropped if storage falls this far behind
+        self.closed: Deque[dict] = deque(maxlen=max_pending)
+        # Millisecond clock x 1000, so ids keep increasing across restarts
+        self.next_id = int(time.time() * 1000) * 1000
+
+    def observe(self, now: float, opportunities: List[dict], features: Optional[np.ndarray] = None):
+        """
+        Advance every episode by one tick. Tags each opportunity with its
+        episode_id and episode_started_at; features (aligned with
+        opportunities, as scored) are kept from the opening tick for training.
+        NaN features are stored as missing.
+        """
+        seen = set()
+        for k, opportunity in enumerate(opportunities):
+            key = (opportunity["pair"], opportunity["buy_exchange"], opportunity["sell_exchange"])
+            seen.add(key)
+            spread = opportunity["spread_percentage"]
+            episode = self.open.get(key)
+            if episode is None:
+                episode = self.open[key] = {
+                    "id": self.next_id,
+                    "key": key,
+                    "opened_at": now,
+                    "peak_at": now,
+                    "ticks": 0,
+                    "open_spread": spread,
+                    "peak_spread": spread,
+                    "peak_profit": opportunity.get("potential_profit"),
+                    "volatility": _feature(features, k, 1),
+                    "liquidity": _feature(features, k, 2),
+                }
+                self.next_id += 1
+            elif spread > episode["peak_spread"]:
+                episode["peak_spread"] = spread
+                episode["peak_at"] = now
+            profit = opportunity.get("potential_profit")
+            if profit is not None and (episode["peak_profit"] is None or profit > episode["peak_profit"]):
+                episode["peak_profit"] = profit
+            episode["ticks"] += 1
+            episode["last_seen_at"] = now
+            episode["close_spread"] = spread
+
+            opportunity["episode_id"] = episode["id"]
+            opportunity["episode_started_at"] = datetime.utcfromtimestamp(episode["opened_at"]).isoformat()
+
+        for key in [key for key in self.open if key not in seen]:
+            self.closed.append(_closed_row(self.open.pop(key), now))
+
+    def drain(self) -> List[dict]:
+        """Closed episodes waiting to be stored, as OpportunityEpisode rows"""
+        rows = list(self.closed)
+        self.closed.clear()
+        return rows
+
+    def restore(self, rows: List[dict]):
+        """Put back rows whose write failed, ahead of anything closed since"""
+        self.closed.extendleft(reversed(rows))
+
+
+def _feature(features: Optional[np.ndarray], k: int, column: int) -> Optional[float]:
+    if features is None or np.isnan(features[k, column]):
+        return None
+    return float(features[k, column])
+
+
+def _closed_row(episode: dict, now: float) -> dict:
+    pair, buy_exchange, sell_exchange = episode["key"]
+    since_peak = episode["last_seen_at"] - episode["peak_at"]
+    return {
+        "id": episode["id"],
+        "crypto_pair": pair,
+        "buy_exchange": buy_exchange,
+        "sell_exchange": sell_exchange,
+        "opened_at": datetime.utcfromtimestamp(episode["opened_at"]),
+        "peak_at": datetime.utcfromtimestamp(episode["peak_at"]),
+        "last_seen_at": datetime.utcfromtimestamp(episode["last_seen_at"]),
+        "closed_at": datetime.utcfromtimestamp(now),
+        "duration": episode["last_seen_at"] - episode["opened_at"],
+        "ticks": episode["ticks"],
+        "open_spread": episode["open_spread"],
+        "peak_spread": episode["peak_spread"],
+        "close_spread": episode["close_spread"],
+        "peak_profit": episode["peak_profit"],
+        # Spread percentage points lost per second between the peak and the last sighting
+        "decay_rate": (episode["peak_spread"] - episode["close_spread"]) / since_peak if since_peak > 0 else None,
+        "volatility": episode["volatility"],
+        "liquidity": episode["liquidity"],
+    }
@@ -0,0 +1,137 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .ml_engine import VOLATILITY_WINDOW, proxy_features
+
+
+class RollingWindow:
+    """
+    The last `window` values of many independent series, in one fixed-size
+    ring buffer with running sums, so a push costs O(1) per series and no
+    pandas. mean and std (sample, ddof=1) are NaN until a series has
+    `window` values, like pandas rolling().
+    """
+
+    def __init__(self, n_series: int, window: int):
+        self.window = window
+        self.values = np.zeros((n_series, window))
+        self.position = np.zeros(n_series, dtype=np.intp)
+        self.count = np.zeros(n_series, dtype=np.intp)
+        self.sum = np.zeros(n_series)
+        self.sumsq = np.zeros(n_series)
+        self.mean = np.full(n_series, np.nan)
+        self.std = np.full(n_series, np.nan)
+
+    def push(self, rows: np.ndarray, value: np.ndarray):
+        """Append one value to each of the (distinct) series in rows"""
+        if rows.size == 0:
+            return
+        # Replace the oldest value once the ring is full
+        position = self.position[rows]
+        oldest = np.where(self.count[rows] == self.window, self.values[rows, position], 0.0)
+        self.values[rows, position] = value
+        self.sum[rows] += value - oldest
+        self.sumsq[rows] += value * value - oldest * oldest
+        self.position[rows] = (position + 1) % self.window
+        self.count[rows] = np.minimum(self.count[rows] + 1, self.window)
+
+        # Re-sum each ring once per lap so float error in the running sums can't accumulate
+        wrapped = rows[self.position[rows] == 0]
+        self.sum[wrapped] = self.values[wrapped].sum(axis=1)
+        self.sumsq[wrapped] = (self.values[wrapped] ** 2).sum(axis=1)
+
+        full = rows[self.count[rows] == self.window]
+        self.mean[full] = self.sum[full] / self.window
+        variance = (self.sumsq[full] - self.sum[full] ** 2 / self.window) / (self.window - 1)
+        self.std[full] = np.sqrt(np.maximum(variance, 0.0))
+
+
+class RollingFeatures:
+    """
+    Streaming version of ArbitragePredictor.prepare_tick_features.
+
+    Fed the same pairs x exchanges bid/ask snapshots the tick recorder writes,
+    it keeps per pair the last `window` mid-price returns and cross-venue
+    spreads, and per pair and venue the last `window` quote volumes, each in
+    a RollingWindow. The model features match training exactly:
+
+    - only snapshots where at least two venues quote a pair count
+    - mid is the mean of (bid + ask) / 2 over the quoting venues
+    - Volatility is the sample std (ddof=1) of the last `window` returns
+    - Spread_Proxy is (max bid - min ask) / min ask * 100
+    - Liquidity is log(min ask * 100)
+
+    history() adds the spread's rolling mean and std and the pair's rolling
+    quote volume, which the model is not trained on.
+    """
+
+    def __init__(self, n_pairs: int, window: int = VOLATILITY_WINDOW):
+        self.window = window
+        self.returns = RollingWindow(n_pairs, window)
+        self.spreads = RollingWindow(n_pairs, window)
+        # pairs x venues, flattened; sized by the first snapshot that carries volumes
+        self.volumes: Optional[RollingWindow] = None
+        self.last_mid = np.full(n_pairs, np.nan)
+
+    @property
+    def volatility(self) -> np.ndarray:
+        return self.returns.std
+
+    def update(self, bids: np.ndarray, asks: np.ndarray, volumes: Optional[np.ndarray] = None):
+        """Advance every quoted pair by one snapshot; volumes (quote volume per cell, NaN if unknown) is optional"""
+        if volumes is not None:
+            if self.volumes is None:
+                self.volumes = RollingWindow(volumes.size, self.window)
+            flat = volumes.ravel()
+            reported = np.flatnonzero(~np.isnan(flat))
+            self.volumes.push(reported, flat[reported])
+
+        quoted = np.flatnonzero((~np.isnan(bids) & ~np.isnan(asks)).sum(axis=1) >= 2)
+        if quoted.size == 0:
+            return
+        best_ask = np.nanmin(asks[quoted], axis=1)
+        self.spreads.push(quoted, (np.nanmax(bids[quoted], axis=1) - best_ask) / best_ask * 100)
+
+        mid = np.nanmean((bids[quoted] + asks[quoted]) / 2, axis=1)
+        previous = self.last_mid[quoted]
+        self.last_mid[quoted] = mid
+        has_previous = ~np.isnan(previous)
+        self.returns.push(quoted[has_previous], mid[has_previous] / previous[has_previous] - 1)
+
+    def features(self, rows: np.ndarray, bids: np.ndarray, asks: np.ndarray) -> np.ndarray:
+        """
+        [Spread_Proxy, Volatility, Liquidity] for the given pair rows, using
+        the current quotes for spread and liquidity. Volatility is NaN for
+        pairs still filling their window.
+        """
+        best_bid = np.nanmax(bids[rows], axis=1)
+        best_ask = np.nanmin(asks[rows], axis=1)
+        spread = (best_bid - best_ask) / best_ask * 100
+        return np.column_stack([spread, self.volatility[rows], np.log(best_ask * 100)])
+
+    def history(self, rows: np.ndarray) -> np.ndarray:
+        """
+        [spread mean, spread std, quote volume] over the window for the given
+        pair rows. Quote volume sums the rolling means of the venues with a
+        full window; every column is NaN until its window fills.
+        """
+        volume = np.full(len(rows), np.nan)
+        if self.volumes is not None:
+            per_venue = self.volumes.mean.reshape(len(self.last_mid), -1)[rows]
+            known = ~np.isnan(per_venue).all(axis=1)
+            volume[known] = np.nansum(per_venue[known], axis=1)
+        return np.column_stack([self.spreads.mean[rows], self.spreads.std[rows], volume])
+
+
+def candidate_features(store: RollingFeatures, rows: np.ndarray, bids: np.ndarray, asks: np.ndarray,
+                       spread_percentages: np.ndarray, buy_prices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Model inputs for detected candidates, and which of them are still warming:
+    pairs without a full window fall back to the proxy features.
+    """
+    features = store.features(rows, bids, asks)
+    warming = np.isnan(features).any(axis=1)
+    if warming.any():
+        features[warming] = proxy_features(spread_percentages[warming], buy_prices[warming])
+    return features, warming
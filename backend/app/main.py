@@ -1,22 +1,48 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base
+from .database import engine, async_engine, Base, AsyncSessionLocal, add_missing_columns, add_missing_indexes
+from . import auth, models
 from .routes import router
 from .ml_engine import predictor
-import ccxt.async_support as ccxt
-from typing import Dict, List
+from .feature_store import RollingFeatures
+from .detection import detect_opportunities
+from .market_stream import MarketStream, ReplayExchange
+from .scan_cadence import ScanCadence
+from .spread_engine import SpreadEngine
+from .order_book import taker_fee
+from .tick_store import tick_store
+from .model_manager import ModelManager
+from .ws_protocol import ConnectionManager, Subscriber, msgpack
+from .cycle_detector import CycleDetector
+from .alert_engine import alert_index
+from .market_metadata import MarketMetadata
+from .episodes import EpisodeTracker
+from .paper_trading import PaperPortfolio
+from .bus import CYCLES_CHANNEL, TICKS_CHANNEL, LocalBus, create_bus
+from .metrics import (
+    MATRIX_UPDATE_SECONDS,
+    TICK_SECONDS,
+    registry,
+)
+import ccxt.pro as ccxtpro
+from typing import Dict, List, Optional
+from sqlalchemy import insert, select
 from datetime import datetime
 import asyncio
 import json
+import time
 import numpy as np
+import os
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+add_missing_columns()
+add_missing_indexes()
 
 app = FastAPI(title="Crypto Arbitrage Tracker API")
 
 # CORS middleware - configurable for production
-import os
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
 app.add_middleware(
@@ -25,44 +51,83 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read by paginating clients and conditional GETs
+    expose_headers=["ETag", "X-Next-Cursor"],
+)
+
+# Process role. "all" scans and serves sockets in one process. To scale out,
+# run one "scanner" process (the only one talking to exchanges and holding the
+# model) publishing on BUS_URL, and any number of stateless "web" workers
+# (e.g. uvicorn --workers N) that fan its ticks out to their sockets.
+APP_ROLE = os.getenv("APP_ROLE", "all")
+if APP_ROLE not in ("all", "scanner", "web"):
+    raise ValueError(f"Unknown APP_ROLE: {APP_ROLE}")
+RUNS_SCANNER = APP_ROLE in ("all", "scanner")
+SERVES_SOCKETS = APP_ROLE in ("all", "web")
+bus = create_bus(os.getenv("BUS_URL"))
+if APP_ROLE != "all" and isinstance(bus, LocalBus):
+    # An in-process bus can't reach other processes: a split scanner's ticks would never arrive
+    raise ValueError(f"APP_ROLE={APP_ROLE} needs BUS_URL set to a redis:// URL")
+
+# Retrain on recorded ticks every MODEL_RETRAIN_HOURS and hot-swap the result
+model_manager = ModelManager(
+    predictor,
+    tick_store.root,
+    retrain_interval=float(os.getenv("MODEL_RETRAIN_HOURS", "6")) * 60 * 60,
 )
 
 # Initialize ML Model on Startup
 @app.on_event("startup")
 async def startup_event():
-    # Run training in background to not block startup
-    import threading
-    threading.Thread(target=predictor.load_model).start()
+    if SERVES_SOCKETS:
+        # Index active alerts so every quote update can evaluate them in memory
+        alert_index.load(await load_active_alerts())
+        asyncio.create_task(tick_listener())
+        asyncio.create_task(cycle_listener())
+        if not isinstance(bus, LocalBus):
+            # Alerts may be edited through another worker
+            asyncio.create_task(alert_sync())
+    if not RUNS_SCANNER:
+        return
 
-# WebSocket Connection Manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    # Load the prebuilt model off the event loop; training and retraining run in a worker process
+    await model_manager.start()
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+    # Markets come from the on-disk cache when fresh, so restarts skip load_markets
+    await market_metadata.load_all(exchanges, TARGET_PAIRS)
+    for name in exchanges:
+        stream.set_symbols(name, market_metadata.symbol_map(name))
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+    # Start streaming quotes, then the single publisher feeding every socket
+    stream.start()
+    tick_store.start()
+    asyncio.create_task(market_scanner())
+    asyncio.create_task(tick_recorder())
+    asyncio.create_task(staleness_monitor())
+    asyncio.create_task(cycle_scanner())
+    asyncio.create_task(episode_flusher())
+    app.state.paper_trader = asyncio.create_task(paper_trader())
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                self.disconnect(connection)
+@app.on_event("shutdown")
+async def shutdown_event():
+    if RUNS_SCANNER:
+        await stream.stop()
+        tick_store.stop()
+        await model_manager.stop()
+        # Episodes still open would be stored with truncated durations, so only closed ones are kept
+        await flush_episodes()
+        # Stop the periodic writer first; a flush it has in flight finishes before the final one
+        app.state.paper_trader.cancel()
+        await asyncio.gather(app.state.paper_trader, return_exceptions=True)
+        try:
+            await paper_portfolio.flush(AsyncSessionLocal)
+        except Exception as e:
+            print(f"Paper trading flush error: {e}")
+    await bus.close()
+    await async_engine.dispose()
 
 manager = ConnectionManager()
 
-# Initialize exchanges
-exchanges = {
-    'binance': ccxt.binance(),
-    'kraken': ccxt.kraken(),
-    'kucoin': ccxt.kucoin(),
-    'bybit': ccxt.bybit(),
-}
-
 # Top 20 Crypto Pairs to Scan (Standardized to CCXT format)
 TARGET_PAIRS = [
     'BTC/USDT', 'ETH/USDT', 'SOL/USDT', 'XRP/USDT', 'ADA/USDT', 
@@ -71,115 +136,411 @@ TARGET_PAIRS = [
     'XLM/USDT', 'ETC/USDT', 'BCH/USDT', 'FIL/USDT', 'APT/USDT'
 ]
 
-async def fetch_prices(name, exchange):
+# Initialize exchanges (ccxt.pro clients stream tickers over each venue's WebSocket feed)
+# Set MARKET_REPLAY_FILE to drive the pipeline from a recorded JSON-lines file instead
+EXCHANGE_NAMES = ['binance', 'kraken', 'kucoin', 'bybit']
+MARKET_REPLAY_FILE = os.getenv("MARKET_REPLAY_FILE")
+if not RUNS_SCANNER:
+    # Web workers never talk to the exchanges
+    exchanges = {}
+elif MARKET_REPLAY_FILE:
+    exchanges = {
+        name: ReplayExchange.from_file(MARKET_REPLAY_FILE, name, loop=True)
+        for name in EXCHANGE_NAMES
+    }
+else:
+    exchanges = {name: getattr(ccxtpro, name)() for name in EXCHANGE_NAMES}
+
+# Filter for profitable spreads (e.g., > 0.1% to cover fees)
+# In real world, > 0.5% is rare and good.
+MIN_SPREAD_PERCENTAGE = 0.05
+# Maximum number of ranked opportunities published per update
+TOP_K = 50
+# Quote currency spent per simulated trade, and order book levels kept per venue
+# (each venue is asked for the nearest depth it accepts, then cut to this)
+TRADE_NOTIONAL = float(os.getenv("TRADE_NOTIONAL", "100"))
+BOOK_DEPTH = 20
+
+# Pairs x exchanges bid/ask matrix; each quote change re-evaluates only that pair's row
+spread_engine = SpreadEngine(TARGET_PAIRS, EXCHANGE_NAMES)
+# Rolling model features, advanced on every recorded snapshot
+rolling_features = RollingFeatures(len(TARGET_PAIRS))
+opportunities_changed = asyncio.Event()
+
+async def on_price_update(pair: str):
+    """Called by the stream whenever a pair's top of book moves on any venue"""
+    started = time.perf_counter()
+    i = spread_engine.pair_index[pair]
+    was_listed = spread_engine.best_spread[i] > MIN_SPREAD_PERCENTAGE
+    spread_engine.set_quotes(pair, stream.cache.get_pair(pair))
+    MATRIX_UPDATE_SECONDS.observe(time.perf_counter() - started)
+    # Only wake the publisher if the published set could have changed
+    if was_listed or spread_engine.best_spread[i] > MIN_SPREAD_PERCENTAGE:
+        opportunities_changed.set()
+
+    if SERVES_SOCKETS:
+        spread = float(spread_engine.best_spread[i])
+        fired = alert_index.evaluate(pair, spread)
+        if fired:
+            # Deliver in the background so slow sockets don't stall the quote stream
+            buy_exchange = spread_engine.exchanges[spread_engine.best_buy[i]]
+            sell_exchange = spread_engine.exchanges[spread_engine.best_sell[i]]
+            asyncio.create_task(notify_alerts(pair, spread, buy_exchange, sell_exchange, fired))
+
+async def notify_alerts(pair: str, spread: float, buy_exchange: str, sell_exchange: str, fired):
+    """Push triggered alerts to the owning users' sockets"""
+    timestamp = datetime.utcnow().isoformat()
+    for alert_id, user_id, min_spread in fired:
+        if user_id not in manager.user_connections:
+            continue
+        message = json.dumps({"type": "alert", "data": {
+            "alert_id": alert_id,
+            "pair": pair,
+            "min_spread": min_spread,
+            "spread_percentage": spread,
+            "buy_exchange": buy_exchange,
+            "sell_exchange": sell_exchange,
+            "timestamp": timestamp
+        }})
+        await manager.send_to_user(user_id, message)
+
+# Venues polled over REST: "adaptive" polls each pair as often as its recent
+# price and spread activity call for, within the venue's rate budget;
+# "fixed" polls every pair every 5 seconds
+SCAN_CADENCE = os.getenv("SCAN_CADENCE", "adaptive")
+scan_cadence = ScanCadence(
+    TARGET_PAIRS,
+    min_interval=float(os.getenv("SCAN_MIN_INTERVAL", "0.5")),
+    max_interval=float(os.getenv("SCAN_MAX_INTERVAL", "30")),
+    min_spread=MIN_SPREAD_PERCENTAGE,
+) if SCAN_CADENCE == "adaptive" else None
+
+stream = MarketStream(exchanges, TARGET_PAIRS, on_update=on_price_update, book_depth=BOOK_DEPTH, cadence=scan_cadence)
+
+# Per-venue markets, symbol mapping, precision and fees, persisted across restarts
+market_metadata = MarketMetadata(
+    os.getenv("MARKET_CACHE_PATH", "./market_cache"),
+    ttl=float(os.getenv("MARKET_CACHE_TTL_HOURS", "24")) * 60 * 60,
+)
+
+def pair_taker_fee(exchange: str, pair: str) -> float:
+    """The market's taker fee from venue metadata, else the static per-venue rate"""
+    return market_metadata.taker_fee(exchange, pair, taker_fee(exchange))
+
+async def get_real_market_data():
+    """
+    Returns the ranked top-K arbitrage opportunities from the live price matrix.
+    Detection runs incrementally in on_price_update as quotes stream in.
+    """
+    return detect_opportunities(
+        spread_engine,
+        predictor,
+        rolling_features,
+        now=time.time(),
+        notional=TRADE_NOTIONAL,
+        top_k=TOP_K,
+        min_spread=MIN_SPREAD_PERCENTAGE,
+        fee_for=pair_taker_fee,
+        transfer_fee_for=market_metadata.withdrawal_fee,
+        book_for=stream.get_book,
+        episode_tracker=episode_tracker,
+    )
+
+def current_spreads() -> Dict[str, list]:
+    """Best spread per quoted pair as [spread, buy_exchange, sell_exchange]"""
+    return {
+        pair: [float(spread_engine.best_spread[i]), spread_engine.exchanges[spread_engine.best_buy[i]], spread_engine.exchanges[spread_engine.best_sell[i]]]
+        for i, pair in enumerate(spread_engine.pairs)
+        if np.isfinite(spread_engine.best_spread[i])
+    }
+
+# Opportunities followed across ticks; closed episodes are written in batches
+episode_tracker = EpisodeTracker()
+EPISODE_FLUSH_INTERVAL = float(os.getenv("EPISODE_FLUSH_SECONDS", "10"))
+
+async def flush_episodes():
+    rows = episode_tracker.drain()
+    if not rows:
+        return
     try:
-        # Fetch all tickers to be efficient
-        # Note: Not all exchanges support fetching specific list of tickers, 
-        # so we might fetch all and filter, or fetch one by one if needed.
-        # Binance supports list.
-        if exchange.has['fetchTickers']:
-            tickers = await exchange.fetch_tickers(TARGET_PAIRS)
-        else:
-            tickers = await exchange.fetch_tickers()
-        return {'exchange': name, 'tickers': tickers}
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(models.OpportunityEpisode), rows)
+            await db.commit()
     except Exception as e:
-        print(f"Error fetching from {name}: {e}")
-        return {'exchange': name, 'tickers': {}}
+        print(f"Episode flush error: {e}")
+        episode_tracker.restore(rows)
 
-async def get_real_market_data():
+async def episode_flusher():
+    while True:
+        await asyncio.sleep(EPISODE_FLUSH_INTERVAL)
+        await flush_episodes()
+
+# Open paper trades, marked to market on every tick; rules auto-execute published opportunities
+paper_portfolio = PaperPortfolio(
+    spread_engine,
+    pair_taker_fee,
+    market_metadata.withdrawal_fee,
+)
+PAPER_FLUSH_INTERVAL = float(os.getenv("PAPER_FLUSH_SECONDS", "5"))
+
+async def paper_trader():
+    """Batch-writes paper trading state, then picks up rules and trades changed through the API"""
+    while True:
+        try:
+            # Shielded so shutdown can't cancel a write halfway and lose what it took
+            await asyncio.shield(paper_portfolio.flush(AsyncSessionLocal))
+            await paper_portfolio.sync(AsyncSessionLocal)
+        except Exception as e:
+            print(f"Paper trading sync error: {e}")
+        await asyncio.sleep(PAPER_FLUSH_INTERVAL)
+
+# Minimum seconds between broadcasts, so bursts of quote updates are coalesced
+BROADCAST_INTERVAL = 1
+
+async def market_scanner():
     """
-    Fetches real-time prices from multiple exchanges using CCXT.
-    Finds arbitrage opportunities by comparing prices.
+    Publishes the opportunity set on the bus whenever the stream changes it.
+    Exchange load is independent of client and worker count.
     """
-    opportunities = []
-    
-    # Fetch prices asynchronously
-    tasks = []
-    for name, exchange in exchanges.items():
-        tasks.append(fetch_prices(name, exchange))
-    
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    
-    # Process results
-    market_prices = {} # { 'BTC/USDT': { 'binance': 50000, 'kraken': 50100 } }
-    
-    for result in results:
-        if isinstance(result, dict):
-            exchange_name = result.get('exchange')
-            tickers = result.get('tickers', {})
-            
-            for pair in TARGET_PAIRS:
-                if pair in tickers:
-                    if pair not in market_prices:
-                        market_prices[pair] = {}
-                    market_prices[pair][exchange_name] = tickers[pair]['last']
-
-    # Find Arbitrage
-    for pair, prices in market_prices.items():
-        if len(prices) < 2:
-            continue
-            
-        # Find min and max prices
-        sorted_prices = sorted(prices.items(), key=lambda x: x[1])
-        min_exchange, min_price = sorted_prices[0]
-        max_exchange, max_price = sorted_prices[-1]
-        
-        spread = max_price - min_price
-        spread_percentage = (spread / min_price) * 100
-        
-        # Filter for profitable spreads (e.g., > 0.1% to cover fees)
-        # In real world, > 0.5% is rare and good.
-        if spread_percentage > 0.05: 
-            # Predict success with AI
-            # Feature engineering for model: [volatility, spread, liquidity]
-            # Simplified for now: using spread as proxy for volatility
-            # We need 3 features as per ml_engine.py: [volatility, spread, liquidity]
-            # Volatility: approximated by spread for now (or random small noise)
-            # Liquidity: approximated by log price
-            features = np.array([[spread_percentage, spread_percentage, np.log(min_price * 100)]])
-            confidence = predictor.predict(features)
-            
-            opportunities.append({
-                "pair": pair,
-                "buy_exchange": min_exchange,
-                "sell_exchange": max_exchange,
-                "buy_price": min_price,
-                "sell_price": max_price,
-                "spread_percentage": spread_percentage,
-                "potential_profit": spread * 100, # Assuming $100 trade
-                "confidence_score": confidence,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-    return sorted(opportunities, key=lambda x: x['spread_percentage'], reverse=True)
+    while True:
+        try:
+            # Wait for a change, but still heartbeat so clients see the "No Opps" state
+            await asyncio.wait_for(opportunities_changed.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            pass
+        opportunities_changed.clear()
+
+        try:
+            started = time.perf_counter()
+            opportunities = await get_real_market_data()
+            paper_portfolio.on_tick(time.time(), opportunities)
+            tick_store.append_opportunities(time.time(), opportunities)
+            await bus.publish(TICKS_CHANNEL, {"opportunities": opportunities, "spreads": current_spreads()})
+            TICK_SECONDS.observe(time.perf_counter() - started)
+        except Exception as e:
+            print(f"Scanner error: {e}")
+
+        await asyncio.sleep(BROADCAST_INTERVAL)
+
+async def tick_listener():
+    """Fans each tick from the scanner out to this process's sockets"""
+    while True:
+        try:
+            async for message in bus.subscribe(TICKS_CHANNEL):
+                await manager.publish(message["opportunities"])
+                if RUNS_SCANNER:
+                    continue
+                # No local stream: evaluate alerts against the tick's best spreads
+                for pair, (spread, buy_exchange, sell_exchange) in message["spreads"].items():
+                    fired = alert_index.evaluate(pair, spread)
+                    if fired:
+                        asyncio.create_task(notify_alerts(pair, spread, buy_exchange, sell_exchange, fired))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Tick listener error: {e!r}")
+            await asyncio.sleep(1)
+
+async def cycle_listener():
+    global latest_cycles
+    while True:
+        try:
+            async for message in bus.subscribe(CYCLES_CHANNEL):
+                latest_cycles = message["cycles"]
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Cycle listener error: {e!r}")
+            await asyncio.sleep(1)
+
+async def load_active_alerts():
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(models.Alert).where(models.Alert.is_active == True))).scalars().all()
+
+# Seconds between alert index reloads when alerts can change in other workers
+ALERT_SYNC_INTERVAL = float(os.getenv("ALERT_SYNC_SECONDS", "30"))
+
+async def alert_sync():
+    while True:
+        await asyncio.sleep(ALERT_SYNC_INTERVAL)
+        try:
+            alert_index.load(await load_active_alerts())
+        except Exception as e:
+            print(f"Alert sync error: {e}")
+
+async def get_socket_user_id(websocket: WebSocket) -> Optional[int]:
+    """Optional ?token=<access_token> links a socket to a user for alert notifications"""
+    token = websocket.query_params.get("token")
+    email = auth.get_email_from_token(token) if token else None
+    if not email:
+        return None
+    user = await auth.user_cache.lookup(email)
+    return user.id if user else None
+
+# Quotes not refreshed within this many seconds are dropped from detection
+STALE_AFTER = float(os.getenv("STALE_AFTER_SECONDS", "30"))
+
+async def staleness_monitor():
+    """
+    Removes stale venue quotes from the matrix, so each scan uses the latest
+    fresh snapshot per venue instead of waiting on (or trusting) a lagging one.
+    """
+    while True:
+        await asyncio.sleep(1)
+        try:
+            expired = stream.cache.expire(STALE_AFTER)
+            for pair, exchange in expired:
+                spread_engine.clear_quote(pair, exchange)
+            for pair in {pair for pair, _ in expired}:
+                spread_engine.update_pair(pair)
+            if expired:
+                opportunities_changed.set()
+        except Exception as e:
+            print(f"Staleness monitor error: {e}")
+
+# Multi-hop arbitrage runs over every market each venue lists, not just TARGET_PAIRS
+CYCLE_SCAN_INTERVAL = float(os.getenv("CYCLE_SCAN_INTERVAL", "15"))
+# Markets missing from this many consecutive refreshes drop out of the graph
+CYCLE_STALE_SCANS = 3
+cycle_detector = CycleDetector(max_hops=4, max_age=CYCLE_STALE_SCANS * CYCLE_SCAN_INTERVAL)
+latest_cycles: List[dict] = []
+
+async def fetch_all_tickers(name: str, exchange):
+    # Venues defaulting to derivatives (bybit: swap) would return BTC/USDT:USDT contracts
+    params = {} if (getattr(exchange, 'options', {}).get('defaultType') or 'spot') == 'spot' else {'type': 'spot'}
+    try:
+        tickers = await stream.schedulers[name].call(lambda: exchange.fetch_tickers(params=params))
+    except Exception as e:
+        print(f"Error fetching all tickers from {name}: {e!r}")
+        return
+    # Only the edges of markets in this response change; the graph is not rebuilt
+    # Metadata indexes only the tracked pairs; the client's loaded markets cover the rest
+    markets = getattr(exchange, 'markets', None) or {}
+
+    def fee_for(symbol: str) -> float:
+        taker = (markets.get(symbol) or {}).get('taker')
+        return taker if taker is not None else pair_taker_fee(name, symbol)
+
+    cycle_detector.update_tickers(name, tickers, fee_for)
+
+async def cycle_scanner():
+    """Refreshes the currency graph from every venue and searches it for profitable cycles"""
+    global latest_cycles
+    while True:
+        try:
+            await asyncio.gather(*(fetch_all_tickers(name, exchange) for name, exchange in exchanges.items()))
+            latest_cycles = cycle_detector.detect()
+            await bus.publish(CYCLES_CHANNEL, {"cycles": latest_cycles})
+        except Exception as e:
+            print(f"Cycle scanner error: {e}")
+        await asyncio.sleep(CYCLE_SCAN_INTERVAL)
+
+# Seconds between price matrix snapshots written to the tick store
+TICK_RECORD_INTERVAL = 1
+
+async def tick_recorder():
+    """Appends a snapshot of the live bid/ask matrix to the tick store every interval"""
+    while True:
+        try:
+            bids, asks = spread_engine.bids.copy(), spread_engine.asks.copy()
+            tick_store.append_prices(time.time(), spread_engine.pairs, spread_engine.exchanges, bids, asks)
+            # Same snapshots the model trains on, so features match at serving time
+            rolling_features.update(bids, asks, spread_engine.volumes.copy())
+        except Exception as e:
+            print(f"Tick recorder error: {e}")
+        await asyncio.sleep(TICK_RECORD_INTERVAL)
 
 @app.websocket("/ws/market-data")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    user_id = await get_socket_user_id(websocket)
+    await manager.connect(websocket, user_id)
     try:
+        # Updates are pushed by market_scanner; just wait here until the client goes away
         while True:
-            opportunities = await get_real_market_data()
-            if opportunities:
-                await websocket.send_json({"type": "update", "data": opportunities})
-            else:
-                # Send empty update to keep connection alive and show "No Opps" state
-                await websocket.send_json({"type": "update", "data": []})
-            
-            # Update every 5 seconds to avoid rate limits
-            await asyncio.sleep(5)
+            await websocket.receive_text()
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
         print(f"WebSocket error: {e}")
         manager.disconnect(websocket)
 
+@app.websocket("/ws/v2/market-data")
+async def websocket_v2_endpoint(websocket: WebSocket):
+    """
+    Subscription protocol: the client sends
+    {"type": "subscribe", "pairs": [...], "min_spread": 0.1, "encoding": "json" | "msgpack"}
+    and receives a snapshot followed by deltas (added / changed / removed).
+    """
+    user_id = await get_socket_user_id(websocket)
+    await manager.connect(websocket, user_id, full_updates=False)
+    subscriber = Subscriber(websocket)
+    manager.subscribers.append(subscriber)
+    sender = asyncio.create_task(subscriber.run())
+    try:
+        while True:
+            request = await websocket.receive_json()
+            if request.get("type") != "subscribe":
+                await websocket.send_json({"type": "error", "detail": "Unknown message type"})
+                continue
+            encoding = request.get("encoding", "json")
+            if encoding not in ("json", "msgpack") or (encoding == "msgpack" and msgpack is None):
+                await websocket.send_json({"type": "error", "detail": f"Unsupported encoding: {encoding}"})
+                continue
+            subscriber.subscribe(
+                request.get("pairs"),
+                float(request.get("min_spread", 0.0)),
+                encoding,
+                manager.last_opportunities,
+            )
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"WebSocket error: {e}")
+    finally:
+        sender.cancel()
+        manager.subscribers.remove(subscriber)
+        manager.disconnect(websocket)
+
 # REST Endpoints (Keep for compatibility)
 @app.get("/api/market-data")
 def get_market_data_http():
     return {"status": "Use WebSocket /ws/market-data for live updates"}
 
+# Gauges computed when /metrics is scraped, so they cost nothing between scrapes
+registry.gauge(
+    "arbitrage_websocket_connections", "Open sockets per protocol", ("protocol",),
+    callback=lambda: {("v1",): len(manager.active_connections), ("v2",): len(manager.subscribers)},
+)
+registry.gauge(
+    "arbitrage_paper_positions", "Open paper trades marked by this scanner",
+    callback=lambda: {(): len(paper_portfolio)},
+)
+registry.gauge(
+    "arbitrage_venue_quote_age_seconds", "Seconds since the freshest quote from each venue", ("exchange",),
+    callback=lambda: {(name,): age for name in exchanges if (age := stream.cache.age(name)) is not None},
+)
+
+registry.gauge(
+    "arbitrage_scan_interval_seconds", "Seconds between REST polls of each pair on each polled venue", ("exchange", "pair"),
+    callback=lambda: scan_cadence.venue_intervals() if scan_cadence else {},
+)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus text exposition of this process's metrics. Runs on the event
+    loop, not the threadpool: gauge callbacks iterate live state (sockets,
+    episodes, venue schedulers) that only the loop mutates.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/market-data/cycles")
+def get_arbitrage_cycles():
+    """Latest triangular / multi-hop opportunities (profit after taker and transfer costs)"""
+    return {"data": latest_cycles}
+
 app.include_router(router, prefix="/api")
 
 @app.get("/")
 def root():
-    return {"message": "Crypto Arbitrage AI API", "status": "running", "ai_model": "RandomForest", "mode": "Real-World Data"}
+    return {"message": "Crypto Arbitrage AI API", "status": "running", "ai_model": "RandomForest", "mode": "Real-World Data", "role": APP_ROLE}
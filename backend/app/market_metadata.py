@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from .order_book import withdrawal_fee
+
+# Venue-specific names for the same asset (renames, legacy tickers)
+CURRENCY_ALIASES = {
+    'MATIC': ['POL'],
+    'BTC': ['XBT'],
+    'DOGE': ['XDG'],
+}
+
+# Capabilities recorded per venue, as reported by ccxt's `has`
+CAPABILITIES = ['fetchTickers', 'fetchTicker', 'watchTickers', 'watchTicker', 'watchOrderBook']
+
+
+class MarketMetadata:
+    """
+    Persisted per-venue market metadata.
+
+    load_markets is a multi-second round trip per venue, so the result is
+    written to <root>/<exchange>.json and reused until it is older than ttl.
+    From it we keep, per venue: its capabilities, the mapping between our
+    canonical pairs and the venue's native symbols, per-market precision and
+    fees, and the withdrawal fee of each scanned base asset.
+    """
+
+    def __init__(self, root: str, ttl: float = 24 * 60 * 60):
+        self.root = root
+        self.ttl = ttl
+        # exchange -> {'capabilities', 'symbols' {canonical: native}, 'markets' {canonical: info},
+        #              'withdrawal_fees' {canonical base: fee}}
+        self.venues: Dict[str, dict] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.json")
+
+    def _read(self, name: str) -> Optional[dict]:
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            cached = json.load(f)
+        if time.time() - cached.get('fetched_at', 0) > self.ttl:
+            return None
+        return cached
+
+    def _write(self, name: str, cached: dict):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self._path(name) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(cached, f)
+        os.replace(tmp_path, self._path(name))
+
+    async def load(self, name: str, exchange, pairs: List[str]):
+        """Install markets on the ccxt client from disk, or fetch and persist them"""
+        if not hasattr(exchange, 'load_markets'):
+            return
+        cached = await asyncio.to_thread(self._read, name)
+        if cached is not None:
+            exchange.set_markets(cached['markets'], cached.get('currencies'))
+        else:
+            await exchange.load_markets()
+            cached = {
+                'fetched_at': time.time(),
+                'markets': exchange.markets,
+                'currencies': exchange.currencies,
+            }
+            await asyncio.to_thread(self._write, name, cached)
+        self.venues[name] = self._index(exchange, cached['markets'], pairs, cached.get('currencies') or {})
+
+    def load_cached(self, name: str, pairs: List[str]):
+        """Index a venue from its cache file alone, without a client (offline use such as backtests)"""
+        cached = self._read(name)
+        if cached is not None:
+            self.venues[name] = self._index(None, cached['markets'], pairs, cached.get('currencies') or {})
+
+    async def load_all(self, exchanges: Dict[str, object], pairs: List[str], timeout: float = 30):
+        async def load_one(name, exchange):
+            try:
+                await asyncio.wait_for(self.load(name, exchange, pairs), timeout)
+            except Exception as e:
+                print(f"Market metadata unavailable for {name}: {e!r}")
+
+        await asyncio.gather(*(load_one(name, exchange) for name, exchange in exchanges.items()))
+
+    def _index(self, exchange, markets: dict, pairs: List[str], currencies: dict) -> dict:
+        has = getattr(exchange, 'has', {})
+        symbols = {}
+        info = {}
+        withdrawal_fees = {}
+        for pair in pairs:
+            native = resolve_symbol(pair, markets)
+            if native is None:
+                continue
+            market = markets[native]
+            symbols[pair] = native
+            info[pair] = {
+                'native': native,
+                'precision': market.get('precision'),
+                'limits': market.get('limits'),
+                'taker': market.get('taker'),
+                'maker': market.get('maker'),
+            }
+            # Keyed by our base code; the venue may list it under an alias
+            fee = (currencies.get(market.get('base') or native.split('/')[0]) or {}).get('fee')
+            if fee is not None:
+                withdrawal_fees[pair.split('/')[0]] = fee
+        return {
+            'capabilities': {cap: bool(has.get(cap)) for cap in CAPABILITIES},
+            'symbols': symbols,
+            'markets': info,
+            'withdrawal_fees': withdrawal_fees,
+        }
+
+    def symbol_map(self, name: str) -> Optional[Dict[str, str]]:
+        """canonical pair -> native symbol for a venue, or None if metadata never loaded"""
+        venue = self.venues.get(name)
+        return dict(venue['symbols']) if venue else None
+
+    def taker_fee(self, name: str, pair: str, default: float) -> float:
+        market = self.venues.get(name, {}).get('markets', {}).get(pair)
+        if market and market.get('taker') is not None:
+            return market['taker']
+        return default
+
+    def withdrawal_fee(self, name: str, asset: str) -> Optional[float]:
+        """The venue's published withdrawal fee for an asset, else the static table's, else None (unknown)"""
+        fee = self.venues.get(name, {}).get('withdrawal_fees', {}).get(asset)
+        return fee if fee is not None else withdrawal_fee(name, asset)
+
+
+def resolve_symbol(pair: str, markets: dict) -> Optional[str]:
+    """Venue's native symbol for a canonical BASE/QUOTE pair, following known aliases"""
+    if pair in markets:
+        return pair
+    base, quote = pair.split('/')
+    for base_alias in [base] + CURRENCY_ALIASES.get(base, []):
+        for quote_alias in [quote] + CURRENCY_ALIASES.get(quote, []):
+            candidate = f"{base_alias}/{quote_alias}"
+            if candidate in markets:
+                return candidate
+    return None
@@ -0,0 +1,351 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from .metrics import EXCHANGE_UPDATES
+from .order_book import OrderBook, book_depth
+from .scan_cadence import ScanCadence
+from .venue_scheduler import PERMANENT_ERRORS, VenueScheduler
+
+
+class PriceCache:
+    """Live best bid/ask per exchange and pair: { 'BTC/USDT': { 'binance': {...} } }"""
+
+    def __init__(self):
+        self.quotes: Dict[str, Dict[str, dict]] = {}
+
+    def update(self, exchange: str, pair: str, ticker: dict) -> bool:
+        """Store a ticker; returns True if the top of book actually moved"""
+        bid = ticker.get('bid') or ticker.get('last')
+        ask = ticker.get('ask') or ticker.get('last')
+        if not bid or not ask:
+            return False
+
+        now = time.time()
+        venues = self.quotes.setdefault(pair, {})
+        previous = venues.get(exchange)
+        if previous and previous['bid'] == bid and previous['ask'] == ask:
+            # Unchanged, but confirmed fresh
+            previous['received'] = now
+            previous['volume'] = ticker.get('quoteVolume')
+            return False
+
+        venues[exchange] = {
+            'bid': bid,
+            'ask': ask,
+            'last': ticker.get('last') or (bid + ask) / 2,
+            'timestamp': ticker.get('timestamp') or int(now * 1000),
+            'received': now,
+            # Rolling 24h volume in quote currency, when the venue reports it
+            'volume': ticker.get('quoteVolume'),
+        }
+        return True
+
+    def expire(self, max_age: float) -> List[Tuple[str, str]]:
+        """Drop quotes not refreshed within max_age seconds; returns the (pair, exchange) removed"""
+        cutoff = time.time() - max_age
+        expired = []
+        for pair, venues in self.quotes.items():
+            for exchange in [e for e, q in venues.items() if q['received'] < cutoff]:
+                del venues[exchange]
+                expired.append((pair, exchange))
+        return expired
+
+    def age(self, exchange: str) -> Optional[float]:
+        """Seconds since the freshest quote from an exchange, or None if it has none"""
+        received = [venues[exchange]['received'] for venues in self.quotes.values() if exchange in venues]
+        return time.time() - max(received) if received else None
+
+    def get_pair(self, pair: str) -> Dict[str, dict]:
+        return self.quotes.get(pair, {})
+
+    def pairs(self) -> List[str]:
+        return list(self.quotes.keys())
+
+
+class MarketStream:
+    """
+    Streaming ingestion layer. Subscribes to each venue's push feed (ccxt.pro
+    watch_* methods) and keeps PriceCache current. on_update(pair) is awaited
+    for every pair whose top of book changed, so detection can be event-driven.
+    Venues without a push feed fall back to REST polling: every pair every
+    poll_interval, or, given a ScanCadence, each pair when its own activity
+    says it is due, within the venue's rate budget.
+
+    Each venue runs independently under its own VenueScheduler (cadence,
+    rate-limit bucket, timeout, circuit breaker), so a slow or failing venue
+    only goes stale; it never holds up the others.
+
+    With book_depth > 0, order books are also streamed into self.books
+    ({pair: {exchange: OrderBook}}); ccxt.pro maintains them incrementally,
+    so each update only copies the top book_depth levels.
+    """
+
+    def __init__(
+        self,
+        exchanges: Dict[str, object],
+        pairs: List[str],
+        on_update: Optional[Callable[[str], Awaitable[None]]] = None,
+        poll_interval: float = 5,
+        book_depth: int = 0,
+        schedulers: Optional[Dict[str, VenueScheduler]] = None,
+        symbol_maps: Optional[Dict[str, Optional[Dict[str, str]]]] = None,
+        cadence: Optional[ScanCadence] = None,
+    ):
+        self.exchanges = exchanges
+        self.pairs = pairs
+        # Per venue: canonical pair -> native symbol (only pairs the venue lists),
+        # and the reverse for mapping incoming tickers back
+        self.symbols: Dict[str, Dict[str, str]] = {}
+        self.canonical: Dict[str, Dict[str, str]] = {}
+        for name in exchanges:
+            self.set_symbols(name, (symbol_maps or {}).get(name))
+        self.on_update = on_update
+        self.schedulers = schedulers or {}
+        for name, exchange in exchanges.items():
+            if name not in self.schedulers:
+                self.schedulers[name] = VenueScheduler.for_exchange(exchange, poll_interval=poll_interval, name=name)
+        self.cadence = cadence
+        # Pairs some venue polls under the cadence; only their quotes feed it
+        self.polled_pairs: set = set()
+        self.book_depth = book_depth
+        self.update_counters = {name: EXCHANGE_UPDATES.labels(name) for name in exchanges}
+        self.cache = PriceCache()
+        self.books: Dict[str, Dict[str, OrderBook]] = {}
+        self.tasks: List[asyncio.Task] = []
+
+    def set_symbols(self, name: str, mapping: Optional[Dict[str, str]]):
+        """Install a venue's canonical -> native symbol map; None means symbols are already canonical"""
+        if mapping is None:
+            mapping = {pair: pair for pair in self.pairs}
+        self.symbols[name] = {pair: mapping[pair] for pair in self.pairs if pair in mapping}
+        self.canonical[name] = {native: pair for pair, native in self.symbols[name].items()}
+
+    def start(self):
+        if self.cadence:
+            self.polled_pairs = {
+                pair
+                for name, exchange in self.exchanges.items()
+                if not _pushes_tickers(exchange)
+                for pair in self.symbols[name]
+            }
+        for name, exchange in self.exchanges.items():
+            self.tasks.append(asyncio.create_task(self._run(name, exchange)))
+            if self.book_depth and getattr(exchange, 'has', {}).get('watchOrderBook'):
+                for pair in self.symbols[name]:
+                    self.tasks.append(asyncio.create_task(self._watch_book(name, exchange, pair)))
+
+    async def stop(self):
+        pending = set(self.tasks)
+        while pending:
+            # asyncio.wait_for can swallow a cancel that races a completed read, so re-cancel stragglers
+            for task in pending:
+                task.cancel()
+            _, pending = await asyncio.wait(pending, timeout=1)
+        self.tasks = []
+        for exchange in self.exchanges.values():
+            try:
+                await exchange.close()
+            except Exception:
+                pass
+
+    async def _apply(self, name: str, tickers: dict):
+        canonical = self.canonical[name]
+        self.update_counters[name].inc(len(tickers))
+        now = time.time()
+        for symbol, ticker in tickers.items():
+            pair = canonical.get(symbol)
+            if pair is None:
+                continue
+            changed = self.cache.update(name, pair, ticker)
+            if pair in self.polled_pairs:
+                # Unchanged polls count too: they are what lets a quiet pair cool down
+                self.cadence.observe(pair, now, self.cache.get_pair(pair))
+            if changed and self.on_update:
+                await self.on_update(pair)
+
+    async def _run(self, name: str, exchange):
+        has = getattr(exchange, 'has', {})
+        scheduler = self.schedulers[name]
+        natives = list(self.symbols[name].values())
+        if not natives:
+            print(f"{name} lists none of the scanned pairs")
+            return
+        while True:
+            try:
+                if has.get('watchTickers'):
+                    tickers = await scheduler.call(lambda: exchange.watch_tickers(natives), watch=True)
+                elif has.get('watchTicker'):
+                    await self._watch_each(name, exchange)
+                    continue
+                elif self.cadence:
+                    await self._poll_due(name, exchange)
+                    continue
+                else:
+                    # No push feed: poll over REST at the venue's own cadence
+                    if has.get('fetchTickers'):
+                        tickers = await scheduler.call(lambda: exchange.fetch_tickers(natives))
+                    else:
+                        # Fetch only the symbols we scan rather than every ticker on the venue
+                        tickers = {}
+                        for symbol in natives:
+                            tickers[symbol] = await scheduler.call(lambda: exchange.fetch_ticker(symbol))
+                    await self._apply(name, tickers)
+                    await asyncio.sleep(scheduler.poll_interval)
+                    continue
+                await self._apply(name, tickers)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Longer back-off is left to the circuit breaker
+                print(f"Stream error from {name}: {e!r}")
+                await asyncio.sleep(scheduler.retry_delay)
+
+    async def _poll_due(self, name: str, exchange):
+        """One REST round under the cadence: fetch the pairs due on this venue, or wait for the next"""
+        scheduler = self.schedulers[name]
+        symbols = self.symbols[name]
+        batched = bool(getattr(exchange, 'has', {}).get('fetchTickers'))
+        due, wait = self.cadence.due(name, list(symbols), time.time(), scheduler.bucket.rate, batched)
+        if not due:
+            await asyncio.sleep(wait)
+            return
+        if batched:
+            tickers = await scheduler.call(lambda: exchange.fetch_tickers([symbols[pair] for pair in due]))
+            self.cadence.polled(name, due, time.time())
+            await self._apply(name, tickers)
+            return
+        for pair in due:
+            # Each fetch waits on the venue's bucket, so the most overdue pairs go first
+            ticker = await scheduler.call(lambda: exchange.fetch_ticker(symbols[pair]))
+            self.cadence.polled(name, [pair], time.time())
+            await self._apply(name, {symbols[pair]: ticker})
+
+    async def _watch_each(self, name: str, exchange):
+        """Venues that only stream one symbol per subscription"""
+        scheduler = self.schedulers[name]
+
+        async def watch(symbol):
+            while True:
+                try:
+                    ticker = await scheduler.call(lambda: exchange.watch_ticker(symbol), watch=True)
+                    await self._apply(name, {symbol: ticker})
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Stream error from {name} {symbol}: {e!r}")
+                    await asyncio.sleep(scheduler.retry_delay)
+
+        await asyncio.gather(*(watch(symbol) for symbol in self.symbols[name].values()))
+
+    async def _watch_book(self, name: str, exchange, pair: str):
+        book = self.books.setdefault(pair, {}).setdefault(name, OrderBook())
+        scheduler = self.schedulers[name]
+        symbol = self.symbols[name][pair]
+        # Venues only accept certain depths, so ask for the nearest one and keep book_depth
+        depth = book_depth(name, self.book_depth)
+        while True:
+            try:
+                update = await scheduler.call(lambda: exchange.watch_order_book(symbol, depth), watch=True)
+                book.snapshot(update['bids'][:self.book_depth], update['asks'][:self.book_depth])
+            except asyncio.CancelledError:
+                raise
+            except PERMANENT_ERRORS as e:
+                # Detection falls back to this venue's top-of-book quote
+                print(f"Order book stream for {name} {pair} stopped: {e!r}")
+                self.books[pair].pop(name, None)
+                return
+            except Exception as e:
+                print(f"Order book stream error from {name} {pair}: {e!r}")
+                await asyncio.sleep(scheduler.retry_delay)
+
+    def get_book(self, pair: str, exchange: str) -> Optional[OrderBook]:
+        return self.books.get(pair, {}).get(exchange)
+
+
+def _pushes_tickers(exchange) -> bool:
+    has = getattr(exchange, 'has', {})
+    return bool(has.get('watchTickers') or has.get('watchTicker'))
+
+
+class ReplayExchange:
+    """
+    Fake exchange that replays recorded ticks through the watch_tickers API.
+    Lets the streaming layer and detector be driven locally without network.
+
+    Each frame is {"t": seconds_offset, "symbol": "BTC/USDT", "bid": .., "ask": ..}
+    with optional "bids"/"asks" [[price, size], ...] ladders for order-book replay.
+    """
+
+    has = {'watchTickers': True, 'fetchTickers': True, 'watchOrderBook': True}
+
+    def __init__(self, frames: List[dict], speed: float = 1.0, loop: bool = False):
+        self.frames = sorted(frames, key=lambda f: f.get('t', 0))
+        self.speed = speed
+        self.loop = loop
+        self.position = 0
+        self.clock = 0.0
+        self.tickers: Dict[str, dict] = {}
+        self.books: Dict[str, dict] = {}
+        self.book_events: Dict[str, asyncio.Event] = {}
+
+    @classmethod
+    def from_file(cls, path: str, exchange: str, **kwargs):
+        """Load frames for one exchange from a JSON-lines recording"""
+        frames = []
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                frame = json.loads(line)
+                if frame.get('exchange', exchange) == exchange:
+                    frames.append(frame)
+        return cls(frames, **kwargs)
+
+    async def watch_tickers(self, symbols: Optional[List[str]] = None) -> dict:
+        if self.position >= len(self.frames):
+            if not self.loop or not self.frames:
+                # Recording exhausted: behave like an idle feed
+                await asyncio.Event().wait()
+            self.position = 0
+            self.clock = 0.0
+
+        frame = self.frames[self.position]
+        self.position += 1
+        delay = (frame.get('t', 0) - self.clock) / self.speed
+        self.clock = frame.get('t', 0)
+        # Always yield, so a zero-delay recording can't starve the event loop
+        await asyncio.sleep(max(delay, 0))
+
+        ticker = {
+            'symbol': frame['symbol'],
+            'bid': frame['bid'],
+            'ask': frame['ask'],
+            'last': frame.get('last', (frame['bid'] + frame['ask']) / 2),
+            'timestamp': int(time.time() * 1000),
+        }
+        self.tickers[frame['symbol']] = ticker
+        self.books[frame['symbol']] = {
+            'bids': frame.get('bids') or [[frame['bid'], frame.get('bid_size', 1.0)]],
+            'asks': frame.get('asks') or [[frame['ask'], frame.get('ask_size', 1.0)]],
+        }
+        event = self.book_events.pop(frame['symbol'], None)
+        if event:
+            event.set()
+        if symbols and frame['symbol'] not in symbols:
+            return {}
+        return {frame['symbol']: ticker}
+
+    async def watch_order_book(self, symbol: str, limit: Optional[int] = None) -> dict:
+        # Block until the next frame for this symbol, like a push feed
+        await self.book_events.setdefault(symbol, asyncio.Event()).wait()
+        return self.books[symbol]
+
+    async def fetch_tickers(self, symbols: Optional[List[str]] = None, params: Optional[dict] = None) -> dict:
+        if not symbols:
+            return dict(self.tickers)
+        return {s: t for s, t in self.tickers.items() if s in symbols}
+
+    async def close(self):
+        pass
@@ -0,0 +1,202 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Seconds; spans sub-millisecond in-process steps up to slow exchange requests
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _label_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.children: Dict[Tuple[str, ...], object] = {}
+        if not self.label_names:
+            # Unlabelled metrics are exported (as zero) from the start
+            self.labels()
+
+    def labels(self, *values):
+        """Child for one label combination; callers on hot paths should keep the result"""
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            child = self.children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self.children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_label_text(self.label_names, key)} {child.value}"]
+
+
+class Gauge(_Metric):
+    """Set directly, or computed at scrape time from a callback returning {label values: value}"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), callback: Optional[Callable[[], Dict[tuple, float]]] = None):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def set(self, value: float):
+        self.labels().value = value
+
+    def render(self) -> List[str]:
+        if self.callback is not None:
+            self.children = {}
+            for key, value in self.callback().items():
+                self.labels(*key).value = value
+        return super().render()
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_label_text(self.label_names, key)} {child.value}"]
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # Per-bucket (not cumulative) counts keep observe() to one bisect and three adds
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help_text, labels)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _render_child(self, key, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            bucket_labels = _label_text(self.label_names, key, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        labels = _label_text(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    """
+    Process-local metrics in the Prometheus text exposition format.
+
+    Recording is plain attribute arithmetic on the event loop thread (no locks,
+    no I/O); all formatting happens at scrape time.
+    """
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Tuple[str, ...] = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, help_text, labels, callback))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Singleton registry and the scan pipeline's metrics
+registry = Registry()
+
+EXCHANGE_REQUEST_SECONDS = registry.histogram(
+    "arbitrage_exchange_request_seconds", "Latency of REST requests to each exchange", ("exchange",))
+EXCHANGE_ERRORS = registry.counter(
+    "arbitrage_exchange_errors_total", "Failed or timed-out exchange calls", ("exchange",))
+EXCHANGE_UPDATES = registry.counter(
+    "arbitrage_exchange_updates_total", "Ticker updates received from each exchange", ("exchange",))
+MATRIX_UPDATE_SECONDS = registry.histogram(
+    "arbitrage_matrix_update_seconds", "Time to apply one pair's quotes to the spread matrix")
+DETECTION_SECONDS = registry.histogram(
+    "arbitrage_detection_seconds", "Time to rank spreads and walk order books for one tick")
+SCORING_SECONDS = registry.histogram(
+    "arbitrage_scoring_seconds", "Time to build features and score a tick's candidates")
+SERIALIZATION_SECONDS = registry.histogram(
+    "arbitrage_serialization_seconds", "Time to encode one outgoing message", ("protocol",))
+BROADCAST_SECONDS = registry.histogram(
+    "arbitrage_broadcast_seconds", "Time to fan one tick out to every v1 socket")
+TICK_SECONDS = registry.histogram(
+    "arbitrage_tick_seconds", "End-to-end time of one scanner tick")
+DROPPED_CLIENTS = registry.counter(
+    "arbitrage_websocket_dropped_total", "Sockets dropped after a failed or stalled send")
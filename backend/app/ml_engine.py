@@ -1,111 +1,272 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
 import joblib
 import os
 from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, NamedTuple, Optional, Union
+
+from .compact_model import CompactForest, compact_path
+
+if TYPE_CHECKING:
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+# Feature construction shared by training and serving
+VOLATILITY_WINDOW = 24
+# Names the feature definitions above (see feature_store.RollingFeatures).
+# Artifacts trained on any other definitions are never served
+FEATURE_SET = "ticks-v1"
+# Tick-trained target: is the spread still above PROFITABLE_SPREAD this many ticks later?
+LABEL_HORIZON = 5
+PROFITABLE_SPREAD = 0.05
+# Episode-trained target: did the opportunity stay up at least this many seconds?
+MIN_EPISODE_SECONDS = 5.0
+# "compact" serves the exported array forest when one sits next to the bundle;
+# "sklearn" always serves the joblib model and scaler
+MODEL_SERVING = os.getenv("MODEL_SERVING", "compact")
+
+
+class ModelBundle(NamedTuple):
+    """Model and the scaler it was trained with; always swapped together"""
+    model: "RandomForestClassifier"
+    scaler: "StandardScaler"
+    trained_at: str
+    # FEATURE_SET it was trained on; empty for artifacts that predate the tag
+    feature_set: str = ""
+
+
+def fit_bundle(processed_data):
+    """
+    Fit scaler + forest on prepared features; returns (bundle, accuracy,
+    compact) or None, where compact is the serving export of the bundle
+    carrying its parity report on the held-out split.
+    """
+    # Only training needs scikit-learn; serving the compact export never imports it
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    X = processed_data[['Spread_Proxy', 'Volatility', 'Liquidity']]
+    y = processed_data['Target']
+
+    if len(X) < 100 or y.nunique() < 2:
+        print("Not enough data to train. Using fallback logic.")
+        return None
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # Scale features
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+
+    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model.fit(X_train_scaled, y_train)
+
+    accuracy = model.score(scaler.transform(X_test), y_test)
+    print(f"Model trained with accuracy: {accuracy:.2f}")
+    bundle = ModelBundle(model, scaler, datetime.utcnow().isoformat(), FEATURE_SET)
+
+    compact = CompactForest.from_bundle(bundle)
+    compact.parity = compact.parity_report(bundle, X_test.to_numpy(), y_test.to_numpy())
+    print(
+        f"Compact export parity: max |dp| {compact.parity['max_abs_diff']:.2e}, "
+        f"label agreement {compact.parity['label_agreement']:.4f}, "
+        f"accuracy {compact.parity['compact_accuracy']:.2f} vs {compact.parity['sklearn_accuracy']:.2f}"
+    )
+    return bundle, accuracy, compact
+
+
+def save_bundle(bundle: ModelBundle, path: str, compact: Optional[CompactForest] = None):
+    """Write atomically so readers never see a half-written artifact"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(bundle._asdict(), tmp_path)
+    os.replace(tmp_path, path)
+    # The serving export always goes with it, so the two never disagree
+    (compact or CompactForest.from_bundle(bundle)).save(compact_path(path))
+
+
+def load_bundle(path: str) -> ModelBundle:
+    # Not memory-mapped: unpickling sklearn trees copies their arrays to the heap anyway
+    return ModelBundle(**joblib.load(path))
+
+
+ServingModel = Union[ModelBundle, CompactForest]
+
+
+def load_serving_bundle(path: str) -> ServingModel:
+    """What predict_batch should serve for the bundle at path, per MODEL_SERVING"""
+    compact = compact_path(path)
+    if MODEL_SERVING == "compact" and os.path.exists(compact):
+        return CompactForest.load(compact)
+    return load_bundle(path)
+
+
+def proxy_features(spread_percentages, buy_prices):
+    """
+    Stand-in [spread, volatility, liquidity] rows for candidates whose pair has
+    no rolling history yet (see feature_store): volatility is approximated by
+    the spread and liquidity by log price.
+    """
+    spread_percentages = np.asarray(spread_percentages, dtype=float)
+    return np.column_stack([spread_percentages, spread_percentages, np.log(np.asarray(buy_prices, dtype=float) * 100)])
+
 
 class ArbitragePredictor:
     def __init__(self):
-        self.model = None
-        self.scaler = StandardScaler()
-        self.is_trained = False
-        self.model_path = "arbitrage_model.joblib"
-        self.scaler_path = "scaler.joblib"
-
-    def fetch_historical_data(self):
-        """Fetch historical data for major cryptos to simulate arbitrage conditions"""
-        tickers = ["BTC-USD", "ETH-USD", "BNB-USD"]
-        data = yf.download(tickers, period="1mo", interval="1h", progress=False)
-        
-        # Flatten MultiIndex columns if necessary
-        if isinstance(data.columns, pd.MultiIndex):
-            data = data.stack(level=1).reset_index()
-            data.rename(columns={"level_1": "Ticker"}, inplace=True)
-        
-        return data
-
-    def prepare_features(self, data):
-        """Generate features: Volatility, Spread (Simulated), Liquidity (Volume)"""
-        df = data.copy()
-        
-        # Calculate Volatility (Standard Deviation of returns)
-        df['Returns'] = df.groupby('Ticker')['Close'].pct_change()
-        df['Volatility'] = df.groupby('Ticker')['Returns'].transform(lambda x: x.rolling(window=24).std())
-        
-        # Simulate "Spread" based on high-low difference (proxy for market inefficiency)
-        df['Spread_Proxy'] = (df['High'] - df['Low']) / df['Low'] * 100
-        
-        # Liquidity proxy (Log Volume)
-        df['Liquidity'] = np.log(df['Volume'] + 1)
-        
-        # Target: 1 if Spread > 0.5% AND positive return (Profitable), else 0
-        df['Target'] = ((df['Spread_Proxy'] > 0.5) & (df['Returns'] > 0)).astype(int)
-        
-        # Drop NaN
-        df.dropna(inplace=True)
-        
-        return df[['Spread_Proxy', 'Volatility', 'Liquidity', 'Target']]
-
-    def train_model(self):
-        """Train the Random Forest model"""
-        print("Fetching historical data from yfinance...")
-        raw_data = self.fetch_historical_data()
-        
-        print("Preparing features...")
-        processed_data = self.prepare_features(raw_data)
-        
-        X = processed_data[['Spread_Proxy', 'Volatility', 'Liquidity']]
-        y = processed_data['Target']
-        
-        if len(X) < 100:
-            print("Not enough data to train. Using fallback logic.")
-            return
-
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        
-        # Scale features
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        
-        self.model = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.model.fit(X_train_scaled, y_train)
-        
-        accuracy = self.model.score(self.scaler.transform(X_test), y_test)
-        print(f"Model trained with accuracy: {accuracy:.2f}")
-        
-        self.is_trained = True
-        
-        # Save model
-        joblib.dump(self.model, self.model_path)
-        joblib.dump(self.scaler, self.scaler_path)
+        # Replaced as a whole, so readers always see a matching model/scaler pair
+        self.bundle: Optional[ServingModel] = None
+        self.bundle_path = "arbitrage_bundle.joblib"
+
+    @property
+    def is_trained(self):
+        return self.bundle is not None
+
+    @property
+    def model(self):
+        # The compact export has no separate estimator or scaler
+        return self.bundle.model if isinstance(self.bundle, ModelBundle) else None
+
+    @property
+    def scaler(self):
+        return self.bundle.scaler if isinstance(self.bundle, ModelBundle) else None
+
+    def swap(self, bundle: ServingModel):
+        """Atomically replace the serving model (a single reference assignment)"""
+        self.bundle = bundle
+
+    def prepare_tick_features(self, prices):
+        """
+        Features from our own recorded ticks (columns: timestamp, pair, exchange,
+        bid, ask) as Spread_Proxy, Volatility, Liquidity and Target columns.
+        The feature definitions are FEATURE_SET, the ones RollingFeatures serves.
+        """
+        frames = []
+        for _, ticks in prices.groupby('pair'):
+            bids = ticks.pivot_table(index='timestamp', columns='exchange', values='bid')
+            asks = ticks.pivot_table(index='timestamp', columns='exchange', values='ask')
+            # Need at least two venues quoting to have a cross-exchange spread
+            quoted = bids.notna().sum(axis=1) >= 2
+            bids, asks = bids[quoted], asks[quoted]
+            if len(bids) <= VOLATILITY_WINDOW + LABEL_HORIZON:
+                continue
+
+            df = pd.DataFrame(index=bids.index)
+            best_ask = asks.min(axis=1)
+            df['Spread_Proxy'] = (bids.max(axis=1) - best_ask) / best_ask * 100
+            mid = ((bids + asks) / 2).mean(axis=1)
+            df['Volatility'] = mid.pct_change().rolling(window=VOLATILITY_WINDOW).std()
+            df['Liquidity'] = np.log(best_ask * 100)
+
+            # Target: 1 if the spread is still profitable LABEL_HORIZON ticks later
+            future = df['Spread_Proxy'].shift(-LABEL_HORIZON)
+            df['Target'] = (future > PROFITABLE_SPREAD).astype(int)
+            frames.append(df[future.notna()].dropna())
+
+        if not frames:
+            return pd.DataFrame(columns=['Spread_Proxy', 'Volatility', 'Liquidity', 'Target'])
+        return pd.concat(frames, ignore_index=True)
+
+    def prepare_episode_features(self, episodes):
+        """
+        Features from recorded opportunity episodes (columns: open_spread,
+        volatility, liquidity, duration): the model inputs served when each
+        episode opened, labelled by whether it lasted MIN_EPISODE_SECONDS.
+        """
+        df = pd.DataFrame({
+            'Spread_Proxy': episodes['open_spread'],
+            'Volatility': episodes['volatility'],
+            'Liquidity': episodes['liquidity'],
+            'Target': (episodes['duration'] >= MIN_EPISODE_SECONDS).astype(int),
+        })
+        return df.dropna()
 
     def load_model(self):
-        """Load trained model if exists"""
-        if os.path.exists(self.model_path) and os.path.exists(self.scaler_path):
-            self.model = joblib.load(self.model_path)
-            self.scaler = joblib.load(self.scaler_path)
-            self.is_trained = True
-            print("Loaded existing ML model.")
-        else:
-            print("No existing model found. Training new one...")
-            self.train_model()
+        """
+        Load a trained model if one exists; returns False when training is
+        needed. A model trained on other feature definitions would score the
+        served features as if they meant something else, so it isn't served.
+        """
+        if not os.path.exists(self.bundle_path):
+            print("No existing model found.")
+            return False
+        bundle = load_serving_bundle(self.bundle_path)
+        if bundle.feature_set != FEATURE_SET:
+            print(f"Existing model was trained on features {bundle.feature_set or 'untagged'!r}, not {FEATURE_SET!r}; not serving it.")
+            return False
+        self.swap(bundle)
+        print("Loaded existing ML model.")
+        return True
 
     def predict(self, spread, volatility, liquidity):
         """Predict probability of arbitrage success"""
-        if not self.is_trained:
-            # Fallback rule-based logic if model fails
-            score = 50 + (spread * 10) - (volatility * 100)
-            return min(max(score, 0), 99)
-        
         features = np.array([[spread, volatility, liquidity]])
-        features_scaled = self.scaler.transform(features)
-        
-        # Get probability of class 1 (Success)
-        probability = self.model.predict_proba(features_scaled)[0][1]
-        return round(probability * 100, 2)
+        return float(self.predict_batch(features)[0])
+
+    def predict_batch(self, features):
+        """
+        Predict success probability for many candidates at once.
+        features is an N x 3 array of [spread, volatility, liquidity] rows;
+        returns N confidence scores (0-100) from a single predict_proba call.
+        """
+        features = np.asarray(features, dtype=float).reshape(-1, 3)
+        if len(features) == 0:
+            return np.empty(0)
+
+        # Read the bundle once so a concurrent swap can't mix model and scaler
+        bundle = self.bundle
+        if bundle is None:
+            # Fallback rule-based logic if model fails
+            score = 50 + (features[:, 0] * 10) - (features[:, 1] * 100)
+            return np.clip(score, 0, 99)
+
+        if isinstance(bundle, CompactForest):
+            # Scaler is folded into the thresholds; takes raw features
+            probability = bundle.predict_proba(features)
+        else:
+            features_scaled = bundle.scaler.transform(features)
+
+            # Get probability of class 1 (Success)
+            probability = bundle.model.predict_proba(features_scaled)[:, 1]
+        return np.round(probability * 100, 2)
+
+
+# Training entry points for worker processes: they write the artifact and
+# return its accuracy; the serving process then loads and swaps it in.
+
+def load_episodes(start: datetime, end: datetime):
+    """Closed opportunity episodes opened in [start, end) as a DataFrame"""
+    from sqlalchemy import select
+    from .database import SessionLocal
+    from .models import OpportunityEpisode as Episode
+
+    query = select(Episode.open_spread, Episode.volatility, Episode.liquidity, Episode.duration).where(
+        Episode.opened_at >= start, Episode.opened_at < end,
+    )
+    with SessionLocal() as db:
+        rows = db.execute(query).all()
+    return pd.DataFrame(rows, columns=['open_spread', 'volatility', 'liquidity', 'duration'])
+
+
+def train_bundle_from_ticks(store_root: str, bundle_path: str, days: int = 1):
+    from .tick_store import TickStore
+
+    end = datetime.utcnow()
+    trainer = ArbitragePredictor()
+    # Observed episode durations are the direct label; the tick look-ahead
+    # label covers the gap until enough episodes have been recorded
+    result = fit_bundle(trainer.prepare_episode_features(load_episodes(end - timedelta(days=days), end)))
+    if result is None:
+        rows = TickStore(store_root).query('prices', end - timedelta(days=days), end, limit=20_000_000)
+        prices = pd.DataFrame(rows)
+        if prices.empty:
+            print("No recorded ticks to train on.")
+            return None
+        result = fit_bundle(trainer.prepare_tick_features(prices))
+    if result is None:
+        return None
+    bundle, accuracy, compact = result
+    save_bundle(bundle, bundle_path, compact)
+    return accuracy
 
 # Singleton instance
 predictor = ArbitragePredictor()
@@ -0,0 +1,75 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from .ml_engine import (
+    ArbitragePredictor,
+    load_serving_bundle,
+    train_bundle_from_ticks,
+)
+
+
+class ModelManager:
+    """
+    Owns the serving model's lifecycle without ever touching the event loop:
+
+    - startup loads the prebuilt artifact (the compact export is memory-mapped)
+      in a worker thread;
+      until it is ready the predictor serves its rule-based fallback
+    - training runs in a separate process, on our recorded ticks: every
+      retrain_interval, or every bootstrap_interval while there is no model
+      to serve (until enough ticks are recorded)
+    - the new artifact is loaded off-loop and swapped in as one bundle, so
+      the model and its scaler always change together
+    """
+
+    def __init__(self, predictor: ArbitragePredictor, store_root: str, retrain_interval: float = 6 * 60 * 60,
+                 training_days: int = 1, bootstrap_interval: float = 10 * 60):
+        self.predictor = predictor
+        self.store_root = store_root
+        self.retrain_interval = retrain_interval
+        self.bootstrap_interval = bootstrap_interval
+        self.training_days = training_days
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.task: Optional[asyncio.Task] = None
+        self._training = asyncio.Lock()
+
+    async def start(self):
+        # Spawned, not forked: a forked child would inherit the server's
+        # database connection pool and threads
+        self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        loaded = await asyncio.to_thread(self.predictor.load_model)
+        self.task = asyncio.create_task(self._run(bootstrap=not loaded))
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, bootstrap: bool):
+        if not bootstrap:
+            await asyncio.sleep(self.retrain_interval)
+        while True:
+            await self.train(train_bundle_from_ticks, self.store_root, self.predictor.bundle_path, self.training_days)
+            await asyncio.sleep(self.retrain_interval if self.predictor.is_trained else self.bootstrap_interval)
+
+    async def train(self, job, *args):
+        """Run a training job in the process pool and hot-swap its artifact"""
+        async with self._training:
+            loop = asyncio.get_running_loop()
+            try:
+                accuracy = await loop.run_in_executor(self.executor, job, *args)
+            except Exception as e:
+                print(f"Model training failed: {e}")
+                return None
+            if accuracy is None or not os.path.exists(self.predictor.bundle_path):
+                return None
+
+            bundle = await asyncio.to_thread(load_serving_bundle, self.predictor.bundle_path)
+            self.predictor.swap(bundle)
+            print(f"Swapped in model trained at {bundle.trained_at} (accuracy {accuracy:.2f})")
+            return accuracy
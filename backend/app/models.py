@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import BigInteger, Boolean, Column, Index, Integer, String, Float, DateTime, ForeignKey, Text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -14,6 +14,8 @@ class User(Base):
     
     alerts = relationship("Alert", back_populates="owner")
     trades = relationship("VirtualTrade", back_populates="owner")
+    backtests = relationship("BacktestRun", back_populates="owner")
+    auto_trade_rule = relationship("AutoTradeRule", back_populates="owner", uselist=False)
 
 class Alert(Base):
     __tablename__ = "alerts"
@@ -24,21 +26,103 @@ class Alert(Base):
     min_spread = Column(Float, nullable=False)  # Minimum spread percentage
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Last write, so a listing's ETag can be checked without reading the rows
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     owner = relationship("User", back_populates="alerts")
 
+    # Keyset pagination of a user's alerts
+    __table_args__ = (Index("ix_alerts_user_id_id", "user_id", "id"),)
+
 class VirtualTrade(Base):
     __tablename__ = "virtual_trades"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
+    # Set for trades simulated by a backtest; NULL for the user's own trades
+    backtest_run_id = Column(Integer, ForeignKey("backtest_runs.id"), index=True)
     crypto_pair = Column(String, nullable=False)
+    # Legs of an auto-executed arbitrage; NULL for trades the user entered
+    buy_exchange = Column(String)
+    sell_exchange = Column(String)
     entry_price = Column(Float, nullable=False)
     exit_price = Column(Float)
     quantity = Column(Float, nullable=False)
+    # Latest mark while open; profit_loss is marked to it until the trade closes
+    mark_price = Column(Float)
     profit_loss = Column(Float)
+    fees = Column(Float)
     status = Column(String, default="open")  # open, closed
     created_at = Column(DateTime, default=datetime.utcnow)
     closed_at = Column(DateTime)
+    # Last write (marks included), so a listing's ETag can be checked without reading the rows
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     owner = relationship("User", back_populates="trades")
+    backtest_run = relationship("BacktestRun", back_populates="trades")
+
+    # Keyset pagination and per-period summaries of one user's (or one backtest's) trades, newest first
+    __table_args__ = (
+        Index("ix_virtual_trades_owner_created", "user_id", "backtest_run_id", "created_at", "id"),
+        Index("ix_virtual_trades_owner_status_created", "user_id", "backtest_run_id", "status", "created_at", "id"),
+    )
+
+class BacktestRun(Base):
+    __tablename__ = "backtest_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    start = Column(DateTime, nullable=False)
+    end = Column(DateTime, nullable=False)
+    params = Column(Text, nullable=False)  # JSON-encoded BacktestParams
+    stats = Column(Text)  # JSON-encoded PnL statistics once completed
+    status = Column(String, default="running")  # running, completed, failed
+    created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime)
+
+    owner = relationship("User", back_populates="backtests")
+    trades = relationship("VirtualTrade", back_populates="backtest_run")
+
+class AutoTradeRule(Base):
+    __tablename__ = "auto_trade_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True)
+    min_spread = Column(Float, nullable=False)
+    min_confidence = Column(Float, nullable=False)
+    notional = Column(Float, nullable=False)  # Quote currency spent per trade
+    latency = Column(Float, nullable=False)  # Seconds from detection to the buy fill
+    hold_seconds = Column(Float, nullable=False)  # Seconds from the buy fill to the sell fill (transfer)
+    cooldown = Column(Float, nullable=False)  # Seconds before the same pair is traded again
+    max_open = Column(Integer, nullable=False)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    owner = relationship("User", back_populates="auto_trade_rule")
+
+# One opportunity from the tick it appeared to the tick it was gone (see episodes.EpisodeTracker)
+class OpportunityEpisode(Base):
+    __tablename__ = "opportunity_episodes"
+
+    # Assigned by the scanner when the episode opens, so clients see it before it is stored
+    id = Column(BigInteger, primary_key=True, autoincrement=False)
+    crypto_pair = Column(String, nullable=False, index=True)
+    buy_exchange = Column(String, nullable=False)
+    sell_exchange = Column(String, nullable=False)
+    opened_at = Column(DateTime, nullable=False, index=True)
+    peak_at = Column(DateTime)
+    last_seen_at = Column(DateTime)
+    closed_at = Column(DateTime)
+    duration = Column(Float)  # Seconds from opening to the last tick it was seen
+    ticks = Column(Integer)
+    open_spread = Column(Float)
+    peak_spread = Column(Float)
+    close_spread = Column(Float)
+    peak_profit = Column(Float)
+    decay_rate = Column(Float)  # Spread percentage points lost per second after the peak
+    # Model inputs when it opened, so durations can be trained on
+    volatility = Column(Float)
+    liquidity = Column(Float)
+
+    # Keyset pagination of one pair's episodes, newest first
+    __table_args__ = (Index("ix_opportunity_episodes_pair_opened", "crypto_pair", "opened_at", "id"),)
@@ -0,0 +1,183 @@
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+# Taker fee rates per exchange (fraction of traded notional)
+TAKER_FEES = {
+    'binance': 0.001,
+    'kraken': 0.0026,
+    'kucoin': 0.001,
+    'bybit': 0.001,
+}
+DEFAULT_TAKER_FEE = 0.002
+
+# Withdrawal fees per exchange, in units of the withdrawn asset.
+# The base asset is withdrawn from the buy venue to be sold on the sell venue.
+WITHDRAWAL_FEES = {
+    'binance': {'BTC': 0.0002, 'ETH': 0.0016, 'SOL': 0.008, 'XRP': 0.25, 'LTC': 0.001, 'USDT': 1.0},
+    'kraken': {'BTC': 0.00015, 'ETH': 0.0025, 'SOL': 0.01, 'XRP': 0.02, 'LTC': 0.002, 'USDT': 2.5},
+    'kucoin': {'BTC': 0.0005, 'ETH': 0.002, 'SOL': 0.01, 'XRP': 0.5, 'LTC': 0.001, 'USDT': 1.0},
+    'bybit': {'BTC': 0.0002, 'ETH': 0.0012, 'SOL': 0.01, 'XRP': 0.25, 'LTC': 0.001, 'USDT': 1.0},
+}
+
+# Size used for synthetic one-level books built from top-of-book quotes
+UNBOUNDED_SIZE = 1e12
+
+# Order book depths a venue's watch_order_book accepts; others are rejected
+# (kraken: NotSupported, bybit spot: BadRequest). Venues not listed take any depth.
+BOOK_DEPTHS = {
+    'kraken': (10, 25, 100, 500, 1000),
+    'bybit': (1, 50, 200, 1000),
+}
+
+
+def taker_fee(exchange: str) -> float:
+    return TAKER_FEES.get(exchange, DEFAULT_TAKER_FEE)
+
+
+def withdrawal_fee(exchange: str, asset: str) -> Optional[float]:
+    """Withdrawal fee from the static table, or None if it isn't known"""
+    return WITHDRAWAL_FEES.get(exchange, {}).get(asset)
+
+
+def book_depth(exchange: str, depth: int) -> int:
+    """Smallest depth of at least `depth` the venue accepts (its largest if none is that deep)"""
+    accepted = BOOK_DEPTHS.get(exchange)
+    if not accepted:
+        return depth
+    return next((d for d in accepted if d >= depth), accepted[-1])
+
+
+class OrderBook:
+    """
+    Price-level order book that can be replaced from a snapshot or updated
+    incrementally level by level. Sorted NumPy ladders are rebuilt lazily,
+    only when a side has changed since it was last read.
+    """
+
+    def __init__(self, bids: Optional[List[list]] = None, asks: Optional[List[list]] = None):
+        self._levels = {'bids': {}, 'asks': {}}
+        self._ladders: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        if bids is not None or asks is not None:
+            self.snapshot(bids or [], asks or [])
+
+    @classmethod
+    def from_top(cls, bid: float, ask: float, size: float = UNBOUNDED_SIZE):
+        """One-level book from top-of-book quotes (fee-aware but not depth-aware)"""
+        return cls([[bid, size]], [[ask, size]])
+
+    def snapshot(self, bids: List[list], asks: List[list]):
+        """Replace both sides from ccxt-style [[price, size], ...] lists"""
+        self._levels['bids'] = {level[0]: level[1] for level in bids if level[1] > 0}
+        self._levels['asks'] = {level[0]: level[1] for level in asks if level[1] > 0}
+        self._ladders.clear()
+
+    def apply_delta(self, side: str, price: float, size: float):
+        """Incremental update of one level; size 0 removes it"""
+        levels = self._levels[side]
+        if size > 0:
+            levels[price] = size
+        else:
+            levels.pop(price, None)
+        self._ladders.pop(side, None)
+
+    def ladder(self, side: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(prices, sizes) sorted best-first"""
+        if side not in self._ladders:
+            levels = self._levels[side]
+            prices = np.fromiter(levels.keys(), dtype=float, count=len(levels))
+            sizes = np.fromiter(levels.values(), dtype=float, count=len(levels))
+            order = np.argsort(-prices if side == 'bids' else prices)
+            self._ladders[side] = (prices[order], sizes[order])
+        return self._ladders[side]
+
+
+def walk_book(prices: np.ndarray, sizes: np.ndarray, quantity: float) -> Tuple[float, float]:
+    """Quote amount and base quantity filled by taking `quantity` from a ladder"""
+    cumulative = np.cumsum(sizes)
+    take = np.clip(quantity - (cumulative - sizes), 0, sizes)
+    return float(np.dot(take, prices)), float(take.sum())
+
+
+def quantity_for_notional(prices: np.ndarray, sizes: np.ndarray, notional: float) -> float:
+    """Base quantity bought by spending `notional` quote currency against a ladder"""
+    costs = np.cumsum(prices * sizes)
+    i = int(np.searchsorted(costs, notional))
+    if i >= len(costs):
+        return float(sizes.sum())
+    spent_before = costs[i] - prices[i] * sizes[i]
+    return float(sizes[:i].sum() + (notional - spent_before) / prices[i])
+
+
+def profitable_quantity(ask_prices, ask_sizes, bid_prices, bid_sizes, buy_fee: float, sell_fee: float) -> float:
+    """
+    Largest quantity for which every marginal unit is still profitable after
+    taker fees: both ladders are merged on their cumulative-size breakpoints
+    and walked until the marginal ask (plus fee) meets the marginal bid.
+    """
+    cum_asks = np.cumsum(ask_sizes)
+    cum_bids = np.cumsum(bid_sizes)
+    depth = min(cum_asks[-1], cum_bids[-1])
+
+    edges = np.unique(np.concatenate(([0.0], cum_asks, cum_bids)))
+    edges = edges[edges <= depth]
+    if len(edges) < 2:
+        return 0.0
+
+    starts = edges[:-1]
+    marginal_ask = ask_prices[np.searchsorted(cum_asks, starts, side='right')]
+    marginal_bid = bid_prices[np.searchsorted(cum_bids, starts, side='right')]
+    profitable = marginal_bid * (1 - sell_fee) > marginal_ask * (1 + buy_fee)
+
+    # Marginal prices only get worse, so stop at the first losing segment
+    n = len(profitable) if profitable.all() else int(np.argmin(profitable))
+    return float(edges[n])
+
+
+def evaluate_arbitrage(
+    buy_book: OrderBook,
+    sell_book: OrderBook,
+    notional: float,
+    buy_fee: float,
+    sell_fee: float,
+    transfer_fee: Optional[float] = 0.0,
+) -> Optional[dict]:
+    """
+    Executable arbitrage for buying on buy_book's asks and selling on
+    sell_book's bids, spending at most `notional` quote currency.
+    transfer_fee is in base units and is deducted before the sell leg;
+    None means it isn't known, so the result excludes it and is flagged
+    with transfer_cost_known=False.
+    Returns None when nothing can be executed at a profit.
+    """
+    transfer_cost_known = transfer_fee is not None
+    transfer_fee = transfer_fee or 0.0
+    ask_prices, ask_sizes = buy_book.ladder('asks')
+    bid_prices, bid_sizes = sell_book.ladder('bids')
+    if len(ask_prices) == 0 or len(bid_prices) == 0:
+        return None
+
+    quantity = min(
+        profitable_quantity(ask_prices, ask_sizes, bid_prices, bid_sizes, buy_fee, sell_fee),
+        quantity_for_notional(ask_prices, ask_sizes, notional),
+    )
+    if quantity <= transfer_fee:
+        return None
+
+    buy_cost, bought = walk_book(ask_prices, ask_sizes, quantity)
+    proceeds, sold = walk_book(bid_prices, bid_sizes, quantity - transfer_fee)
+    fees = buy_cost * buy_fee + proceeds * sell_fee
+    net_profit = proceeds - buy_cost - fees
+    if net_profit <= 0:
+        return None
+
+    sell_price = proceeds / sold if sold else 0.0
+    return {
+        "executable_size": bought,
+        "buy_vwap": buy_cost / bought,
+        "sell_vwap": sell_price,
+        "notional": buy_cost,
+        "fees": fees + transfer_fee * sell_price,
+        "net_profit": net_profit,
+        "net_spread_percentage": net_profit / buy_cost * 100,
+        "transfer_cost_known": transfer_cost_known,
+    }
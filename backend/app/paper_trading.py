@@ -0,0 +1,367 @@
+import asyncio
+import heapq
+import itertools
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, insert, select, update
+
+from . import models
+from .order_book import withdrawal_fee
+from .spread_engine import SpreadEngine
+
+# One array per column, so marking every position is a single gather from the spread matrix
+POSITION_COLUMNS = {
+    # Local handle; increases with every position and survives compaction, so it stays sorted
+    'key': np.int64,
+    # VirtualTrade id; 0 until the position has been written
+    'id': np.int64,
+    'user_id': np.int64,
+    'pair': np.intp,
+    'buy': np.intp,  # -1 for user-entered trades
+    'venue': np.intp,  # Venue the position is marked and sold on; -1 marks at the best bid anywhere
+    'quantity': np.float64,
+    'entry_price': np.float64,
+    'cost': np.float64,  # Quote spent, including the buy fee
+    'transfer_fee': np.float64,  # Base units lost moving to the sell venue
+    'sell_fee': np.float64,
+    'opened_at': np.float64,
+    'close_at': np.float64,  # inf: held until the user closes it
+    'mark': np.float64,
+    'pnl': np.float64,
+    'flushed_mark': np.float64,
+}
+DEFAULTS = {'buy': -1, 'venue': -1, 'close_at': np.inf, 'mark': np.nan, 'pnl': np.nan, 'flushed_mark': np.nan}
+# Trades loaded per query when picking up trades opened elsewhere
+SYNC_CHUNK = 500
+
+
+class AutoTradeSettings(NamedTuple):
+    """A user's auto-trading rule, detached from the session it was loaded with"""
+    user_id: int
+    min_spread: float
+    min_confidence: float
+    notional: float
+    latency: float
+    hold_seconds: float
+    cooldown: float
+    max_open: int
+
+
+class PaperPortfolio:
+    """
+    Every open paper trade, held in memory by the scanner and marked to market
+    on each scan tick from the live spread matrix.
+
+    Positions are stored column-wise in NumPy arrays, so a tick marks tens of
+    thousands of them with one vectorized gather. Auto-trading rules turn
+    published opportunities into orders: after `latency` seconds the buy leg
+    fills at the buy venue's ask (plus taker fee), and after `hold_seconds`
+    more (the transfer) the sell leg fills at the sell venue's bid (less
+    withdrawal and taker fees). Fills use top-of-book quotes at the first tick
+    after they are due.
+
+    Nothing here touches the database on the tick path: flush() writes new
+    trades, closes and moved marks in a few batched statements, and sync()
+    picks up rules and trades changed through the API.
+    """
+
+    def __init__(
+        self,
+        engine: SpreadEngine,
+        fee_for: Callable[[str, str], float],
+        transfer_fee_for: Callable[[str, str], Optional[float]] = withdrawal_fee,
+        capacity: int = 1024,
+    ):
+        self.engine = engine
+        # (exchange, pair) -> taker fee rate
+        self.fee_for = fee_for
+        # (exchange, asset) -> withdrawal fee in base units, None if unknown
+        self.transfer_fee_for = transfer_fee_for
+        self.size = 0
+        self.arrays = {name: np.zeros(capacity, dtype=dtype) for name, dtype in POSITION_COLUMNS.items()}
+        self.next_key = 1
+        self.rules: List[AutoTradeSettings] = []
+        # (fill_at, sequence, order) min-heap, since rules have different latencies
+        self.pending: List[Tuple[float, int, dict]] = []
+        self.sequence = itertools.count()
+        self.busy_until: Dict[Tuple[int, int], float] = {}
+        # Closed since the last flush, as VirtualTrade values
+        self.finished: List[dict] = []
+        self.missed = 0
+        # Two overlapping flushes would both insert the positions still at id 0
+        self._flushing = asyncio.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def column(self, name: str) -> np.ndarray:
+        return self.arrays[name][:self.size]
+
+    def open_position(self, **values) -> int:
+        if self.size == len(self.arrays['key']):
+            for name, array in self.arrays.items():
+                self.arrays[name] = np.concatenate([array, np.zeros_like(array)])
+        row = self.size
+        key = self.next_key
+        self.next_key += 1
+        for name in POSITION_COLUMNS:
+            self.arrays[name][row] = values.get(name, DEFAULTS.get(name, 0))
+        self.arrays['key'][row] = key
+        self.size += 1
+        return key
+
+    # Tick path
+
+    def on_tick(self, now: float, opportunities: List[dict]):
+        """Queue orders for this tick's opportunities, fill those due, mark everything and close what is due"""
+        if self.rules:
+            self._execute(now, opportunities)
+        self._fill(now)
+        self.mark()
+        due = (self.column('close_at') <= now) & ~np.isnan(self.column('mark'))
+        if due.any():
+            rows = np.flatnonzero(due)
+            self.finished.extend(self._closed_row(row, now) for row in rows)
+            self._remove(rows)
+
+    def mark(self):
+        if self.size == 0:
+            return
+        pair, venue = self.column('pair'), self.column('venue')
+        # NaN only for pairs no venue is quoting
+        best_bid = np.fmax.reduce(self.engine.bids, axis=1)
+        price = np.where(venue >= 0, self.engine.bids[pair, np.maximum(venue, 0)], best_bid[pair])
+        quoted = ~np.isnan(price)
+        mark = self.column('mark')
+        mark[quoted] = price[quoted]
+        proceeds = (self.column('quantity') - self.column('transfer_fee')) * mark * (1 - self.column('sell_fee'))
+        self.column('pnl')[:] = proceeds - self.column('cost')
+
+    def _execute(self, now: float, opportunities: List[dict]):
+        open_counts = Counter(self.column('user_id').tolist())
+        open_counts.update(order['user_id'] for _, _, order in self.pending)
+        for opportunity in opportunities:
+            i = self.engine.pair_index.get(opportunity['pair'])
+            buy = self.engine.exchange_index.get(opportunity['buy_exchange'])
+            sell = self.engine.exchange_index.get(opportunity['sell_exchange'])
+            if i is None or buy is None or sell is None:
+                continue
+            # Its simulated PnL would leave out a transfer fee we don't know
+            if not opportunity.get('transfer_cost_known', True):
+                continue
+            for rule in self.rules:
+                if opportunity['spread_percentage'] < rule.min_spread or opportunity['confidence_score'] < rule.min_confidence:
+                    continue
+                if self.busy_until.get((rule.user_id, i), -np.inf) > now or open_counts[rule.user_id] >= rule.max_open:
+                    continue
+                order = {
+                    'user_id': rule.user_id,
+                    'pair': i,
+                    'buy': buy,
+                    'sell': sell,
+                    'notional': rule.notional,
+                    'hold_seconds': rule.hold_seconds,
+                }
+                heapq.heappush(self.pending, (now + rule.latency, next(self.sequence), order))
+                # One position per user and pair at a time, then a cooldown
+                self.busy_until[(rule.user_id, i)] = now + rule.latency + rule.hold_seconds + rule.cooldown
+                open_counts[rule.user_id] += 1
+
+    def _fill(self, now: float):
+        """Buy legs whose latency has elapsed, at the ask now on the buy venue"""
+        while self.pending and self.pending[0][0] <= now:
+            _, _, order = heapq.heappop(self.pending)
+            i, buy, sell = order['pair'], order['buy'], order['sell']
+            ask = self.engine.asks[i, buy]
+            if np.isnan(ask):
+                self.missed += 1
+                continue
+            pair = self.engine.pairs[i]
+            buy_exchange, sell_exchange = self.engine.exchanges[buy], self.engine.exchanges[sell]
+            self.open_position(
+                user_id=order['user_id'],
+                pair=i,
+                buy=buy,
+                venue=sell,
+                quantity=order['notional'] / ask,
+                entry_price=ask,
+                cost=order['notional'] * (1 + self.fee_for(buy_exchange, pair)),
+                transfer_fee=self.transfer_fee_for(buy_exchange, pair.split('/')[0]) or 0.0,
+                sell_fee=self.fee_for(sell_exchange, pair),
+                opened_at=now,
+                close_at=now + order['hold_seconds'],
+            )
+
+    def _remove(self, rows: np.ndarray):
+        keep = np.ones(self.size, dtype=bool)
+        keep[rows] = False
+        kept = int(keep.sum())
+        for name, array in self.arrays.items():
+            array[:kept] = array[:self.size][keep]
+        self.size = kept
+
+    def _rows_for(self, keys) -> np.ndarray:
+        """Current rows of positions by key (keys no longer held are skipped)"""
+        held = self.column('key')
+        keys = np.asarray(keys, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(held, keys), max(self.size - 1, 0))
+        return rows[held[rows] == keys] if self.size else rows[:0]
+
+    def _values(self, row: int) -> dict:
+        """VirtualTrade values of the position in `row`"""
+        a = {name: array[row] for name, array in self.arrays.items()}
+        mark = None if np.isnan(a['mark']) else float(a['mark'])
+        return {
+            'key': int(a['key']),
+            'id': int(a['id']) or None,
+            'user_id': int(a['user_id']),
+            'crypto_pair': self.engine.pairs[a['pair']],
+            'buy_exchange': self.engine.exchanges[a['buy']] if a['buy'] >= 0 else None,
+            'sell_exchange': self.engine.exchanges[a['venue']] if a['venue'] >= 0 else None,
+            'entry_price': float(a['entry_price']),
+            'quantity': float(a['quantity']),
+            'mark_price': mark,
+            'profit_loss': None if mark is None else float(a['pnl']),
+            'status': 'open',
+            'created_at': datetime.utcfromtimestamp(a['opened_at']),
+        }
+
+    def _closed_row(self, row: int, now: float) -> dict:
+        values = self._values(row)
+        quantity, transfer_fee, mark = values['quantity'], float(self.arrays['transfer_fee'][row]), values['mark_price']
+        proceeds = (quantity - transfer_fee) * mark
+        values.update({
+            'exit_price': mark,
+            'fees': float(self.arrays['cost'][row]) - quantity * values['entry_price']
+                    + proceeds * float(self.arrays['sell_fee'][row]) + transfer_fee * mark,
+            'status': 'closed',
+            'closed_at': datetime.utcfromtimestamp(now),
+        })
+        return values
+
+    # Persistence
+
+    async def flush(self, session_factory):
+        """Write new trades, closes and marks that moved since the last flush, in one transaction"""
+        async with self._flushing:
+            await self._flush(session_factory)
+
+    async def _flush(self, session_factory):
+        finished, self.finished = self.finished, []
+        ids = self.column('id')
+        new = [self._values(row) for row in np.flatnonzero(ids == 0)]
+        mark, flushed = self.column('mark'), self.column('flushed_mark')
+        moved = np.flatnonzero((ids > 0) & ~np.isnan(mark) & (mark != flushed))
+        marks = [
+            {'_id': int(ids[row]), '_key': int(self.arrays['key'][row]), 'mark_price': float(mark[row]), 'profit_loss': float(self.arrays['pnl'][row])}
+            for row in moved
+        ]
+
+        inserts = [values for values in finished if values['id'] is None] + new
+        closes = [values for values in finished if values['id'] is not None]
+        table = models.VirtualTrade.__table__
+        try:
+            async with session_factory() as db:
+                inserted_ids = []
+                if inserts:
+                    result = await db.execute(
+                        insert(models.VirtualTrade).returning(models.VirtualTrade.id, sort_by_parameter_order=True),
+                        [_columns(values) for values in inserts],
+                    )
+                    inserted_ids = list(result.scalars().all())
+                # Trades the user closed through the API keep the user's close
+                if closes:
+                    await db.execute(
+                        update(table)
+                        .where(table.c.id == bindparam('_id'), table.c.status == 'open')
+                        .values(exit_price=bindparam('exit_price'), mark_price=bindparam('mark_price'),
+                                profit_loss=bindparam('profit_loss'), fees=bindparam('fees'),
+                                status='closed', closed_at=bindparam('closed_at')),
+                        [{'_id': values['id'], **{k: values[k] for k in ('exit_price', 'mark_price', 'profit_loss', 'fees', 'closed_at')}} for values in closes],
+                    )
+                if marks:
+                    await db.execute(
+                        update(table)
+                        .where(table.c.id == bindparam('_id'), table.c.status == 'open')
+                        .values(mark_price=bindparam('mark_price'), profit_loss=bindparam('profit_loss')),
+                        [{k: v for k, v in values.items() if k != '_key'} for values in marks],
+                    )
+                await db.commit()
+        except Exception:
+            self.finished[:0] = finished
+            raise
+
+        # Positions are still being marked and closed while the write is in flight
+        new_ids = dict(zip((values['key'] for values in new), inserted_ids[len(inserts) - len(new):]))
+        rows = self._rows_for(list(new_ids))
+        self.arrays['id'][rows] = [new_ids[key] for key in self.arrays['key'][rows].tolist()]
+        for values in self.finished:
+            if values['id'] is None and values['key'] in new_ids:
+                values['id'] = new_ids[values['key']]
+        rows = self._rows_for([values['_key'] for values in marks])
+        marked = {values['_key']: values['mark_price'] for values in marks}
+        self.arrays['flushed_mark'][rows] = [marked[key] for key in self.arrays['key'][rows].tolist()]
+
+    async def sync(self, session_factory):
+        """Load auto-trading rules, pick up trades opened through the API and drop trades closed through it"""
+        async with session_factory() as db:
+            rules = (await db.execute(
+                select(models.AutoTradeRule).where(models.AutoTradeRule.is_active == True)
+            )).scalars().all()
+            # Ids only: with tens of thousands of open trades, full rows are loaded just for new ones
+            open_ids = set((await db.execute(
+                select(models.VirtualTrade.id).where(
+                    models.VirtualTrade.status == 'open',
+                    models.VirtualTrade.backtest_run_id.is_(None),
+                )
+            )).scalars().all())
+            known = set(self.column('id').tolist()) | {values['id'] for values in self.finished}
+            unknown = sorted(open_ids - known)
+            trades = []
+            for start in range(0, len(unknown), SYNC_CHUNK):
+                trades.extend((await db.execute(
+                    select(models.VirtualTrade).where(models.VirtualTrade.id.in_(unknown[start:start + SYNC_CHUNK]))
+                )).scalars().all())
+
+        self.rules = [
+            AutoTradeSettings(rule.user_id, rule.min_spread, rule.min_confidence, rule.notional,
+                              rule.latency, rule.hold_seconds, rule.cooldown, rule.max_open)
+            for rule in rules
+        ]
+        held = self.column('id')
+        gone = np.flatnonzero((held > 0) & ~np.isin(held, list(open_ids)))
+        if len(gone):
+            self._remove(gone)
+        for trade in trades:
+            if trade.status == 'open' and trade.crypto_pair in self.engine.pair_index:
+                self._load(trade)
+
+    def _load(self, trade: models.VirtualTrade):
+        pair = trade.crypto_pair
+        buy = self.engine.exchange_index.get(trade.buy_exchange, -1)
+        sell = self.engine.exchange_index.get(trade.sell_exchange, -1)
+        buy_fee = self.fee_for(trade.buy_exchange, pair) if buy >= 0 else 0.0
+        self.open_position(
+            id=trade.id,
+            user_id=trade.user_id,
+            pair=self.engine.pair_index[pair],
+            buy=buy,
+            venue=sell,
+            quantity=trade.quantity,
+            entry_price=trade.entry_price,
+            cost=trade.entry_price * trade.quantity * (1 + buy_fee),
+            transfer_fee=(self.transfer_fee_for(trade.buy_exchange, pair.split('/')[0]) or 0.0) if buy >= 0 else 0.0,
+            sell_fee=self.fee_for(trade.sell_exchange, pair) if sell >= 0 else 0.0,
+            opened_at=(trade.created_at or datetime.utcnow()).replace(tzinfo=timezone.utc).timestamp(),
+            # An auto trade's hold isn't stored, so one found on startup sells at the next mark
+            close_at=-np.inf if sell >= 0 else np.inf,
+            mark=trade.mark_price if trade.mark_price is not None else np.nan,
+            flushed_mark=trade.mark_price if trade.mark_price is not None else np.nan,
+        )
+
+
+def _columns(values: dict) -> dict:
+    return {k: v for k, v in values.items() if k not in ('key', 'id')}
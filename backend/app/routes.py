@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from datetime import timedelta
-from typing import List
-from pydantic import BaseModel, EmailStr
+from sqlalchemy import bindparam, case, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter, field_validator
+import base64
+import binascii
+import hashlib
+import json
+import numpy as np
 from . import models, auth, database
+from .tick_store import tick_store
+from .alert_engine import alert_index
+from .backtest import BacktestParams, run_and_store
+from .ml_engine import predictor
 
 router = APIRouter()
 
@@ -47,48 +58,240 @@ class TradeCreate(BaseModel):
 class TradeResponse(BaseModel):
     id: int
     crypto_pair: str
+    buy_exchange: str | None = None
+    sell_exchange: str | None = None
     entry_price: float
     exit_price: float | None
     quantity: float
+    mark_price: float | None = None
     profit_loss: float | None
+    fees: float | None = None
     status: str
+    backtest_run_id: int | None = None
+    created_at: datetime | None = None
+    closed_at: datetime | None = None
     
     class Config:
         from_attributes = True
 
+class AutoTradingSettings(BaseModel):
+    min_spread: float = Field(0.1, ge=0)
+    min_confidence: float = Field(0.0, ge=0, le=100)
+    notional: float = Field(100.0, gt=0)
+    latency: float = Field(1.0, ge=0)
+    hold_seconds: float = Field(30.0, ge=0)
+    cooldown: float = Field(60.0, ge=0)
+    max_open: int = Field(100, ge=1, le=100000)
+    is_active: bool = True
+
+class AutoTradingResponse(AutoTradingSettings):
+    class Config:
+        from_attributes = True
+
+class PortfolioSummary(BaseModel):
+    open_trades: int
+    closed_trades: int
+    unrealized_pnl: float
+    realized_pnl: float
+
+class TradePnL(BaseModel):
+    crypto_pair: str
+    period_start: datetime
+    trades: int
+    closed_trades: int
+    realized_pnl: float
+    unrealized_pnl: float
+    fees: float
+    volume: float
+
+class BacktestParamsIn(BaseModel):
+    min_spread: float = 0.05
+    min_confidence: float = 0.0
+    notional: float = Field(100.0, gt=0)
+    latency: float = Field(1.0, ge=0)
+    cooldown: float = Field(5.0, ge=0)
+    top_k: int = Field(50, ge=1)
+
+class BacktestCreate(BaseModel):
+    start: datetime
+    end: datetime
+    # One run per entry; runs execute in parallel worker processes
+    sweep: List[BacktestParamsIn] = Field(default_factory=lambda: [BacktestParamsIn()], min_length=1, max_length=32)
+
+class BacktestResponse(BaseModel):
+    id: int
+    start: datetime
+    end: datetime
+    params: dict
+    stats: dict | None
+    status: str
+    created_at: datetime
+    completed_at: datetime | None
+
+    @field_validator("params", "stats", mode="before")
+    @classmethod
+    def decode_json(cls, value):
+        return json.loads(value) if isinstance(value, str) else value
+
+    class Config:
+        from_attributes = True
+
+class BacktestComparison(BaseModel):
+    runs: List[BacktestResponse]
+    best_run_id: int | None
+
+class EpisodeResponse(BaseModel):
+    id: int
+    crypto_pair: str
+    buy_exchange: str
+    sell_exchange: str
+    opened_at: datetime
+    peak_at: datetime | None
+    last_seen_at: datetime | None
+    closed_at: datetime | None
+    duration: float | None
+    ticks: int | None
+    open_spread: float | None
+    peak_spread: float | None
+    close_spread: float | None
+    peak_profit: float | None
+    decay_rate: float | None
+
+    class Config:
+        from_attributes = True
+
+class EpisodeStats(BaseModel):
+    crypto_pair: str
+    episodes: int
+    median_duration: float
+    p90_duration: float
+    max_duration: float
+    mean_peak_spread: float
+    mean_decay_rate: float | None
+
+# Serializers for list responses built by hand (to be hashed for their ETag)
+_alert_list = TypeAdapter(List[AlertResponse])
+_trade_list = TypeAdapter(List[TradeResponse])
+_episode_list = TypeAdapter(List[EpisodeResponse])
+_pnl_list = TypeAdapter(List[TradePnL])
+
+# Rows per query while streaming an export
+EXPORT_BATCH = 1000
+
+# Keyset pagination: a page is ordered by (sort column, id) and the cursor is
+# the position of its last row, so the next page is one index range scan no
+# matter how deep it is (unlike OFFSET, which re-reads every skipped row).
+def _encode_cursor(row, columns) -> str:
+    values = [getattr(row, column.key) for column in columns]
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, columns) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if len(values) != len(columns):
+            raise ValueError(cursor)
+        return [datetime.fromisoformat(value) if column.type.python_type is datetime else value for column, value in zip(columns, values)]
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _keyset(query, columns, cursor: Optional[str], limit: int, descending: bool = True):
+    """query restricted to the page after cursor; fetches one extra row to tell whether another page follows"""
+    if cursor:
+        position = tuple_(*[bindparam(None, value, type_=column.type) for column, value in zip(columns, _decode_cursor(cursor, columns))])
+        query = query.where(tuple_(*columns) < position if descending else tuple_(*columns) > position)
+    return query.order_by(*[column.desc() if descending else column.asc() for column in columns]).limit(limit + 1)
+
+def _page(rows, columns, limit: int):
+    """Split the extra row off a _keyset result: (rows, next cursor or None)"""
+    if len(rows) > limit:
+        return rows[:limit], _encode_cursor(rows[limit - 1], columns)
+    return rows, None
+
+async def _version_etag(db: AsyncSession, request: Request, user_id: Optional[int], filters, *changed_columns) -> str:
+    """
+    ETag of a listing derived without reading its rows: the count of rows
+    matching filters and the max of each changed_column (ids for inserts,
+    updated_at for writes), plus the query string and user it was asked by.
+    """
+    version = (await db.execute(select(func.count(), *[func.max(column) for column in changed_columns]).where(*filters))).one()
+    return f'"{hashlib.sha1(repr((user_id, str(request.url.query), *version)).encode()).hexdigest()}"'
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Empty 304 if the client revalidated with If-None-Match and etag still matches"""
+    if etag in [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    return None
+
+def _conditional_json(request: Request, body: bytes, next_cursor: Optional[str] = None, etag: Optional[str] = None) -> Response:
+    """
+    JSON response with an ETag (of its body unless one is given); a client
+    revalidating with If-None-Match gets an empty 304 when nothing changed.
+    """
+    etag = etag or f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return _not_modified(request, etag) or Response(body, media_type="application/json", headers=headers)
+
+def _ndjson_export(query, columns, model, filename: str) -> StreamingResponse:
+    """
+    Stream every row of query as one JSON object per line, fetched in keyset
+    batches of EXPORT_BATCH, each in its own short session so a slow download
+    never pins a pooled connection.
+    """
+    async def lines():
+        cursor = None
+        while True:
+            async with database.AsyncSessionLocal() as db:
+                rows = (await db.execute(_keyset(query, columns, cursor, EXPORT_BATCH))).scalars().all()
+            rows, cursor = _page(rows, columns, EXPORT_BATCH)
+            if rows:
+                yield "".join(model.model_validate(row).model_dump_json() + "\n" for row in rows).encode()
+            if cursor is None:
+                return
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 # Authentication endpoints
 @router.post("/signup", response_model=UserResponse)
-def signup(user: UserCreate, db: Session = Depends(database.get_db)):
+async def signup(user: UserCreate, db: AsyncSession = Depends(database.get_async_db)):
     # Check if user exists
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    db_user = (await db.execute(select(models.User).where(models.User.email == user.email))).scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
+    db_user = (await db.execute(select(models.User).where(models.User.username == user.username))).scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Username already taken")
     
     # Create new user
-    hashed_password = auth.get_password_hash(user.password)
+    hashed_password = await auth.get_password_hash_async(user.password)
     new_user = models.User(
         email=user.email,
         username=user.username,
         hashed_password=hashed_password
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 @router.post("/token", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(database.get_async_db)):
+    user = (await db.execute(select(models.User).where(models.User.email == form_data.username))).scalars().first()
+    if not user or not await auth.verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # Warm the cache: the client's next requests authenticate without a query
+    auth.user_cache.put(user.email, auth.CurrentUser(user.id, user.email, user.username))
     
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
@@ -97,52 +300,66 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_profile(current_user: models.User = Depends(auth.get_current_user)):
+async def get_current_user_profile(current_user: auth.CurrentUser = Depends(auth.get_current_user)):
     return current_user
 
 # Alert CRUD endpoints
+async def _get_alert(db: AsyncSession, alert_id: int, user_id: int) -> models.Alert:
+    db_alert = (await db.execute(
+        select(models.Alert).where(models.Alert.id == alert_id, models.Alert.user_id == user_id)
+    )).scalars().first()
+    if not db_alert:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    return db_alert
+
 @router.post("/alerts", response_model=AlertResponse)
-def create_alert(alert: AlertCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+async def create_alert(alert: AlertCreate, current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
     new_alert = models.Alert(
         user_id=current_user.id,
         crypto_pair=alert.crypto_pair,
         min_spread=alert.min_spread
     )
     db.add(new_alert)
-    db.commit()
-    db.refresh(new_alert)
+    await db.commit()
+    await db.refresh(new_alert)
+    alert_index.upsert(new_alert)
     return new_alert
 
 @router.get("/alerts", response_model=List[AlertResponse])
-def get_alerts(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    alerts = db.query(models.Alert).filter(models.Alert.user_id == current_user.id).all()
-    return alerts
+async def get_alerts(request: Request, cursor: Optional[str] = None, limit: int = Query(1000, ge=1, le=1000), current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    """Oldest first; when more remain, X-Next-Cursor is the cursor of the next page"""
+    columns = (models.Alert.id,)
+    filters = [models.Alert.user_id == current_user.id]
+    etag = await _version_etag(db, request, current_user.id, filters, models.Alert.id, models.Alert.updated_at)
+    if (cached := _not_modified(request, etag)) is not None:
+        return cached
+    query = select(models.Alert).where(*filters)
+    alerts, next_cursor = _page((await db.execute(_keyset(query, columns, cursor, limit, descending=False))).scalars().all(), columns, limit)
+    return _conditional_json(request, _alert_list.dump_json(_alert_list.validate_python(alerts, from_attributes=True)), next_cursor, etag)
 
 @router.put("/alerts/{alert_id}", response_model=AlertResponse)
-def update_alert(alert_id: int, alert: AlertCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    db_alert = db.query(models.Alert).filter(models.Alert.id == alert_id, models.Alert.user_id == current_user.id).first()
-    if not db_alert:
-        raise HTTPException(status_code=404, detail="Alert not found")
+async def update_alert(alert_id: int, alert: AlertCreate, current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    db_alert = await _get_alert(db, alert_id, current_user.id)
     
     db_alert.crypto_pair = alert.crypto_pair
     db_alert.min_spread = alert.min_spread
-    db.commit()
-    db.refresh(db_alert)
+    await db.commit()
+    await db.refresh(db_alert)
+    alert_index.upsert(db_alert)
     return db_alert
 
 @router.delete("/alerts/{alert_id}")
-def delete_alert(alert_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    db_alert = db.query(models.Alert).filter(models.Alert.id == alert_id, models.Alert.user_id == current_user.id).first()
-    if not db_alert:
-        raise HTTPException(status_code=404, detail="Alert not found")
+async def delete_alert(alert_id: int, current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    db_alert = await _get_alert(db, alert_id, current_user.id)
     
-    db.delete(db_alert)
-    db.commit()
+    await db.delete(db_alert)
+    await db.commit()
+    alert_index.remove(alert_id)
     return {"message": "Alert deleted successfully"}
 
 # Virtual Trade endpoints
 @router.post("/trades", response_model=TradeResponse)
-def create_trade(trade: TradeCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+async def create_trade(trade: TradeCreate, current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
     new_trade = models.VirtualTrade(
         user_id=current_user.id,
         crypto_pair=trade.crypto_pair,
@@ -150,11 +367,296 @@ def create_trade(trade: TradeCreate, current_user: models.User = Depends(auth.ge
         quantity=trade.quantity
     )
     db.add(new_trade)
-    db.commit()
-    db.refresh(new_trade)
+    await db.commit()
+    await db.refresh(new_trade)
     return new_trade
 
+def _trade_filters(user_id: int, backtest_run_id: Optional[int], trade_status: Optional[str] = None, pair: Optional[str] = None):
+    """The user's own trades, or the simulated trades of one of their backtest runs"""
+    filters = [
+        models.VirtualTrade.user_id == user_id,
+        models.VirtualTrade.backtest_run_id == backtest_run_id,
+    ]
+    if trade_status:
+        filters.append(models.VirtualTrade.status == trade_status)
+    if pair:
+        filters.append(models.VirtualTrade.crypto_pair == pair)
+    return filters
+
+_TRADE_ORDER = (models.VirtualTrade.created_at, models.VirtualTrade.id)
+
 @router.get("/trades", response_model=List[TradeResponse])
-def get_trades(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    trades = db.query(models.VirtualTrade).filter(models.VirtualTrade.user_id == current_user.id).all()
-    return trades
+async def get_trades(request: Request, backtest_run_id: Optional[int] = None, trade_status: Optional[Literal["open", "closed"]] = Query(None, alias="status"), pair: Optional[str] = None, cursor: Optional[str] = None, limit: int = Query(1000, ge=1, le=5000), current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    """Newest first; when more remain, X-Next-Cursor is the cursor of the next page"""
+    filters = _trade_filters(current_user.id, backtest_run_id, trade_status, pair)
+    etag = await _version_etag(db, request, current_user.id, filters, models.VirtualTrade.id, models.VirtualTrade.updated_at)
+    if (cached := _not_modified(request, etag)) is not None:
+        return cached
+    query = select(models.VirtualTrade).where(*filters)
+    trades, next_cursor = _page((await db.execute(_keyset(query, _TRADE_ORDER, cursor, limit))).scalars().all(), _TRADE_ORDER, limit)
+    return _conditional_json(request, _trade_list.dump_json(_trade_list.validate_python(trades, from_attributes=True)), next_cursor, etag)
+
+@router.get("/trades/export")
+async def export_trades(backtest_run_id: Optional[int] = None, trade_status: Optional[Literal["open", "closed"]] = Query(None, alias="status"), pair: Optional[str] = None, current_user: auth.CurrentUser = Depends(auth.get_current_user)):
+    """Every matching trade as NDJSON, newest first, streamed without loading them all"""
+    query = select(models.VirtualTrade).where(*_trade_filters(current_user.id, backtest_run_id, trade_status, pair))
+    return _ndjson_export(query, _TRADE_ORDER, TradeResponse, "trades.ndjson")
+
+def _period_start(column, period: str, dialect: str):
+    """SQL expression truncating a timestamp to the start of its day, week (Monday) or month"""
+    if dialect == "sqlite":
+        if period == "week":
+            return func.datetime(func.date(column, "-6 days", "weekday 1"))
+        return func.strftime("%Y-%m-%d 00:00:00" if period == "day" else "%Y-%m-01 00:00:00", column)
+    return func.date_trunc(period, column)
+
+@router.get("/trades/summary", response_model=List[TradePnL])
+async def get_trade_summary(request: Request, period: Literal["day", "week", "month"] = "day", backtest_run_id: Optional[int] = None, pair: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None, current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    """PnL per pair and per period the trades were opened in, aggregated by the database"""
+    Trade = models.VirtualTrade
+    filters = _trade_filters(current_user.id, backtest_run_id, pair=pair)
+    if start:
+        filters.append(Trade.created_at >= start)
+    if end:
+        filters.append(Trade.created_at < end)
+    etag = await _version_etag(db, request, current_user.id, filters, Trade.id, Trade.updated_at)
+    if (cached := _not_modified(request, etag)) is not None:
+        return cached
+    period_start = _period_start(Trade.created_at, period, db.bind.dialect.name).label("period_start")
+    is_open = Trade.status == "open"
+    rows = (await db.execute(
+        select(
+            Trade.crypto_pair,
+            period_start,
+            func.count(),
+            func.count(case((~is_open, 1))),
+            func.coalesce(func.sum(case((~is_open, Trade.profit_loss))), 0.0),
+            func.coalesce(func.sum(case((is_open, Trade.profit_loss))), 0.0),
+            func.coalesce(func.sum(Trade.fees), 0.0),
+            func.coalesce(func.sum(Trade.entry_price * Trade.quantity), 0.0),
+        )
+        .where(*filters)
+        .group_by(Trade.crypto_pair, period_start)
+        .order_by(period_start.desc(), Trade.crypto_pair)
+    )).all()
+    summary = [
+        TradePnL(
+            crypto_pair=crypto_pair,
+            # SQLite returns the truncated timestamp as text
+            period_start=datetime.fromisoformat(bucket) if isinstance(bucket, str) else bucket,
+            trades=trades,
+            closed_trades=closed_trades,
+            realized_pnl=realized_pnl,
+            unrealized_pnl=unrealized_pnl,
+            fees=fees,
+            volume=volume,
+        )
+        for crypto_pair, bucket, trades, closed_trades, realized_pnl, unrealized_pnl, fees, volume in rows
+    ]
+    return _conditional_json(request, _pnl_list.dump_json(summary), etag=etag)
+
+@router.post("/trades/{trade_id}/close", response_model=TradeResponse)
+async def close_trade(trade_id: int, current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    """Close an open trade at its latest mark (the scanner stops marking it on its next sync)"""
+    trade = (await db.execute(select(models.VirtualTrade).where(
+        models.VirtualTrade.id == trade_id,
+        models.VirtualTrade.user_id == current_user.id,
+        models.VirtualTrade.backtest_run_id.is_(None),
+    ))).scalars().first()
+    if not trade:
+        raise HTTPException(status_code=404, detail="Trade not found")
+    if trade.status != "open":
+        raise HTTPException(status_code=409, detail="Trade is already closed")
+    if trade.mark_price is None:
+        raise HTTPException(status_code=409, detail="Trade has not been marked to market yet")
+    trade.exit_price = trade.mark_price
+    trade.status = "closed"
+    trade.closed_at = datetime.utcnow()
+    await db.commit()
+    return trade
+
+# Paper trading endpoints (the scanner executes and marks trades, and picks up changes here every PAPER_FLUSH_SECONDS)
+async def _get_auto_trade_rule(db: AsyncSession, user_id: int) -> Optional[models.AutoTradeRule]:
+    return (await db.execute(
+        select(models.AutoTradeRule).where(models.AutoTradeRule.user_id == user_id)
+    )).scalars().first()
+
+@router.get("/paper/auto-trading", response_model=AutoTradingResponse)
+async def get_auto_trading(current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    rule = await _get_auto_trade_rule(db, current_user.id)
+    if not rule:
+        raise HTTPException(status_code=404, detail="Auto-trading is not configured")
+    return rule
+
+@router.put("/paper/auto-trading", response_model=AutoTradingResponse)
+async def set_auto_trading(settings: AutoTradingSettings, current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    rule = await _get_auto_trade_rule(db, current_user.id)
+    if rule is None:
+        rule = models.AutoTradeRule(user_id=current_user.id)
+        db.add(rule)
+    for field, value in settings.model_dump().items():
+        setattr(rule, field, value)
+    await db.commit()
+    return rule
+
+@router.delete("/paper/auto-trading")
+async def delete_auto_trading(current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    rule = await _get_auto_trade_rule(db, current_user.id)
+    if not rule:
+        raise HTTPException(status_code=404, detail="Auto-trading is not configured")
+    await db.delete(rule)
+    await db.commit()
+    return {"message": "Auto-trading disabled"}
+
+@router.get("/paper/portfolio", response_model=PortfolioSummary)
+async def get_portfolio(current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    """Open and closed paper trades with their marked-to-market and realized PnL"""
+    is_open = models.VirtualTrade.status == "open"
+    row = (await db.execute(
+        select(
+            func.count(case((is_open, 1))),
+            func.count(case((~is_open, 1))),
+            func.coalesce(func.sum(case((is_open, models.VirtualTrade.profit_loss))), 0.0),
+            func.coalesce(func.sum(case((~is_open, models.VirtualTrade.profit_loss))), 0.0),
+        ).where(
+            models.VirtualTrade.user_id == current_user.id,
+            models.VirtualTrade.backtest_run_id.is_(None),
+        )
+    )).one()
+    return {"open_trades": row[0], "closed_trades": row[1], "unrealized_pnl": row[2], "realized_pnl": row[3]}
+
+# Backtest endpoints (replay the tick store through the detector in worker processes)
+@router.post("/backtests", response_model=List[BacktestResponse], status_code=status.HTTP_202_ACCEPTED)
+async def create_backtest(backtest: BacktestCreate, background_tasks: BackgroundTasks, current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    if backtest.start >= backtest.end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    sweep = [BacktestParams(**params.model_dump()) for params in backtest.sweep]
+    runs = [
+        models.BacktestRun(
+            user_id=current_user.id,
+            start=backtest.start,
+            end=backtest.end,
+            params=json.dumps(params._asdict()),
+        )
+        for params in sweep
+    ]
+    db.add_all(runs)
+    await db.commit()
+    for run in runs:
+        await db.refresh(run)
+
+    background_tasks.add_task(run_and_store, [run.id for run in runs], tick_store.root, backtest.start, backtest.end, sweep, predictor.bundle_path)
+    return runs
+
+@router.get("/backtests", response_model=List[BacktestResponse])
+async def get_backtests(current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    return (await db.execute(
+        select(models.BacktestRun).where(models.BacktestRun.user_id == current_user.id).order_by(models.BacktestRun.id.desc())
+    )).scalars().all()
+
+@router.get("/backtests/compare", response_model=BacktestComparison)
+async def compare_backtests(ids: List[int] = Query(...), current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    runs = list((await db.execute(
+        select(models.BacktestRun).where(models.BacktestRun.id.in_(ids), models.BacktestRun.user_id == current_user.id)
+    )).scalars().all())
+    if len(runs) != len(set(ids)):
+        raise HTTPException(status_code=404, detail="Backtest run not found")
+    runs.sort(key=lambda run: ids.index(run.id))
+    completed = [run for run in runs if run.stats]
+    best = max(completed, key=lambda run: json.loads(run.stats)["total_pnl"], default=None)
+    return {"runs": runs, "best_run_id": best.id if best else None}
+
+@router.get("/backtests/{run_id}", response_model=BacktestResponse)
+async def get_backtest(run_id: int, current_user: auth.CurrentUser = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    run = (await db.execute(
+        select(models.BacktestRun).where(models.BacktestRun.id == run_id, models.BacktestRun.user_id == current_user.id)
+    )).scalars().first()
+    if not run:
+        raise HTTPException(status_code=404, detail="Backtest run not found")
+    return run
+
+# History endpoints (served from the columnar tick store, not the SQL database)
+def _history_range(start: Optional[datetime], end: Optional[datetime]):
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(hours=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+@router.get("/history/prices")
+def get_price_history(pair: Optional[str] = None, exchange: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None, limit: int = Query(10000, ge=1, le=100000)):
+    start, end = _history_range(start, end)
+    return tick_store.query_prices(start, end, pair=pair, exchange=exchange, limit=limit)
+
+@router.get("/history/opportunities")
+def get_opportunity_history(pair: Optional[str] = None, exchange: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None, limit: int = Query(10000, ge=1, le=100000)):
+    start, end = _history_range(start, end)
+    return tick_store.query_opportunities(start, end, pair=pair, exchange=exchange, limit=limit)
+
+# Episode endpoints (closed opportunity episodes, flushed by the scanner in batches)
+def _episode_filters(pair: Optional[str], start: datetime, end: datetime, min_duration: float):
+    filters = [
+        models.OpportunityEpisode.opened_at >= start,
+        models.OpportunityEpisode.opened_at < end,
+        models.OpportunityEpisode.duration >= min_duration,
+    ]
+    if pair:
+        filters.append(models.OpportunityEpisode.crypto_pair == pair)
+    return filters
+
+_EPISODE_ORDER = (models.OpportunityEpisode.opened_at, models.OpportunityEpisode.id)
+
+@router.get("/episodes", response_model=List[EpisodeResponse])
+async def get_episodes(request: Request, pair: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None, min_duration: float = Query(0.0, ge=0), cursor: Optional[str] = None, limit: int = Query(1000, ge=1, le=10000), db: AsyncSession = Depends(database.get_async_db)):
+    """Newest first; when more remain, X-Next-Cursor is the cursor of the next page"""
+    start, end = _history_range(start, end)
+    filters = _episode_filters(pair, start, end, min_duration)
+    # Episodes are stored once closed and never change, so inserts are the only change
+    etag = await _version_etag(db, request, None, filters, models.OpportunityEpisode.id)
+    if (cached := _not_modified(request, etag)) is not None:
+        return cached
+    query = select(models.OpportunityEpisode).where(*filters)
+    episodes, next_cursor = _page((await db.execute(_keyset(query, _EPISODE_ORDER, cursor, limit))).scalars().all(), _EPISODE_ORDER, limit)
+    return _conditional_json(request, _episode_list.dump_json(_episode_list.validate_python(episodes, from_attributes=True)), next_cursor, etag)
+
+@router.get("/episodes/export")
+async def export_episodes(pair: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None, min_duration: float = Query(0.0, ge=0)):
+    """Every matching episode as NDJSON, newest first (the range defaults to the last hour, like /episodes)"""
+    start, end = _history_range(start, end)
+    query = select(models.OpportunityEpisode).where(*_episode_filters(pair, start, end, min_duration))
+    return _ndjson_export(query, _EPISODE_ORDER, EpisodeResponse, "episodes.ndjson")
+
+@router.get("/episodes/stats", response_model=List[EpisodeStats])
+async def get_episode_stats(pair: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None, min_duration: float = Query(0.0, ge=0), db: AsyncSession = Depends(database.get_async_db)):
+    """How long opportunities last per pair (percentiles aren't portable SQL, so they're computed here)"""
+    start, end = _history_range(start, end)
+    Episode = models.OpportunityEpisode
+    rows = (await db.execute(
+        select(Episode.crypto_pair, Episode.duration, Episode.peak_spread, Episode.decay_rate)
+        .where(*_episode_filters(pair, start, end, min_duration))
+    )).all()
+    by_pair = {}
+    for crypto_pair, duration, peak_spread, decay_rate in rows:
+        by_pair.setdefault(crypto_pair, []).append((duration, peak_spread, np.nan if decay_rate is None else decay_rate))
+
+    stats = []
+    for crypto_pair, values in sorted(by_pair.items()):
+        durations, peaks, decays = np.array(values, dtype=float).T
+        decays = decays[~np.isnan(decays)]
+        stats.append({
+            "crypto_pair": crypto_pair,
+            "episodes": len(durations),
+            "median_duration": float(np.median(durations)),
+            "p90_duration": float(np.percentile(durations, 90)),
+            "max_duration": float(durations.max()),
+            "mean_peak_spread": float(peaks.mean()),
+            "mean_decay_rate": float(decays.mean()) if len(decays) else None,
+        })
+    return stats
+
+@router.get("/episodes/{episode_id}", response_model=EpisodeResponse)
+async def get_episode(episode_id: int, db: AsyncSession = Depends(database.get_async_db)):
+    episode = await db.get(models.OpportunityEpisode, episode_id)
+    if not episode:
+        raise HTTPException(status_code=404, detail="Episode not found (still open, or not flushed yet)")
+    return episode
@@ -0,0 +1,145 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class ScanCadence:
+    """
+    Per-pair polling cadence for venues served over REST. Each pair keeps a
+    time-decayed realized variance per second of its cross-venue mid (log
+    returns) and of its best spread. Only pairs some venue polls are fed,
+    but from every venue's quotes on them, pushed or polled. A pair is due
+    again when either could plausibly have moved by its tolerance since the
+    last poll: the mid by price_move_bps, or the spread by its remaining gap
+    to min_spread (under a diffusion, a move of d takes about d^2 / variance
+    seconds). So a pair whose spread is
+    close to clearing, or whose price is moving fast, is polled every
+    min_interval, while a quiet one backs off to max_interval.
+
+    Polling stays inside each venue's rate budget: when the pairs' wanted
+    intervals add up to more requests per second than budget_share of the
+    venue's token-bucket rate, every interval on that venue is stretched by
+    the same factor, so hot pairs keep their lead over cold ones.
+    """
+
+    def __init__(
+        self,
+        pairs: Sequence[str],
+        min_interval: float = 0.5,
+        max_interval: float = 30.0,
+        default_interval: float = 5.0,
+        half_life: float = 60.0,
+        price_move_bps: float = 5.0,
+        min_spread: float = 0.05,
+        spread_resolution: float = 0.01,
+        budget_share: float = 0.8,
+    ):
+        self.pairs = list(pairs)
+        self.pair_index = {pair: i for i, pair in enumerate(self.pairs)}
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # Until a pair has some history
+        self.default_interval = default_interval
+        self.half_life = half_life
+        self.price_move = price_move_bps / 1e4
+        self.min_spread = min_spread
+        # Smallest spread gap worth polling faster for (percentage points)
+        self.spread_resolution = spread_resolution
+        # Leaves the rest of each venue's budget for other calls (e.g. the cycle scanner)
+        self.budget_share = budget_share
+
+        n = len(self.pairs)
+        self.updated = np.full(n, np.nan)
+        self.mid = np.full(n, np.nan)
+        self.spread = np.full(n, np.nan)
+        # Realized variance per second: of mid log returns, and of spread (percentage points)
+        self.price_var = np.full(n, np.nan)
+        self.spread_var = np.full(n, np.nan)
+        # Per venue: when each pair is next due, and the interval it was last given
+        self.next_poll: Dict[str, np.ndarray] = {}
+        self.last_interval: Dict[str, np.ndarray] = {}
+
+    def observe(self, pair: str, now: float, quotes: Dict[str, dict]):
+        """Fold in a pair's current quotes ({exchange: {'bid', 'ask', ...}}), changed or not"""
+        i = self.pair_index.get(pair)
+        if i is None or not quotes:
+            return
+        best_bid = max(q['bid'] for q in quotes.values())
+        best_ask = min(q['ask'] for q in quotes.values())
+        mid = (best_bid + best_ask) / 2
+        spread = (best_bid - best_ask) / best_ask * 100
+
+        first = np.isnan(self.updated[i])
+        dt = now - self.updated[i]
+        if not first and dt > 0:
+            # Decays by half every half_life seconds; alpha * x / dt keeps each
+            # observation's weight proportional to the time it covers
+            alpha = 1 - math.exp(-dt * math.log(2) / self.half_life)
+            price_rate = math.log(mid / self.mid[i]) ** 2 / dt
+            spread_rate = (spread - self.spread[i]) ** 2 / dt
+            if np.isnan(self.price_var[i]):
+                self.price_var[i], self.spread_var[i] = price_rate, spread_rate
+            else:
+                self.price_var[i] += alpha * (price_rate - self.price_var[i])
+                self.spread_var[i] += alpha * (spread_rate - self.spread_var[i])
+        if first or dt > 0:
+            # Quotes arriving in the same instant are measured from the first of them
+            self.updated[i] = now
+        self.mid[i] = mid
+        self.spread[i] = spread
+
+    def intervals(self, indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """Wanted seconds between polls of each pair, before any venue budget"""
+        if indices is None:
+            indices = np.arange(len(self.pairs))
+        gap = np.maximum(self.min_spread - self.spread[indices], self.spread_resolution)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            price_time = self.price_move ** 2 / self.price_var[indices]
+            spread_time = gap ** 2 / self.spread_var[indices]
+        wanted = np.fmin(price_time, spread_time)
+        wanted = np.where(np.isnan(wanted), self.default_interval, wanted)
+        return np.clip(wanted, self.min_interval, self.max_interval)
+
+    def due(self, venue: str, pairs: List[str], now: float, rate: float, batched: bool) -> Tuple[List[str], float]:
+        """
+        Pairs to poll on a venue now, most overdue first, and the seconds until
+        the next one falls due when none are. `rate` is the venue's request
+        budget (requests per second); a batched venue fetches every due pair
+        in one request, so only its most frequent pair counts against it.
+        """
+        indices = np.array([self.pair_index[pair] for pair in pairs], dtype=int)
+        if venue not in self.next_poll:
+            self.next_poll[venue] = np.zeros(len(self.pairs))
+            self.last_interval[venue] = np.full(len(self.pairs), self.default_interval)
+        if len(indices) == 0:
+            return [], self.max_interval
+
+        intervals = self.intervals(indices)
+        demand = 1 / intervals.min() if batched else (1 / intervals).sum()
+        budget = rate * self.budget_share
+        if demand > budget > 0:
+            intervals = intervals * (demand / budget)
+        self.last_interval[venue][indices] = intervals
+
+        next_poll = self.next_poll[venue][indices]
+        # A batched request carries pairs due within half a hot interval along for free
+        slack = intervals.min() / 2 if batched else 0.0
+        ready = next_poll <= now + slack
+        if not ready.any():
+            return [], float(next_poll.min() - now)
+        order = np.argsort(next_poll[ready], kind='stable')
+        return [self.pairs[i] for i in indices[ready][order]], 0.0
+
+    def polled(self, venue: str, pairs: List[str], now: float):
+        """Schedule the next poll of pairs just fetched from a venue"""
+        indices = np.array([self.pair_index[pair] for pair in pairs], dtype=int)
+        self.next_poll[venue][indices] = now + self.last_interval[venue][indices]
+
+    def venue_intervals(self) -> Dict[Tuple[str, str], float]:
+        """Current budgeted interval per (venue, pair) that has been scheduled"""
+        return {
+            (venue, self.pairs[i]): float(intervals[i])
+            for venue, intervals in self.last_interval.items()
+            for i in np.flatnonzero(self.next_poll[venue] > 0)
+        }
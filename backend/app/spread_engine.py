@@ -0,0 +1,106 @@
+import numpy as np
+from typing import Dict, List, Tuple
+
+
+class SpreadEngine:
+    """
+    Cross-exchange spread detection over a pairs x exchanges price matrix.
+
+    Bid/ask quotes live in preallocated NumPy arrays (NaN = no quote). Every
+    directional (buy_ex, sell_ex) spread is computed as
+    (bid[sell] - ask[buy]) / ask[buy] in one broadcast, and the best direction
+    per pair is kept so a ranked top-K list falls out of a single argpartition.
+    """
+
+    def __init__(self, pairs: List[str], exchanges: List[str]):
+        self.pairs = list(pairs)
+        self.exchanges = list(exchanges)
+        self.pair_index = {pair: i for i, pair in enumerate(self.pairs)}
+        self.exchange_index = {name: j for j, name in enumerate(self.exchanges)}
+
+        n_pairs, n_exchanges = len(self.pairs), len(self.exchanges)
+        self.bids = np.full((n_pairs, n_exchanges), np.nan)
+        self.asks = np.full((n_pairs, n_exchanges), np.nan)
+        # Quote volume per cell, NaN where the venue doesn't report one (not used for spreads)
+        self.volumes = np.full((n_pairs, n_exchanges), np.nan)
+
+        # Best directional spread per pair, kept current by update_pair/recompute
+        self.best_spread = np.full(n_pairs, -np.inf)
+        self.best_buy = np.zeros(n_pairs, dtype=np.intp)
+        self.best_sell = np.zeros(n_pairs, dtype=np.intp)
+
+        # Same-venue "spreads" are never opportunities
+        self._diagonal = np.eye(n_exchanges, dtype=bool)
+
+    def set_quote(self, pair: str, exchange: str, bid: float, ask: float):
+        i = self.pair_index[pair]
+        j = self.exchange_index[exchange]
+        self.bids[i, j] = bid
+        self.asks[i, j] = ask
+
+    def set_quotes(self, pair: str, quotes: Dict[str, dict]):
+        """Load one pair's row from a {exchange: {'bid', 'ask'}} mapping and re-evaluate it"""
+        i = self.pair_index[pair]
+        for exchange, quote in quotes.items():
+            j = self.exchange_index.get(exchange)
+            if j is not None:
+                self.bids[i, j] = quote['bid']
+                self.asks[i, j] = quote['ask']
+                volume = quote.get('volume')
+                self.volumes[i, j] = volume if volume is not None else np.nan
+        self.update_pair(pair)
+
+    def clear_quote(self, pair: str, exchange: str):
+        i = self.pair_index[pair]
+        j = self.exchange_index[exchange]
+        self.bids[i, j] = np.nan
+        self.asks[i, j] = np.nan
+        self.volumes[i, j] = np.nan
+
+    def directional_spreads(self, rows=slice(None)) -> np.ndarray:
+        """
+        Spread percentage for every (pair, buy_ex, sell_ex) as a P x E x E array.
+        Missing quotes and same-venue cells are -inf.
+        """
+        asks = self.asks[rows]
+        bids = self.bids[rows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            spreads = (bids[..., None, :] - asks[..., :, None]) / asks[..., :, None] * 100
+        spreads[np.isnan(spreads)] = -np.inf
+        spreads[..., self._diagonal] = -np.inf
+        return spreads
+
+    def update_pair(self, pair: str):
+        """Re-evaluate only one pair's E x E block (event-driven path)"""
+        i = self.pair_index[pair]
+        block = self.directional_spreads(i)
+        flat = int(np.argmax(block))
+        buy, sell = divmod(flat, len(self.exchanges))
+        self.best_spread[i] = block[buy, sell]
+        self.best_buy[i] = buy
+        self.best_sell[i] = sell
+
+    def recompute(self):
+        """Re-evaluate every pair in one vectorized pass"""
+        n_exchanges = len(self.exchanges)
+        spreads = self.directional_spreads().reshape(len(self.pairs), -1)
+        flat = np.argmax(spreads, axis=1)
+        self.best_spread = spreads[np.arange(len(self.pairs)), flat]
+        self.best_buy, self.best_sell = np.divmod(flat, n_exchanges)
+
+    def top_k(self, k: int, min_spread: float = 0.0) -> List[Tuple[int, int, int, float]]:
+        """
+        Ranked (pair_idx, buy_idx, sell_idx, spread_pct) for the k widest spreads
+        above min_spread, best first.
+        """
+        candidates = np.flatnonzero(self.best_spread > min_spread)
+        if candidates.size == 0:
+            return []
+        if candidates.size > k:
+            part = np.argpartition(-self.best_spread[candidates], k - 1)[:k]
+            candidates = candidates[part]
+        order = candidates[np.argsort(-self.best_spread[candidates])]
+        return [
+            (int(i), int(self.best_buy[i]), int(self.best_sell[i]), float(self.best_spread[i]))
+            for i in order
+        ]
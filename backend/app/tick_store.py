@@ -0,0 +1,297 @@
+import json
+import os
+import queue
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+# Column layout of each table; every column is its own append-only file per day
+PRICE_COLUMNS = {
+    'timestamp': np.float64,
+    'pair': np.int16,
+    'exchange': np.int8,
+    'bid': np.float64,
+    'ask': np.float64,
+}
+OPPORTUNITY_COLUMNS = {
+    'timestamp': np.float64,
+    'pair': np.int16,
+    'buy_exchange': np.int8,
+    'sell_exchange': np.int8,
+    'buy_price': np.float64,
+    'sell_price': np.float64,
+    'spread_percentage': np.float64,
+    'net_profit': np.float64,
+}
+TABLES = {'prices': PRICE_COLUMNS, 'opportunities': OPPORTUNITY_COLUMNS}
+
+
+class TickStore:
+    """
+    Append-only columnar time-series store for scan ticks.
+
+    Data is partitioned by UTC day (<root>/<YYYY-MM-DD>/<table>.<column>.bin).
+    Each column is a raw little-endian array, so appends are a single write
+    and reads are zero-copy np.memmap slices. Rows within a day are in
+    timestamp order, so time ranges resolve with a binary search.
+
+    Writes go through a background thread; append_* only copies the arrays
+    and enqueues them, so the event loop never waits on disk. A crash between
+    column writes leaves some columns longer than others, so the first write
+    to a day's table truncates all of them back to the shortest.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.symbols_path = os.path.join(root, 'symbols.json')
+        self.symbols = {'pairs': [], 'exchanges': []}
+        if os.path.exists(self.symbols_path):
+            with open(self.symbols_path) as f:
+                self.symbols = json.load(f)
+        self._ids = {kind: {name: i for i, name in enumerate(names)} for kind, names in self.symbols.items()}
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=10000)
+        self._writer: Optional[threading.Thread] = None
+        # (day, table) partitions already aligned by this process
+        self._aligned: Set[Tuple[str, str]] = set()
+
+    # Symbol dictionary (names <-> small integer ids)
+
+    def symbol_id(self, kind: str, name: str) -> int:
+        ids = self._ids[kind]
+        if name not in ids:
+            with self._lock:
+                if name not in ids:
+                    ids[name] = len(self.symbols[kind])
+                    self.symbols[kind].append(name)
+                    os.makedirs(self.root, exist_ok=True)
+                    tmp_path = self.symbols_path + '.tmp'
+                    with open(tmp_path, 'w') as f:
+                        json.dump(self.symbols, f)
+                    os.replace(tmp_path, self.symbols_path)
+        return ids[name]
+
+    def lookup_id(self, kind: str, name: str) -> Optional[int]:
+        return self._ids[kind].get(name)
+
+    # Ingestion
+
+    def start(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, daemon=True)
+            self._writer.start()
+
+    def stop(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def append_prices(self, timestamp: float, pairs: List[str], exchanges: List[str], bids: np.ndarray, asks: np.ndarray):
+        """Record one tick's pairs x exchanges quote matrix (NaN cells are skipped)"""
+        pair_ids = np.array([self.symbol_id('pairs', p) for p in pairs], dtype=np.int16)
+        exchange_ids = np.array([self.symbol_id('exchanges', e) for e in exchanges], dtype=np.int8)
+        rows, cols = np.nonzero(~np.isnan(bids) & ~np.isnan(asks))
+        if len(rows) == 0:
+            return
+        self._enqueue('prices', timestamp, {
+            'timestamp': np.full(len(rows), timestamp),
+            'pair': pair_ids[rows],
+            'exchange': exchange_ids[cols],
+            'bid': bids[rows, cols],
+            'ask': asks[rows, cols],
+        })
+
+    def append_opportunities(self, timestamp: float, opportunities: List[dict]):
+        if not opportunities:
+            return
+        self._enqueue('opportunities', timestamp, {
+            'timestamp': np.full(len(opportunities), timestamp),
+            'pair': [self.symbol_id('pairs', o['pair']) for o in opportunities],
+            'buy_exchange': [self.symbol_id('exchanges', o['buy_exchange']) for o in opportunities],
+            'sell_exchange': [self.symbol_id('exchanges', o['sell_exchange']) for o in opportunities],
+            'buy_price': [o['buy_price'] for o in opportunities],
+            'sell_price': [o['sell_price'] for o in opportunities],
+            'spread_percentage': [o['spread_percentage'] for o in opportunities],
+            'net_profit': [o.get('potential_profit', 0.0) for o in opportunities],
+        })
+
+    def _enqueue(self, table: str, timestamp: float, columns: Dict[str, object]):
+        schema = TABLES[table]
+        batch = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in schema.items()}
+        try:
+            self._queue.put_nowait((table, timestamp, batch))
+        except queue.Full:
+            print(f"Tick store queue full, dropping {table} batch")
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            table, timestamp, batch = item
+            try:
+                self.write_batch(table, timestamp, batch)
+            except Exception as e:
+                print(f"Tick store write error: {e}")
+
+    def write_batch(self, table: str, timestamp: float, batch: Dict[str, np.ndarray]):
+        """Synchronously append a batch of rows to the day partition of `timestamp`"""
+        day = _day(timestamp)
+        day_dir = os.path.join(self.root, day)
+        os.makedirs(day_dir, exist_ok=True)
+        if (day, table) not in self._aligned:
+            self._align(day_dir, table)
+            self._aligned.add((day, table))
+        for name, values in batch.items():
+            with open(os.path.join(day_dir, f'{table}.{name}.bin'), 'ab') as f:
+                values.tofile(f)
+
+    def _align(self, day_dir: str, table: str):
+        """Cut every column of a day's table to the rows present in all of them"""
+        schema = TABLES[table]
+        paths = {name: os.path.join(day_dir, f'{table}.{name}.bin') for name in schema}
+        sizes = {name: os.path.getsize(p) if os.path.exists(p) else 0 for name, p in paths.items()}
+        rows = min(sizes[name] // np.dtype(dtype).itemsize for name, dtype in schema.items())
+        for name, dtype in schema.items():
+            size = rows * np.dtype(dtype).itemsize
+            if sizes[name] > size:
+                print(f"Tick store: truncating {paths[name]} to {rows} rows after an interrupted write")
+                with open(paths[name], 'r+b') as f:
+                    f.truncate(size)
+
+    # Range queries
+
+    def _load_day(self, table: str, day: str) -> Optional[Dict[str, np.ndarray]]:
+        day_dir = os.path.join(self.root, day)
+        schema = TABLES[table]
+        paths = {name: os.path.join(day_dir, f'{table}.{name}.bin') for name in schema}
+        if not all(os.path.exists(p) for p in paths.values()):
+            return None
+        # A writer may be mid-append; only expose rows present in every column
+        rows = min(os.path.getsize(paths[name]) // np.dtype(dtype).itemsize for name, dtype in schema.items())
+        if rows == 0:
+            return None
+        return {
+            name: np.memmap(paths[name], dtype=dtype, mode='r', shape=(rows,))
+            for name, dtype in schema.items()
+        }
+
+    def query(
+        self,
+        table: str,
+        start: datetime,
+        end: datetime,
+        filters: Optional[Dict[Union[str, Tuple[str, ...]], int]] = None,
+        limit: int = 10000,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Rows of `table` with start <= timestamp < end matching equality filters.
+        A filter keyed by a tuple of columns matches rows where any of them equals the value.
+        """
+        start, end = _as_utc(start), _as_utc(end)
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in TABLES[table]}
+        remaining = limit
+
+        day = start.date()
+        while day <= end.date() and remaining > 0:
+            columns = self._load_day(table, day.isoformat())
+            day += timedelta(days=1)
+            if columns is None:
+                continue
+
+            timestamps = columns['timestamp']
+            lo = int(np.searchsorted(timestamps, start_ts, side='left'))
+            hi = int(np.searchsorted(timestamps, end_ts, side='left'))
+            if lo >= hi:
+                continue
+
+            mask = np.ones(hi - lo, dtype=bool)
+            for names, value in (filters or {}).items():
+                match = np.zeros(hi - lo, dtype=bool)
+                for name in (names if isinstance(names, tuple) else (names,)):
+                    match |= columns[name][lo:hi] == value
+                mask &= match
+            selected = np.flatnonzero(mask)[:remaining] + lo
+            remaining -= len(selected)
+            for name in parts:
+                parts[name].append(np.asarray(columns[name][selected]))
+
+        return {
+            name: np.concatenate(chunks) if chunks else np.empty(0, dtype=TABLES[table][name])
+            for name, chunks in parts.items()
+        }
+
+    def query_prices(self, start: datetime, end: datetime, pair: Optional[str] = None,
+                     exchange: Optional[str] = None, limit: int = 10000) -> List[dict]:
+        filters = self._filters(pair=('pairs', pair), exchange=('exchanges', exchange))
+        if filters is None:
+            return []
+        rows = self.query('prices', start, end, filters, limit)
+        pairs, exchanges = self.symbols['pairs'], self.symbols['exchanges']
+        return [
+            {
+                'timestamp': _iso(ts),
+                'pair': pairs[p],
+                'exchange': exchanges[e],
+                'bid': float(bid),
+                'ask': float(ask),
+            }
+            for ts, p, e, bid, ask in zip(rows['timestamp'], rows['pair'], rows['exchange'], rows['bid'], rows['ask'])
+        ]
+
+    def query_opportunities(self, start: datetime, end: datetime, pair: Optional[str] = None,
+                            exchange: Optional[str] = None, limit: int = 10000) -> List[dict]:
+        """Opportunities on `pair`, and buying or selling on `exchange`, when given"""
+        filters = self._filters(pair=('pairs', pair), exchange=('exchanges', exchange))
+        if filters is None:
+            return []
+        if 'exchange' in filters:
+            filters[('buy_exchange', 'sell_exchange')] = filters.pop('exchange')
+        rows = self.query('opportunities', start, end, filters, limit)
+        pairs, exchanges = self.symbols['pairs'], self.symbols['exchanges']
+        return [
+            {
+                'timestamp': _iso(rows['timestamp'][k]),
+                'pair': pairs[rows['pair'][k]],
+                'buy_exchange': exchanges[rows['buy_exchange'][k]],
+                'sell_exchange': exchanges[rows['sell_exchange'][k]],
+                'buy_price': float(rows['buy_price'][k]),
+                'sell_price': float(rows['sell_price'][k]),
+                'spread_percentage': float(rows['spread_percentage'][k]),
+                'net_profit': float(rows['net_profit'][k]),
+            }
+            for k in range(len(rows['timestamp']))
+        ]
+
+    def _filters(self, **names) -> Optional[Dict[str, int]]:
+        """Translate name filters to ids; None if a name was never recorded"""
+        filters = {}
+        for column, (kind, name) in names.items():
+            if name is None:
+                continue
+            symbol_id = self.lookup_id(kind, name)
+            if symbol_id is None:
+                return None
+            filters[column] = symbol_id
+        return filters
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Naive datetimes are treated as UTC, matching datetime.utcnow() elsewhere
+    return value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _day(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).date().isoformat()
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(float(timestamp), tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+
+# Singleton instance
+tick_store = TickStore(os.getenv("TICK_STORE_PATH", "./tick_data"))
@@ -0,0 +1,154 @@
+import asyncio
+import time
+from typing import Optional
+
+import ccxt
+
+from .metrics import EXCHANGE_ERRORS, EXCHANGE_REQUEST_SECONDS
+
+
+# The venue rejected the request itself (unsupported call or parameters):
+# retrying can't succeed, and it says nothing about the venue's health
+PERMANENT_ERRORS = (ccxt.NotSupported, ccxt.BadRequest)
+
+
+class TokenBucket:
+    """Rate-limit budget: `rate` requests per second with bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1):
+        while not self.try_acquire(tokens):
+            await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing venue. After `threshold` consecutive failures the
+    circuit opens for `reset_timeout` seconds (doubling on each re-open, up to
+    max_timeout); then one trial call is let through (half-open) and its
+    result closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold: int = 3, reset_timeout: float = 5, max_timeout: float = 300):
+        self.threshold = threshold
+        self.base_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_timeout = max_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def remaining(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    async def wait_ready(self):
+        """Sleep until a call is allowed (closed or half-open)"""
+        delay = self.remaining()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.reset_timeout = self.base_timeout
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None:
+            # Trial call failed: re-open with a longer timeout
+            self.reset_timeout = min(self.reset_timeout * 2, self.max_timeout)
+            self.opened_at = time.monotonic()
+        elif self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class VenueScheduler:
+    """
+    Per-exchange fetch policy: its own polling cadence, a rate-limit token
+    bucket, a hard timeout on every call and a circuit breaker. One venue
+    timing out or failing never delays the others.
+    """
+
+    def __init__(
+        self,
+        poll_interval: float = 5,
+        rate: float = 5,
+        burst: float = 10,
+        timeout: float = 10,
+        watch_timeout: float = 60,
+        retry_delay: float = 1,
+        name: str = "",
+    ):
+        self.name = name
+        self.request_seconds = EXCHANGE_REQUEST_SECONDS.labels(name)
+        self.errors = EXCHANGE_ERRORS.labels(name)
+        self.poll_interval = poll_interval
+        # Pause after a failed call while the circuit is still closed
+        self.retry_delay = retry_delay
+        # Push feeds may legitimately stay quiet for a while, so they get a longer timeout
+        self.timeout = timeout
+        self.watch_timeout = watch_timeout
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker()
+
+    @classmethod
+    def for_exchange(cls, exchange, **overrides):
+        """Derive the rate budget from ccxt's rateLimit (milliseconds between requests)"""
+        rate_limit = getattr(exchange, 'rateLimit', None)
+        if rate_limit:
+            overrides.setdefault('rate', 1000 / rate_limit)
+            overrides.setdefault('burst', max(1, 2000 / rate_limit))
+        return cls(**overrides)
+
+    async def call(self, coro_factory, watch: bool = False):
+        """
+        Run one exchange request under the venue's budget, timeout and breaker.
+        coro_factory is called only once the request is allowed to go out.
+        Push-feed reads (watch=True) don't issue requests, so they skip the bucket.
+        """
+        await self.breaker.wait_ready()
+        if not watch:
+            await self.bucket.acquire()
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(coro_factory(), self.watch_timeout if watch else self.timeout)
+        except asyncio.CancelledError:
+            raise
+        except PERMANENT_ERRORS:
+            self.errors.inc()
+            raise
+        except Exception:
+            self.errors.inc()
+            self.breaker.record_failure()
+            raise
+        # A watch call's duration is time spent waiting for a push, not request latency
+        if not watch:
+            self.request_seconds.observe(time.perf_counter() - started)
+        self.breaker.record_success()
+        return result
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from fastapi import WebSocket
+
+try:
+    import msgpack
+except ImportError:  # optional binary encoding
+    msgpack = None
+
+from .metrics import BROADCAST_SECONDS, DROPPED_CLIENTS, SERIALIZATION_SECONDS
+
+# Seconds a single send may take before the client is treated as stalled and dropped
+SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+
+V1_SERIALIZATION_SECONDS = SERIALIZATION_SECONDS.labels("v1")
+V2_SERIALIZATION_SECONDS = SERIALIZATION_SECONDS.labels("v2")
+
+# Fields compared to decide whether an opportunity changed; the per-item
+# timestamp is left out since it moves every tick (messages carry their own)
+TRACKED_FIELDS = (
+    "buy_exchange", "sell_exchange", "buy_price", "sell_price", "spread_percentage",
+    "potential_profit", "executable_size", "net_spread_percentage", "fees", "confidence_score",
+    "transfer_cost_known", "episode_id", "episode_started_at",
+)
+
+
+def diff_opportunities(previous: Dict[str, dict], current: Dict[str, dict]) -> dict:
+    """
+    Delta between two {pair: opportunity} views: new pairs in full, only the
+    changed fields of existing pairs, and the keys of pairs that disappeared.
+    """
+    added = [opp for pair, opp in current.items() if pair not in previous]
+    removed = [pair for pair in previous if pair not in current]
+    changed = []
+    for pair, opp in current.items():
+        old = previous.get(pair)
+        if old is None:
+            continue
+        fields = {field: opp.get(field) for field in TRACKED_FIELDS if opp.get(field) != old.get(field)}
+        if fields:
+            fields["pair"] = pair
+            changed.append(fields)
+    return {"added": added, "changed": changed, "removed": removed}
+
+
+class Subscriber:
+    """
+    One v2 client: its pair/min_spread filter, the view it was last sent,
+    and a single pending slot. Publishing only replaces the pending view, so
+    a slow client skips intermediate ticks instead of queueing them, and its
+    next message is one delta from what it actually saw.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.pairs: Optional[Set[str]] = None
+        self.min_spread = 0.0
+        self.encoding = "json"
+        self.subscribed = False
+        self.sent: Dict[str, dict] = {}
+        self.needs_snapshot = True
+        self.seq = 0
+        self.pending: Optional[Dict[str, dict]] = None
+        self.ready = asyncio.Event()
+
+    def subscribe(self, pairs: Optional[List[str]], min_spread: float, encoding: str, opportunities: List[dict]):
+        self.pairs = set(pairs) if pairs else None
+        self.min_spread = min_spread
+        self.encoding = encoding
+        self.subscribed = True
+        self.needs_snapshot = True
+        self.offer(opportunities)
+
+    def offer(self, opportunities: List[dict]):
+        """Replace the pending view with the latest tick (filtered to this client)"""
+        if not self.subscribed:
+            return
+        self.pending = {
+            opp["pair"]: opp
+            for opp in opportunities
+            if opp["spread_percentage"] >= self.min_spread and (self.pairs is None or opp["pair"] in self.pairs)
+        }
+        self.ready.set()
+
+    def encode(self, message: dict):
+        started = time.perf_counter()
+        if self.encoding == "msgpack":
+            payload = msgpack.packb(message, use_bin_type=True)
+        else:
+            payload = json.dumps(message)
+        V2_SERIALIZATION_SECONDS.observe(time.perf_counter() - started)
+        return payload
+
+    async def send(self, message: dict):
+        payload = self.encode(message)
+        if isinstance(payload, bytes):
+            await self.websocket.send_bytes(payload)
+        else:
+            await self.websocket.send_text(payload)
+
+    async def run(self):
+        """Sender loop: one message per wake-up, however many ticks were coalesced"""
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            current, self.pending = self.pending, None
+            if current is None:
+                continue
+
+            self.seq += 1
+            timestamp = datetime.utcnow().isoformat()
+            if self.needs_snapshot:
+                message = {"type": "snapshot", "seq": self.seq, "timestamp": timestamp, "data": list(current.values())}
+                self.needs_snapshot = False
+            else:
+                delta = diff_opportunities(self.sent, current)
+                if not (delta["added"] or delta["changed"] or delta["removed"]):
+                    self.seq -= 1
+                    continue
+                message = {"type": "delta", "seq": self.seq, "timestamp": timestamp, **delta}
+
+            self.sent = current
+            await self.send(message)
+
+
+class Feed:
+    """
+    One v1 client's writer: a single latest-wins slot for the serialized
+    tick, drained by its own task, so a slow socket skips ticks instead of
+    holding up the broadcast for everyone else.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.pending: Optional[str] = None
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def offer(self, message: str):
+        self.pending = message
+        self.ready.set()
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            message, self.pending = self.pending, None
+            if message is not None:
+                await asyncio.wait_for(self.websocket.send_text(message), SEND_TIMEOUT)
+
+
+class ConnectionManager:
+    """This process's client sockets and the fan-out of each published tick to them"""
+
+    def __init__(self):
+        self.active_connections: List[WebSocket] = []
+        # Writer per v1 socket
+        self.feeds: Dict[WebSocket, Feed] = {}
+        # Authenticated sockets per user, for personal notifications such as alerts
+        self.user_connections: Dict[int, List[WebSocket]] = {}
+        # v2 protocol clients, each with its own filter and delta state
+        self.subscribers: List[Subscriber] = []
+        # Last published tick, sent to new sockets so they don't wait for the next one
+        self.last_message: Optional[str] = None
+        self.last_opportunities: List[dict] = []
+
+    async def connect(self, websocket: WebSocket, user_id: Optional[int] = None, full_updates: bool = True):
+        await websocket.accept()
+        if user_id is not None:
+            self.user_connections.setdefault(user_id, []).append(websocket)
+        if full_updates:
+            feed = Feed(websocket)
+            if self.last_message is not None:
+                feed.offer(self.last_message)
+            feed.task = asyncio.create_task(self._run_feed(feed))
+            self.active_connections.append(websocket)
+            self.feeds[websocket] = feed
+
+    def disconnect(self, websocket: WebSocket):
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+        feed = self.feeds.pop(websocket, None)
+        if feed is not None and feed.task is not asyncio.current_task():
+            feed.task.cancel()
+        for user_id, sockets in list(self.user_connections.items()):
+            if websocket in sockets:
+                sockets.remove(websocket)
+                if not sockets:
+                    del self.user_connections[user_id]
+
+    async def _drop(self, connection: WebSocket):
+        DROPPED_CLIENTS.inc()
+        self.disconnect(connection)
+        try:
+            await connection.close()
+        except Exception:
+            pass
+
+    async def _run_feed(self, feed: Feed):
+        try:
+            await feed.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # includes a send that outlived SEND_TIMEOUT
+            await self._drop(feed.websocket)
+
+    async def _send(self, connection: WebSocket, message: str):
+        try:
+            await asyncio.wait_for(connection.send_text(message), SEND_TIMEOUT)
+        except Exception:
+            await self._drop(connection)
+
+    async def broadcast(self, message: str):
+        """Hand an already-serialized message to every v1 socket's writer; never waits on a send"""
+        started = time.perf_counter()
+        self.last_message = message
+        for feed in self.feeds.values():
+            feed.offer(message)
+        BROADCAST_SECONDS.observe(time.perf_counter() - started)
+
+    async def publish(self, opportunities: List[dict]):
+        """Fan a tick out to v1 sockets (full list, serialized once) and v2 subscribers (deltas)"""
+        self.last_opportunities = opportunities
+        for subscriber in self.subscribers:
+            subscriber.offer(opportunities)
+        started = time.perf_counter()
+        message = json.dumps({"type": "update", "data": opportunities})
+        V1_SERIALIZATION_SECONDS.observe(time.perf_counter() - started)
+        await self.broadcast(message)
+
+    async def send_to_user(self, user_id: int, message: str):
+        sockets = list(self.user_connections.get(user_id, []))
+        await asyncio.gather(*(self._send(c, message) for c in sockets))
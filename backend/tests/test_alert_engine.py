@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+from app.alert_engine import AlertIndex
+
+
+def _alert(alert_id, min_spread, pair='BTC/USDT', user_id=1, is_active=True):
+    return SimpleNamespace(id=alert_id, user_id=user_id, crypto_pair=pair, min_spread=min_spread, is_active=is_active)
+
+
+def test_alert_fires_once_on_an_upward_cross():
+    index = AlertIndex()
+    index.load([_alert(1, 0.5), _alert(2, 0.8, user_id=2), _alert(3, 0.5, pair='ETH/USDT')])
+
+    assert index.evaluate('BTC/USDT', 0.3) == []
+    assert index.evaluate('BTC/USDT', 0.6) == [(1, 1, 0.5)]
+    # Staying above the threshold, even as the spread moves, is silent
+    assert index.evaluate('BTC/USDT', 0.7) == []
+    assert index.evaluate('BTC/USDT', 0.55) == []
+    # Dropping below re-arms it; reaching the threshold exactly counts as a cross
+    assert index.evaluate('BTC/USDT', 0.4) == []
+    assert index.evaluate('BTC/USDT', 0.5) == [(1, 1, 0.5)]
+    # One jump crosses both; the alert already above doesn't fire again
+    assert index.evaluate('BTC/USDT', 0.1) == []
+    assert sorted(index.evaluate('BTC/USDT', 0.9)) == [(1, 1, 0.5), (2, 2, 0.8)]
+
+
+def test_updated_and_deactivated_alerts_move_in_the_index():
+    index = AlertIndex()
+    index.load([_alert(1, 0.5), _alert(2, 0.5, user_id=2)])
+    index.upsert(_alert(1, 1.0))
+    index.upsert(_alert(2, 0.5, user_id=2, is_active=False))
+
+    assert index.evaluate('BTC/USDT', 0.6) == []
+    assert index.evaluate('BTC/USDT', 1.2) == [(1, 1, 1.0)]
+    index.remove(1)
+    assert index.evaluate('BTC/USDT', 0.0) == []
+    assert index.evaluate('BTC/USDT', 1.2) == []
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.feature_store import RollingFeatures, RollingWindow
+from app.ml_engine import LABEL_HORIZON, VOLATILITY_WINDOW, ArbitragePredictor
+from app.tick_store import TickStore
+
+PAIRS = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']
+EXCHANGES = ['binance', 'kraken', 'kucoin', 'bybit']
+SNAPSHOTS = 300
+
+
+def _snapshots(seed: int = 7):
+    """Bid/ask matrices with venues dropping in and out, some snapshots quoting a pair on one venue only"""
+    rng = np.random.default_rng(seed)
+    base = np.array([50000.0, 3000.0, 150.0])
+    mids = base[:, None] * np.exp(np.cumsum(rng.normal(0, 0.001, (SNAPSHOTS, len(PAIRS))), axis=0)).T
+    snapshots = []
+    for t in range(SNAPSHOTS):
+        offsets = 1 + rng.normal(0, 0.0005, (len(PAIRS), len(EXCHANGES)))
+        bids = mids[:, t, None] * offsets * (1 - 0.0001)
+        asks = mids[:, t, None] * offsets * (1 + 0.0001)
+        missing = rng.random((len(PAIRS), len(EXCHANGES))) < 0.3
+        # kucoin is down for a stretch; SOL is often quoted by a single venue
+        if 100 <= t < 140:
+            missing[:, 2] = True
+        if t % 7 == 0:
+            missing[2, 1:] = True
+        bids[missing] = np.nan
+        asks[missing] = np.nan
+        volumes = np.where(missing, np.nan, rng.uniform(1e5, 1e7, missing.shape))
+        snapshots.append((1_700_000_000.0 + t, bids, asks, volumes))
+    return snapshots
+
+
+@pytest.fixture(scope='module')
+def replay(tmp_path_factory):
+    """Record the snapshots through the tick store and stream the same ones into RollingFeatures"""
+    store = TickStore(str(tmp_path_factory.mktemp('ticks')))
+    rolling = RollingFeatures(len(PAIRS))
+    served = {pair: [] for pair in PAIRS}
+    history = {pair: [] for pair in PAIRS}
+    store.start()
+    for timestamp, bids, asks, volumes in _snapshots():
+        store.append_prices(timestamp, PAIRS, EXCHANGES, bids, asks)
+        rolling.update(bids, asks, volumes)
+        # Served like candidates: only pairs quoted on two venues or more
+        quoted = np.flatnonzero((~np.isnan(bids)).sum(axis=1) >= 2)
+        for i, features, stats in zip(quoted, rolling.features(quoted, bids, asks), rolling.history(quoted)):
+            served[PAIRS[i]].append(features)
+            history[PAIRS[i]].append(stats)
+    # Drains the write queue
+    store.stop()
+    prices = pd.DataFrame(store.query('prices', pd.Timestamp(1_699_999_000, unit='s'), pd.Timestamp(1_700_001_000, unit='s'), limit=10 ** 7))
+    return prices, {p: np.array(v) for p, v in served.items()}, {p: np.array(v) for p, v in history.items()}
+
+
+@pytest.mark.parametrize('pair', PAIRS)
+def test_served_features_match_training(replay, pair):
+    prices, served, _ = replay
+    pair_id = PAIRS.index(pair)
+    trained = ArbitragePredictor().prepare_tick_features(prices[prices['pair'] == pair_id])
+    expected = trained[['Spread_Proxy', 'Volatility', 'Liquidity']].to_numpy()
+
+    # Training drops rows still filling the volatility window and the last LABEL_HORIZON (no label yet)
+    streamed = served[pair][:-LABEL_HORIZON]
+    streamed = streamed[~np.isnan(streamed).any(axis=1)]
+    assert len(expected) > 100
+    np.testing.assert_allclose(streamed, expected, rtol=1e-9, atol=1e-12)
+
+
+def test_volatility_is_nan_until_the_window_fills(replay):
+    _, served, _ = replay
+    volatility = served['BTC/USDT'][:, 1]
+    # The first quoted snapshot has no return yet
+    assert np.isnan(volatility[:VOLATILITY_WINDOW]).all()
+    assert not np.isnan(volatility[VOLATILITY_WINDOW:]).any()
+
+
+@pytest.mark.parametrize('pair', PAIRS)
+def test_spread_history_matches_pandas(replay, pair):
+    _, served, history = replay
+    spreads = pd.Series(served[pair][:, 0])
+    expected = np.column_stack([spreads.rolling(VOLATILITY_WINDOW).mean(), spreads.rolling(VOLATILITY_WINDOW).std()])
+    np.testing.assert_allclose(history[pair][:, :2], expected, rtol=1e-9, atol=1e-12)
+
+
+def test_volume_history_matches_pandas():
+    rolling = RollingFeatures(len(PAIRS))
+    snapshots = _snapshots(seed=11)
+    for _, bids, asks, volumes in snapshots:
+        rolling.update(bids, asks, volumes)
+    stacked = np.stack([volumes for _, _, _, volumes in snapshots])
+    expected = np.zeros(len(PAIRS))
+    for i in range(len(PAIRS)):
+        for j in range(len(EXCHANGES)):
+            # Each venue's window holds its last VOLATILITY_WINDOW reported volumes
+            reported = pd.Series(stacked[:, i, j]).dropna()
+            expected[i] += reported.rolling(VOLATILITY_WINDOW).mean().iloc[-1]
+    np.testing.assert_allclose(rolling.history(np.arange(len(PAIRS)))[:, 2], expected, rtol=1e-9)
+
+
+def test_rolling_window_survives_many_laps():
+    rng = np.random.default_rng(3)
+    window = RollingWindow(2, 5)
+    values = rng.normal(100, 1e-3, (1000, 2))
+    for row in values:
+        window.push(np.arange(2), row)
+    np.testing.assert_allclose(window.std, values[-5:].std(axis=0, ddof=1), rtol=1e-6)
+    np.testing.assert_allclose(window.mean, values[-5:].mean(axis=0), rtol=1e-12)
@@ -0,0 +1,58 @@
+import pytest
+
+from app.order_book import OrderBook, evaluate_arbitrage, profitable_quantity, quantity_for_notional
+
+FEE = 0.001
+
+
+@pytest.fixture
+def books():
+    """Asks climb past the bids at 3 units: the third ask level costs more than the second bid level pays"""
+    buy_book = OrderBook(asks=[[100.0, 1.0], [101.0, 2.0], [103.0, 5.0]])
+    sell_book = OrderBook(bids=[[104.0, 1.5], [102.0, 2.0], [100.0, 10.0]])
+    return buy_book, sell_book
+
+
+def test_walk_stops_at_the_break_even_level(books):
+    buy_book, sell_book = books
+    quantity = profitable_quantity(*buy_book.ladder('asks'), *sell_book.ladder('bids'), FEE, FEE)
+    # 101 * 1.001 still buys below 102 * 0.999; 103 * 1.001 doesn't
+    assert quantity == pytest.approx(3.0)
+
+    execution = evaluate_arbitrage(buy_book, sell_book, 1e6, FEE, FEE)
+    buy_cost = 100.0 * 1 + 101.0 * 2
+    proceeds = 104.0 * 1.5 + 102.0 * 1.5
+    fees = buy_cost * FEE + proceeds * FEE
+    assert execution['executable_size'] == pytest.approx(3.0)
+    assert execution['buy_vwap'] == pytest.approx(buy_cost / 3)
+    assert execution['sell_vwap'] == pytest.approx(proceeds / 3)
+    assert execution['fees'] == pytest.approx(fees)
+    assert execution['net_profit'] == pytest.approx(proceeds - buy_cost - fees)
+    assert execution['transfer_cost_known']
+
+
+def test_notional_caps_the_walk_inside_a_level(books):
+    buy_book, sell_book = books
+    assert quantity_for_notional(*buy_book.ladder('asks'), 150.0) == pytest.approx(1 + 50 / 101)
+
+    execution = evaluate_arbitrage(buy_book, sell_book, 150.0, FEE, FEE)
+    assert execution['executable_size'] == pytest.approx(1 + 50 / 101)
+    assert execution['notional'] == pytest.approx(150.0)
+
+
+def test_transfer_fee_is_paid_out_of_the_sell_leg(books):
+    buy_book, sell_book = books
+    known = evaluate_arbitrage(buy_book, sell_book, 1e6, FEE, FEE, transfer_fee=0.01)
+    # 2.99 units arrive to be sold
+    proceeds = 104.0 * 1.5 + 102.0 * 1.49
+    assert known['net_profit'] == pytest.approx(proceeds - 302.0 - 302.0 * FEE - proceeds * FEE)
+
+    unknown = evaluate_arbitrage(buy_book, sell_book, 1e6, FEE, FEE, transfer_fee=None)
+    assert not unknown['transfer_cost_known']
+    assert unknown['net_profit'] == pytest.approx(evaluate_arbitrage(buy_book, sell_book, 1e6, FEE, FEE)['net_profit'])
+
+
+def test_spread_eaten_by_fees_is_not_executable():
+    buy_book = OrderBook.from_top(99.0, 100.0)
+    sell_book = OrderBook.from_top(100.1, 100.2)
+    assert evaluate_arbitrage(buy_book, sell_book, 100.0, FEE, FEE) is None
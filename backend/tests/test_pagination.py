@@ -0,0 +1,134 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import auth, database, models
+from app.routes import router
+
+CREATED_AT = datetime(2026, 1, 1, 12)
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'test.db'}"
+
+
+@pytest.fixture
+def session(db_url):
+    """A throwaway database, so tests never touch the app's own"""
+    engine = create_engine(db_url)
+    database.Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        yield db
+    engine.dispose()
+
+
+@pytest.fixture
+def user(session):
+    user = models.User(email="a@example.com", username="a", hashed_password="x")
+    session.add(user)
+    session.commit()
+    return user
+
+
+@pytest.fixture
+def client(db_url, user):
+    async_engine = create_async_engine(database.async_database_url(db_url))
+    sessions = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def get_async_db():
+        async with sessions() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    app.dependency_overrides[database.get_async_db] = get_async_db
+    app.dependency_overrides[auth.get_current_user] = lambda: auth.CurrentUser(user.id, user.email, user.username)
+    with TestClient(app) as client:
+        yield client
+
+
+def _trade(user, created_at, **values):
+    return models.VirtualTrade(user_id=user.id, crypto_pair="BTC/USDT", entry_price=100.0, quantity=1.0, created_at=created_at, **values)
+
+
+def _pages(client, path, limit, **params):
+    pages, cursor = [], None
+    while True:
+        response = client.get(path, params={"limit": limit, **params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append([row["id"] for row in response.json()])
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return pages
+
+
+def test_page_boundary_between_equal_created_at(session, user, client):
+    # Five trades share one timestamp, so pages of two split them; id breaks the tie
+    session.add_all([_trade(user, CREATED_AT) for _ in range(5)])
+    session.add_all([_trade(user, CREATED_AT + timedelta(hours=1)), _trade(user, CREATED_AT - timedelta(hours=1))])
+    session.commit()
+    expected = [
+        trade.id
+        for trade in sorted(session.query(models.VirtualTrade).all(), key=lambda t: (t.created_at, t.id), reverse=True)
+    ]
+
+    pages = _pages(client, "/api/trades", limit=2)
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    assert [trade_id for page in pages for trade_id in page] == expected
+
+
+def test_rows_added_while_paging_are_not_repeated(session, user, client):
+    session.add_all([_trade(user, CREATED_AT) for _ in range(4)])
+    session.commit()
+    first = client.get("/api/trades", params={"limit": 2})
+    session.add(_trade(user, CREATED_AT))
+    session.commit()
+
+    rest = client.get("/api/trades", params={"limit": 10, "cursor": first.headers["x-next-cursor"]})
+    seen = [t["id"] for t in first.json()] + [t["id"] for t in rest.json()]
+    assert len(seen) == len(set(seen)) == 4
+
+
+def _cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    base64.urlsafe_b64encode(b"{not json").decode(),
+    _cursor([CREATED_AT.isoformat()]),
+    _cursor(["yesterday", 3]),
+    _cursor(7),
+])
+def test_malformed_cursor_is_rejected(client, cursor):
+    response = client.get("/api/trades", params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_etag_revalidates_until_a_row_changes(session, user, client):
+    trade = _trade(user, CREATED_AT, mark_price=101.0)
+    session.add(trade)
+    session.commit()
+
+    first = client.get("/api/trades")
+    etag = first.headers["etag"]
+    unchanged = client.get("/api/trades", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    # Another page or filter is another representation
+    assert client.get("/api/trades", params={"status": "open"}).headers["etag"] != etag
+
+    assert client.post(f"/api/trades/{trade.id}/close").status_code == 200
+    changed = client.get("/api/trades", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()[0]["status"] == "closed"
+    assert changed.headers["etag"] != etag